@@ -0,0 +1,57 @@
+"""
+Script para aplicar la política de retención del historial: mueve al archivo
+histórico (chat_history_archive.db) las sesiones sin uso reciente y, si se
+indica, elimina del archivo las más antiguas.
+
+Para ejecutar: python archive_history.py [--dias 180] [--purgar-dias 730] [--prueba] [--db chat_history.db]
+"""
+
+import argparse
+import os
+import time
+
+def archive_history(db_path: str = "chat_history.db", archive_after_days: int = 180,
+                    purge_after_days: int = None, dry_run: bool = False):
+    """
+    Aplica la política de retención y muestra un resumen de lo archivado y purgado.
+    """
+    if not os.path.exists(db_path):
+        print("❌ Base de datos no encontrada. Ejecuta la aplicación primero para crearla.")
+        return False
+
+    try:
+        from db.models import DatabaseManager, RetentionPolicy
+
+        db_manager = DatabaseManager(f"sqlite:///{db_path}")
+        policy = RetentionPolicy(archive_after_days, purge_after_days)
+
+        print(f"📦 Archivando sesiones sin uso en los últimos {archive_after_days} días"
+              + (" (prueba, sin cambios)" if dry_run else ""))
+        started = time.perf_counter()
+        report = db_manager.apply_retention_policy(
+            policy, dry_run=dry_run,
+            progress=lambda total: print(f"   ⏳ {total} sesiones archivadas")
+        )
+
+        verb = "se archivarían" if dry_run else "archivadas"
+        print(f"✅ {report.archived.sessions} sesiones {verb} "
+              f"({report.archived.messages} mensajes, {report.archived.content_bytes / 1e6:.1f} MB)")
+        if purge_after_days is not None:
+            verb = "se eliminarían" if dry_run else "eliminadas"
+            print(f"🗑️ {report.purged.sessions} sesiones {verb} del archivo "
+                  f"({report.purged.messages} mensajes, {report.purged.content_bytes / 1e6:.1f} MB)")
+        print(f"⏱️ {time.perf_counter() - started:.1f} s — archivo: {db_manager.archive_path}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error al archivar el historial: {e}")
+        return False
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archiva y purga sesiones antiguas del historial")
+    parser.add_argument("--dias", type=int, default=180, help="Días sin uso para archivar una sesión")
+    parser.add_argument("--purgar-dias", type=int, default=None, help="Días sin uso para eliminarla del archivo")
+    parser.add_argument("--prueba", action="store_true", help="Solo informa, sin modificar nada")
+    parser.add_argument("--db", default="chat_history.db", help="Ruta de la base de datos")
+    args = parser.parse_args()
+    archive_history(args.db, args.dias, args.purgar_dias, args.prueba)
@@ -5,7 +5,8 @@ Maneja registro, login y gestión de sesiones de usuario.
 
 import re
 from typing import Optional
-from db.models import DatabaseManager, User
+from db.models import UserRecord
+from db.storage import open_storage
 
 class AuthManager:
     """
@@ -13,8 +14,8 @@ class AuthManager:
     """
     
     def __init__(self):
-        self.db_manager = DatabaseManager()
-        self.current_user: Optional[User] = None
+        self.db_manager = open_storage()
+        self.current_user: Optional[UserRecord] = None
     
     def register_user(self, username: str, email: str, password: str, confirm_password: str) -> tuple[bool, str]:
         """
@@ -64,7 +65,7 @@ class AuthManager:
         """Verifica si hay un usuario autenticado"""
         return self.current_user is not None
     
-    def get_current_user(self) -> Optional[User]:
+    def get_current_user(self) -> Optional[UserRecord]:
         """Obtiene el usuario actual"""
         return self.current_user
     
@@ -0,0 +1,4 @@
+"""
+Benchmarks de rendimiento de la capa de datos del Asistente PMP.
+Cada script se ejecuta de forma independiente: python -m benchmarks.<nombre>
+"""
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Benchmark de DatabaseManager.get_user_analytics_data con 1k, 10k y 100k sesiones.
+Mide el tiempo por apertura del dashboard y la cantidad de consultas emitidas,
+sin caché (cálculo completo) y con la caché de analíticas vigente, y el
+cálculo sin caché de la ventana reciente del dashboard (los últimos 7 días
+de la historia comparados con los 7 anteriores).
+
+Para ejecutar: python -m benchmarks.bench_analytics [sesiones ...]
+"""
+
+import sys
+
+from benchmarks.common import temporary_database, seed_user_history, count_queries, measure
+from db.analytics import RECENT_DAYS, recent_days_window
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+
+
+def uncached(db_manager, user_id: int, **window):
+    db_manager.invalidate_analytics(user_id)
+    return db_manager.get_user_analytics_data(user_id, **window)
+
+
+def run(sizes):
+    print(f"{'Sesiones':>10} | {'Consultas':>9} | {'Tiempo (s)':>10} | {'Con caché (µs)':>14} | "
+          f"{f'{RECENT_DAYS} días + anterior (s)':>23}")
+    print("-" * 79)
+    for size in sizes:
+        with temporary_database() as (db_manager, _):
+            user_id = seed_user_history(db_manager, size)
+            with count_queries(db_manager.read_engine) as counter:
+                uncached(db_manager, user_id)
+            elapsed = measure(lambda: uncached(db_manager, user_id))
+            cached = measure(lambda: [db_manager.get_user_analytics_data(user_id) for _ in range(1000)]) / 1000
+            # Ventana reciente respecto de la última sesión generada
+            since, until = recent_days_window(RECENT_DAYS, now=db_manager.get_latest_chat_session(user_id).created_at)
+            recent = measure(lambda: uncached(db_manager, user_id, since=since, until=until, compare=True))
+            print(f"{size:>10,} | {counter['queries']:>9} | {elapsed:>10.3f} | {cached * 1e6:>14.1f} | {recent:>23.3f}")
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
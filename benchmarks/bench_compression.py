@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la compresión transparente de chat_messages.content. Genera un
+historial con respuestas largas en markdown (como las del modo estudiemos),
+guardado primero sin comprimir, y lo compara con el mismo historial tras
+compress_messages: tamaño del archivo (después de VACUUM, con el índice de
+búsqueda incluido), tamaño del índice y latencia de lectura de una página
+de historial.
+
+Para ejecutar: python -m benchmarks.bench_compression [sesiones] [mensajes por sesión]
+"""
+
+import os
+import sys
+import time
+
+from sqlalchemy import select, text
+
+import db.models as models
+from db.models import ChatSession, SEARCH_INDEX_TABLE
+from benchmarks.common import temporary_database, seed_user_history, measure
+
+DEFAULT_SESSIONS = 200
+DEFAULT_MESSAGES = 40
+
+TOPICS = ["gestión de riesgos", "control del alcance", "cronograma", "costos", "calidad",
+          "interesados", "adquisiciones", "comunicaciones", "recursos", "integración"]
+
+
+def markdown_reply(rnd, role) -> str:
+    """Respuesta del asistente de 1-4 KB con la estructura habitual del tutor."""
+    if role == "user":
+        return f"¿Puedes explicarme {rnd.choice(TOPICS)} con un ejemplo?"
+    topic = rnd.choice(TOPICS)
+    sections = []
+    for n in range(rnd.randint(2, 5)):
+        bullets = "\n".join(
+            f"- **Punto {k + 1}:** en {rnd.choice(TOPICS)}, el director del proyecto debe "
+            f"documentar las decisiones y revisar {rnd.choice(TOPICS)} con los interesados."
+            for k in range(rnd.randint(3, 6))
+        )
+        sections.append(f"### {n + 1}. {topic.capitalize()}\n\n{bullets}\n")
+    return f"## {topic.capitalize()} según la Guía del PMBOK\n\n" + "\n".join(sections)
+
+
+def file_size(db_manager, db_path: str) -> int:
+    with db_manager.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("VACUUM")
+        # En WAL el VACUUM queda en el -wal hasta el checkpoint
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    return os.path.getsize(db_path)
+
+
+def index_size(db_manager) -> int:
+    """Bytes de las tablas internas del índice de búsqueda (dbstat)."""
+    with db_manager.engine.connect() as conn:
+        return conn.exec_driver_sql(
+            "SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name LIKE ?", (f"{SEARCH_INDEX_TABLE}%",)
+        ).scalar()
+
+
+def read_latency(db_manager, session_ids) -> float:
+    """Mejor tiempo medio (ms) de get_session_messages_page sobre las sesiones indicadas."""
+    elapsed = measure(lambda: [db_manager.get_session_messages_page(sid) for sid in session_ids])
+    return elapsed / len(session_ids) * 1000
+
+
+def run(sessions: int, messages: int):
+    with temporary_database() as (db_manager, db_path):
+        threshold = models.COMPRESSION_THRESHOLD
+        models.COMPRESSION_THRESHOLD = float("inf")  # Historial previo a la compresión
+        try:
+            seed_user_history(db_manager, sessions, messages_per_session=messages, make_content=markdown_reply)
+        finally:
+            models.COMPRESSION_THRESHOLD = threshold
+
+        with db_manager.get_session() as db:
+            # Una base nueva nace con los backfills hechos; se simula una anterior a la compresión
+            db.execute(text("DELETE FROM maintenance_state WHERE key = :key"),
+                       {"key": db_manager.MESSAGE_COMPRESSION_BACKFILL_KEY})
+            db.commit()
+
+        with db_manager.get_session() as db:
+            session_ids = db.execute(select(ChatSession.id).order_by(ChatSession.id).limit(50)).scalars().all()
+            text_bytes = db.execute(text("SELECT SUM(LENGTH(CAST(content AS BLOB))) FROM chat_messages")).scalar()
+
+        print(f"Sesiones: {sessions} | Mensajes: {sessions * messages:,} | Texto: {text_bytes / 1e6:.1f} MB")
+        before_size = file_size(db_manager, db_path)
+        before_index = index_size(db_manager)
+        before_read = read_latency(db_manager, session_ids)
+
+        started = time.perf_counter()
+        db_manager.compress_messages()
+        migration = time.perf_counter() - started
+
+        after_size = file_size(db_manager, db_path)
+        after_index = index_size(db_manager)
+        after_read = read_latency(db_manager, session_ids)
+
+        print(f"Migración compress_messages: {migration:.2f} s")
+        print(f"{'':>16} | {'Tamaño (MB)':>11} | {'Índice (MB)':>11} | {'Página (ms)':>11}")
+        print("-" * 58)
+        print(f"{'Sin comprimir':>16} | {before_size / 1e6:>11.2f} | {before_index / 1e6:>11.2f} | {before_read:>11.3f}")
+        print(f"{'Comprimido':>16} | {after_size / 1e6:>11.2f} | {after_index / 1e6:>11.2f} | {after_read:>11.3f}")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    run(args[0] if args else DEFAULT_SESSIONS, args[1] if len(args) > 1 else DEFAULT_MESSAGES)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la racha y la actividad semanal con 1k, 10k y 100k sesiones.
+Compara el cálculo anterior, que leía todas las sesiones del usuario
+(con session_stats) y ordenaba sus fechas, con el resumen diario
+(daily_activity), que lee una fila por día con actividad.
+
+Para ejecutar: python -m benchmarks.bench_daily_activity [sesiones ...]
+"""
+
+import sys
+
+import numpy as np
+
+from benchmarks.common import temporary_database, seed_user_history, measure
+from db.analytics import ActivityDays, SessionTimeline
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+
+
+def streak_from_sessions(db_manager, user_id: int) -> int:
+    """Camino anterior: todas las sesiones, días únicos ordenados y racha"""
+    with db_manager.read_engine.connect() as conn:
+        timeline = SessionTimeline.from_rows(db_manager._load_session_timeline(conn, user_id))
+    study_days = np.unique(timeline.local_days())[::-1]
+    if not len(study_days):
+        return 0
+    consecutive = (study_days[0] - study_days) == np.arange(len(study_days))
+    return len(study_days) if consecutive.all() else int(np.argmin(consecutive))
+
+
+def streak_from_rollup(db_manager, user_id: int) -> tuple:
+    """Camino actual: filas de daily_activity, racha y resumen semanal"""
+    with db_manager.read_engine.connect() as conn:
+        rows = db_manager._load_daily_activity(conn, user_id)
+    activity = ActivityDays.from_rows(rows)
+    today = int(activity.day[-1]) if len(activity.day) else 0
+    return db_manager._calculate_study_streak(activity), db_manager._calculate_weekly_activity(activity, today), len(rows)
+
+
+def run(sizes):
+    print(f"{'Sesiones':>10} | {'Sesiones (ms)':>13} | {'Resumen diario (ms)':>19} | {'Filas leídas':>12} | {'Racha':>5}")
+    print("-" * 72)
+    for size in sizes:
+        with temporary_database() as (db_manager, _):
+            user_id = seed_user_history(db_manager, size)
+            old_streak = streak_from_sessions(db_manager, user_id)
+            new_streak, _, rows = streak_from_rollup(db_manager, user_id)
+            assert old_streak == new_streak
+            old = measure(lambda: streak_from_sessions(db_manager, user_id))
+            new = measure(lambda: streak_from_rollup(db_manager, user_id))
+            print(f"{size:>10,} | {old * 1000:>13.2f} | {new * 1000:>19.2f} | {rows:>12,} | {new_streak:>5}")
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
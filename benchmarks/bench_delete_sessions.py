@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Benchmark del borrado de conversaciones: una sesión por llamada
+(delete_chat_session en un bucle) frente a delete_sessions con los IDs
+juntos, ambos con ON DELETE CASCADE en la base. Informa además el espacio
+que el recuperador en segundo plano devuelve con incremental_vacuum.
+
+Para ejecutar: python -m benchmarks.bench_delete_sessions [sesiones] [mensajes por sesión]
+"""
+
+import os
+import sys
+import time
+
+from benchmarks.common import temporary_database, seed_user_history
+
+DEFAULT_SESSIONS = 2_000
+DEFAULT_MESSAGES = 20
+
+
+def run(sessions: int, messages: int):
+    print(f"{'Borrado':>28} | {'Sesiones':>8} | {'Mensajes':>9} | {'Tiempo':>9} | {'Archivo':>17}")
+    print("-" * 84)
+    for label, bulk in (("Una sesión por llamada", False), ("delete_sessions masivo", True)):
+        with temporary_database() as (db_manager, db_path):
+            user_id = seed_user_history(db_manager, sessions, messages_per_session=messages)
+            session_ids = [session.id for session in db_manager.get_user_sessions(user_id)]
+            size_before = os.path.getsize(db_path)
+
+            started = time.perf_counter()
+            if bulk:
+                db_manager.delete_sessions(session_ids)
+            else:
+                for session_id in session_ids:
+                    db_manager.delete_chat_session(session_id)
+            elapsed = time.perf_counter() - started
+
+            db_manager.reclaim_space(wait=True)
+            with db_manager.engine.connect() as conn:
+                conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+            size_after = os.path.getsize(db_path)
+            print(f"{label:>28} | {sessions:>8,} | {sessions * messages:>9,} | {elapsed * 1000:>7.0f} ms | "
+                  f"{size_before / 2**20:>5.1f} → {size_after / 2**20:>4.1f} MB")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    run(args[0] if args else DEFAULT_SESSIONS, args[1] if len(args) > 1 else DEFAULT_MESSAGES)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la clasificación de mensajes por palabras clave (db/keywords.py).
+Compara classify_message, una sola expresión regular que devuelve temas,
+indicadores y veredicto en una pasada, con las búsquedas `in` por palabra
+clave sobre el texto en minúsculas que hacían antes las analíticas y
+session_stats, una lista a la vez. Reporta mensajes por segundo
+para respuestas del asistente cortas y largas, y cuántos mensajes con
+'incorrecto' contaba como acierto la búsqueda por subcadena.
+
+Para ejecutar: python -m benchmarks.bench_keyword_matcher [mensajes]
+"""
+
+import random
+import sys
+import time
+
+from benchmarks.common import SAMPLE_MESSAGES
+from db.keywords import (
+    PMBOK_AREAS, QUESTION_INDICATORS, COMPLETION_INDICATORS, EXAM_TYPES, classify_message
+)
+
+DEFAULT_MESSAGES = 200_000
+
+FILLER = (
+    "Recuerda que el director del proyecto debe equilibrar las restricciones "
+    "y documentar las decisiones en el registro correspondiente. "
+)
+
+
+def substring_scan(content: str) -> tuple:
+    """Clasificación anterior: una búsqueda `in` por palabra clave"""
+    content_lower = content.lower()
+    topics = {area for area in PMBOK_AREAS if area in content_lower}
+    question = any(indicator in content_lower for indicator in QUESTION_INDICATORS)
+    completion = any(indicator in content_lower for indicator in COMPLETION_INDICATORS)
+    exam_type = next(
+        (exam_type for exam_type, indicators in EXAM_TYPES.items()
+         if any(indicator in content_lower for indicator in indicators)),
+        None
+    )
+    if 'correcto' in content_lower:
+        verdict = 'correcto'
+    elif 'incorrecto' in content_lower:
+        verdict = 'incorrecto'
+    else:
+        verdict = None
+    return topics, question, completion, exam_type, verdict
+
+
+def make_messages(count: int, filler_repeats: int, seed: int = 42) -> list:
+    """Respuestas del asistente de ejemplo con `filler_repeats` frases de relleno"""
+    rnd = random.Random(seed)
+    return [rnd.choice(SAMPLE_MESSAGES["assistant"]) + " " + FILLER * filler_repeats for _ in range(count)]
+
+
+def throughput(classify, messages: list) -> float:
+    """Mensajes clasificados por segundo"""
+    started = time.perf_counter()
+    for content in messages:
+        classify(content)
+    return len(messages) / (time.perf_counter() - started)
+
+
+def run(count: int):
+    print(f"{'Mensajes':>22} | {'Subcadenas (msg/s)':>19} | {'Regex única (msg/s)':>20} | {'Mejora':>7}")
+    print("-" * 79)
+    for label, repeats in (("Cortos (~80 car.)", 0), ("Largos (~1.300 car.)", 10)):
+        messages = make_messages(count, repeats)
+        old = throughput(substring_scan, messages)
+        new = throughput(classify_message, messages)
+        print(f"{label:>22} | {old:>19,.0f} | {new:>20,.0f} | {new / old:>6.1f}x")
+
+    messages = make_messages(count, 0)
+    miscounted = sum(
+        1 for content in messages
+        if substring_scan(content)[4] == 'correcto' and classify_message(content).verdict == 'incorrecto'
+    )
+    print(f"\n'incorrecto' contado como acierto por subcadena: {miscounted:,} de {count:,} mensajes")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MESSAGES)
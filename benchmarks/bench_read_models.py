@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Benchmark de las lecturas del sidebar y del historial: instancias del ORM
+(camino anterior) frente a registros NamedTuple construidos desde select()
+de Core (SessionRecord, MessageRecord). Informa filas por segundo.
+
+Para ejecutar: python -m benchmarks.bench_read_models [sesiones] [mensajes del historial]
+"""
+
+import sys
+
+from db.models import ChatSession, ChatMessage
+from benchmarks.common import temporary_database, seed_user_history, measure
+
+DEFAULT_SESSIONS = 5_000
+DEFAULT_MESSAGES = 5_000
+
+
+def sidebar_orm(db_manager, user_id: int):
+    """Camino anterior: instancias de ChatSession que quedan desconectadas."""
+    with db_manager.get_session() as db:
+        return db.query(ChatSession).filter(ChatSession.user_id == user_id).order_by(ChatSession.last_used_at.desc()).all()
+
+
+def history_orm(db_manager, session_id: int):
+    """Camino anterior: instancias de ChatMessage convertidas a tuplas."""
+    with db_manager.get_session() as db:
+        messages = db.query(ChatMessage).filter(
+            ChatMessage.session_id == session_id
+        ).order_by(ChatMessage.timestamp.asc(), ChatMessage.id.asc()).all()
+        return [(msg.role, msg.content) for msg in messages]
+
+
+def report(label: str, rows: int, orm_func, core_func):
+    orm_rate = rows / measure(orm_func)
+    core_rate = rows / measure(core_func)
+    print(f"{label:>22} | {rows:>8,} | {orm_rate:>12,.0f} | {core_rate:>12,.0f} | {core_rate / orm_rate:>5.1f}x")
+
+
+def run(sessions: int, messages: int):
+    print(f"{'Lectura':>22} | {'Filas':>8} | {'ORM (filas/s)':>12} | {'Core (filas/s)':>12} | {'':>6}")
+    print("-" * 75)
+    with temporary_database() as (db_manager, _):
+        user_id = seed_user_history(db_manager, sessions, messages_per_session=2)
+        report("Sidebar (sesiones)", sessions,
+               lambda: sidebar_orm(db_manager, user_id),
+               lambda: db_manager.get_user_sessions(user_id))
+
+    with temporary_database() as (db_manager, _):
+        user_id = seed_user_history(db_manager, 1, messages_per_session=messages)
+        session_id = db_manager.get_latest_chat_session(user_id).id
+        report("Historial completo", messages,
+               lambda: history_orm(db_manager, session_id),
+               lambda: db_manager.get_session_messages(session_id))
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    run(args[0] if args else DEFAULT_SESSIONS, args[1] if len(args) > 1 else DEFAULT_MESSAGES)
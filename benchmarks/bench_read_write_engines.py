@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la latencia de escritura de turnos del chat con y sin
+analíticas corriendo en paralelo. Las analíticas leen por el engine de
+solo lectura y los turnos se escriben por la conexión única del escritor:
+en WAL las lecturas no toman el lock de escritura, así que la latencia de
+add_turn solo debería subir por el costo de CPU del hilo lector.
+
+Para ejecutar: python -m benchmarks.bench_read_write_engines [sesiones] [turnos]
+"""
+
+import statistics
+import sys
+import threading
+import time
+
+from benchmarks.common import temporary_database, seed_user_history
+
+DEFAULT_SESSIONS = 1_000
+DEFAULT_TURNS = 200
+
+
+def measure_writes(db_manager, session_id: int, turns: int) -> list:
+    """Guarda `turns` turnos y retorna la latencia de cada uno en ms."""
+    latencies = []
+    for n in range(turns):
+        started = time.perf_counter()
+        db_manager.add_turn(session_id, f"Pregunta {n}", "¡Correcto! Sigamos.")
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def run(sessions: int, turns: int):
+    print(f"{'Escenario':>28} | {'p50 (ms)':>9} | {'p95 (ms)':>9} | {'máx (ms)':>9} | {'Analíticas':>10}")
+    print("-" * 78)
+    with temporary_database() as (db_manager, db_path):
+        user_id = seed_user_history(db_manager, sessions, messages_per_session=20)
+        session_id = db_manager.create_chat_session(user_id, "Escrituras", "evaluemos").id
+
+        for label, concurrent in (("Solo escrituras", False), ("Con analíticas en paralelo", True)):
+            stop = threading.Event()
+            reads = [0]
+
+            def read_loop():
+                while not stop.is_set():
+                    # Sin caché: cada vuelta es la transacción de lectura completa
+                    db_manager._compute_user_analytics_data(user_id)
+                    reads[0] += 1
+
+            reader = threading.Thread(target=read_loop, daemon=True) if concurrent else None
+            if reader:
+                reader.start()
+            try:
+                latencies = sorted(measure_writes(db_manager, session_id, turns))
+            finally:
+                stop.set()
+                if reader:
+                    reader.join()
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            print(f"{label:>28} | {statistics.median(latencies):>9.2f} | {p95:>9.2f} | "
+                  f"{latencies[-1]:>9.2f} | {reads[0]:>10}")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    run(args[0] if args else DEFAULT_SESSIONS, args[1] if len(args) > 1 else DEFAULT_TURNS)
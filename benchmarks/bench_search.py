@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la búsqueda de texto completo (FTS5) sobre el historial.
+Genera N mensajes con un vocabulario de frecuencias tipo Zipf, mide la reconstrucción completa del índice y compara
+search_messages con un recorrido LIKE '%texto%' sobre chat_messages.
+
+Para ejecutar: python -m benchmarks.bench_search [mensajes]
+"""
+
+import itertools
+import sys
+import time
+
+from sqlalchemy import text
+
+from benchmarks.common import temporary_database, seed_user_history, measure
+
+DEFAULT_MESSAGES = 1_000_000
+MESSAGES_PER_SESSION = 4
+
+# Vocabulario con frecuencias tipo Zipf: unas pocas palabras muy comunes y
+# una cola larga de términos poco frecuentes, como en transcripciones reales
+COMMON_WORDS = [
+    "proyecto", "gestión", "riesgo", "alcance", "cronograma", "costos", "calidad",
+    "interesados", "recursos", "comunicaciones", "adquisiciones", "integración",
+    "respuesta", "pregunta", "correcto", "incorrecto", "opción", "proceso",
+]
+RARE_WORDS = [f"término{i}" for i in range(20_000)]
+VOCABULARY = COMMON_WORDS + RARE_WORDS
+CUMULATIVE_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+
+# (consulta FTS, patrón LIKE equivalente)
+QUERIES = [
+    ("riesgo", "%riesgo%"),
+    ("control del alcance", "%alcance%"),
+    ("término150", "%término150 %"),
+    ("término19999", "%término19999%"),
+    ("palabrainexistente", "%palabrainexistente%"),
+]
+
+
+def make_content(rnd, role: str) -> str:
+    return " ".join(rnd.choices(VOCABULARY, cum_weights=CUMULATIVE_WEIGHTS, k=rnd.randint(8, 40)))
+
+
+def like_search(db_manager, user_id: int, pattern: str):
+    """Búsqueda sin índice: recorre todos los mensajes del usuario."""
+    with db_manager.engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT m.id FROM chat_messages m JOIN chat_sessions s ON s.id = m.session_id
+            WHERE s.user_id = :user_id AND pmp_decompress(m.content) LIKE :pattern
+            ORDER BY m.id DESC LIMIT 20
+        """), {"user_id": user_id, "pattern": pattern}).all()
+
+
+def run(messages: int):
+    with temporary_database() as (db_manager, _):
+        started = time.perf_counter()
+        user_id = seed_user_history(
+            db_manager, messages // MESSAGES_PER_SESSION, MESSAGES_PER_SESSION, make_content=make_content
+        )
+        print(f"Mensajes generados: {messages:,} en {time.perf_counter() - started:.1f} s (índice incluido)")
+
+        started = time.perf_counter()
+        db_manager.rebuild_search_index()
+        print(f"Reconstrucción completa del índice: {time.perf_counter() - started:.1f} s")
+        print()
+
+        print(f"{'Consulta':>22} | {'FTS5 (ms)':>9} | {'LIKE (ms)':>9}")
+        print("-" * 47)
+        for query, pattern in QUERIES:
+            fts = measure(lambda: db_manager.search_messages(user_id, query, limit=20))
+            like = measure(lambda: like_search(db_manager, user_id, pattern), repeat=1)
+            print(f"{query:>22} | {fts * 1000:>9.1f} | {like * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MESSAGES)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Benchmark del refresco del sidebar (load_conversations_list) según la
+longitud de las conversaciones. Compara el cálculo anterior del preview
+(get_session_messages por cada sesión) con el resumen guardado en
+chat_sessions, que se lee con una sola consulta.
+
+Para ejecutar: python -m benchmarks.bench_sidebar [sesiones] [mensajes por sesión ...]
+"""
+
+import sys
+
+from benchmarks.common import temporary_database, seed_user_history, count_queries, measure
+
+DEFAULT_SESSIONS = 30
+DEFAULT_LENGTHS = [10, 100, 1_000]
+
+
+def refresh_with_history(db_manager, user_id: int):
+    """Camino anterior: historial completo de cada sesión para leer el último mensaje."""
+    previews = []
+    for session in db_manager.get_user_sessions(user_id):
+        messages = db_manager.get_session_messages(session.id)
+        previews.append(messages[-1][1][:45] if messages else None)
+    return previews
+
+
+def refresh_with_summary(db_manager, user_id: int):
+    """Camino actual: el resumen viaja con la lista de sesiones."""
+    return [(session.last_message_preview or "")[:45] for session in db_manager.get_user_sessions(user_id)]
+
+
+def run(sessions: int, lengths):
+    print(f"Sesiones en el sidebar: {sessions}")
+    print(f"{'Mensajes/sesión':>15} | {'Historial (ms)':>14} | {'Consultas':>9} | {'Resumen (ms)':>12} | {'Consultas':>9}")
+    print("-" * 72)
+    for length in lengths:
+        with temporary_database() as (db_manager, _):
+            user_id = seed_user_history(db_manager, sessions, messages_per_session=length)
+            row = [f"{length:>15,}"]
+            for refresh in (refresh_with_history, refresh_with_summary):
+                with count_queries(db_manager.read_engine) as counter:
+                    refresh(db_manager, user_id)
+                elapsed = measure(lambda: refresh(db_manager, user_id))
+                row.append(f"{elapsed * 1000:>14.2f}" if refresh is refresh_with_history else f"{elapsed * 1000:>12.2f}")
+                row.append(f"{counter['queries']:>9}")
+            print(" | ".join(row))
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    run(args[0] if args else DEFAULT_SESSIONS, args[1:] or DEFAULT_LENGTHS)
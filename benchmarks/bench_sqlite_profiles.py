@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Benchmark de los perfiles de conexión SQLite ('durable' y 'fast') frente a la
+configuración por defecto de SQLite (rollback journal, synchronous=FULL).
+Mide inserciones con add_message (una transacción por mensaje, como en el
+chat) y lecturas de historial con get_session_messages.
+
+Para ejecutar: python -m benchmarks.bench_sqlite_profiles [mensajes]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from db.models import DatabaseManager, SQLITE_PROFILES, dispose_engines
+
+BASELINE_PROFILE = "sqlite_por_defecto"
+
+
+def bench_profile(profile: str, messages: int) -> tuple:
+    """Retorna (inserciones/s, lecturas de historial/s) para el perfil."""
+    temp_dir = tempfile.mkdtemp(prefix="pmp_bench_")
+    try:
+        db_manager = DatabaseManager(f"sqlite:///{os.path.join(temp_dir, 'bench.db')}", profile=profile)
+        user = db_manager.create_user("bench_profile", "profile@example.com", "Bench1234")
+        session = db_manager.create_chat_session(user.id, "Benchmark")
+
+        started = time.perf_counter()
+        for i in range(messages):
+            db_manager.add_message(session.id, "user" if i % 2 == 0 else "assistant", f"Mensaje {i} " * 20)
+        insert_rate = messages / (time.perf_counter() - started)
+
+        reads = 200
+        started = time.perf_counter()
+        for _ in range(reads):
+            db_manager.get_session_messages(session.id)
+        read_rate = reads / (time.perf_counter() - started)
+        return insert_rate, read_rate
+    finally:
+        dispose_engines()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def run(messages: int):
+    # Perfil sin PRAGMA adicionales: comportamiento previo de create_engine
+    SQLITE_PROFILES[BASELINE_PROFILE] = {}
+    try:
+        print(f"Mensajes insertados por perfil: {messages}")
+        print(f"{'Perfil':>20} | {'Inserciones/s':>13} | {'Lecturas/s':>10}")
+        print("-" * 50)
+        for profile in (BASELINE_PROFILE, "durable", "fast"):
+            insert_rate, read_rate = bench_profile(profile, messages)
+            print(f"{profile:>20} | {insert_rate:>13.0f} | {read_rate:>10.0f}")
+    finally:
+        SQLITE_PROFILES.pop(BASELINE_PROFILE, None)
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark de las operaciones que usan las capas de la aplicación sobre cada
+backend de almacenamiento: SQLite en disco frente a memoria (memory://).
+La diferencia es el costo del almacenamiento; lo que queda en memoria es
+el costo propio de la capa (registros, resumen, estadísticas, analíticas).
+
+Para ejecutar: python -m benchmarks.bench_storage_backends [sesiones] [turnos por sesión]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from db.storage import open_storage
+
+DEFAULT_SESSIONS = 200
+DEFAULT_TURNS = 10
+
+
+def workload(storage, sessions: int, turns: int) -> dict:
+    """Ejecuta el recorrido típico de un usuario y retorna el tiempo de cada etapa en ms."""
+    timings = {}
+
+    def timed(label, func):
+        started = time.perf_counter()
+        result = func()
+        timings[label] = (time.perf_counter() - started) * 1000
+        return result
+
+    user = timed("Registro y login", lambda: (
+        storage.create_user("bench_backend", "bench_backend@example.com", "Bench1234"),
+        storage.authenticate_user("bench_backend", "Bench1234")
+    )[1])
+    modes = ["charlemos", "estudiemos", "evaluemos", "simulemos"]
+    session_ids = timed("Crear sesiones", lambda: [
+        storage.create_chat_session(user.id, f"Sesión {n}", modes[n % len(modes)]).id for n in range(sessions)
+    ])
+    timed("Guardar turnos", lambda: [
+        storage.add_turn(session_id, f"Pregunta {n} sobre riesgos", "¡Correcto! Repasemos el alcance.")
+        for session_id in session_ids for n in range(turns)
+    ])
+    timed("Sidebar", lambda: storage.get_user_sessions(user.id))
+    timed("Abrir conversaciones", lambda: [storage.get_session_messages_page(session_id) for session_id in session_ids])
+    timed("Buscar", lambda: storage.search_messages(user.id, "riesgos"))
+    timed("Analíticas", lambda: storage.get_user_analytics_data(user.id))
+    return timings
+
+
+def run(sessions: int, turns: int):
+    temp_dir = tempfile.mkdtemp(prefix="pmp_bench_")
+    try:
+        sqlite_timings = workload(open_storage(f"sqlite:///{os.path.join(temp_dir, 'bench.db')}"), sessions, turns)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    memory_timings = workload(open_storage("memory://bench"), sessions, turns)
+
+    print(f"{sessions} sesiones, {sessions * turns * 2:,} mensajes")
+    print(f"{'Etapa':>22} | {'SQLite (ms)':>12} | {'Memoria (ms)':>12}")
+    print("-" * 52)
+    for label, sqlite_ms in sqlite_timings.items():
+        print(f"{label:>22} | {sqlite_ms:>12.1f} | {memory_timings[label]:>12.1f}")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    run(args[0] if args else DEFAULT_SESSIONS, args[1] if len(args) > 1 else DEFAULT_TURNS)
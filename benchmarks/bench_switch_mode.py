@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark del costo de base de datos de ChatUI.switch_mode.
+Cada cambio de modo construye un ChatBot nuevo; se compara el tiempo de
+construcción con un engine nuevo por instancia (registro vacío, como antes
+del registro compartido) contra el engine compartido por URL.
+
+Para ejecutar: python -m benchmarks.bench_switch_mode [repeticiones]
+"""
+
+import os
+import sys
+import tempfile
+import shutil
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")  # ChatOpenAI no hace llamadas al construirse
+
+from chatbot import ChatBot
+from db.models import DatabaseManager, dispose_engines
+
+MODES = ["charlemos", "estudiemos", "evaluemos", "simulemos"]
+
+
+def build_chatbot(user_id: int, mode: str):
+    """Trabajo completo de switch_mode: construir el ChatBot del nuevo modo."""
+    ChatBot(user_id, mode)
+
+
+def build_data_layer(user_id: int, mode: str):
+    """Solo la parte de base de datos de la construcción del ChatBot."""
+    db_manager = DatabaseManager()
+    session = db_manager.get_latest_chat_session(user_id)
+    db_manager.get_session_messages(session.id)
+
+
+def time_switches(action, user_id: int, repeat: int, cold: bool) -> float:
+    """Retorna el tiempo promedio en milisegundos por cambio de modo."""
+    total = 0.0
+    for i in range(repeat):
+        if cold:
+            dispose_engines()
+        started = time.perf_counter()
+        action(user_id, MODES[i % len(MODES)])
+        total += time.perf_counter() - started
+    return total / repeat * 1000
+
+
+def run(repeat: int):
+    original_dir = os.getcwd()
+    temp_dir = tempfile.mkdtemp(prefix="pmp_bench_")
+    try:
+        # ChatBot usa la base de datos por defecto del directorio actual
+        os.chdir(temp_dir)
+        user = DatabaseManager().create_user("bench_switch", "switch@example.com", "Bench1234")
+
+        print(f"Cambios de modo medidos: {repeat}")
+        print(f"{'':22} | {'Engine nuevo':>12} | {'Compartido':>10} | {'Reducción':>9}")
+        print("-" * 62)
+        for label, action in (("switch_mode (ChatBot)", build_chatbot), ("Solo capa de datos", build_data_layer)):
+            cold = time_switches(action, user.id, repeat, cold=True)
+            DatabaseManager()  # Calentar el registro
+            warm = time_switches(action, user.id, repeat, cold=False)
+            print(f"{label:22} | {cold:9.2f} ms | {warm:7.2f} ms | {(1 - warm / cold) * 100:8.1f} %")
+    finally:
+        dispose_engines()
+        os.chdir(original_dir)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
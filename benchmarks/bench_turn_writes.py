@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark del guardado de turnos del chat: dos llamadas a add_message (el
+camino anterior de ChatBot.send_message), add_turn en una transacción, y el
+escritor en segundo plano, donde se mide lo que espera el hilo que envía.
+
+Para ejecutar: python -m benchmarks.bench_turn_writes [turnos] [perfil]
+"""
+
+import sys
+import time
+
+from benchmarks.common import temporary_database
+from db.models import DatabaseManager
+from db.writer import MessageWriter
+
+QUESTION = "¿Cuál es la diferencia entre el alcance del producto y el del proyecto? " * 3
+ANSWER = "El alcance del producto describe las características del resultado; el del proyecto, el trabajo. " * 8
+
+
+def bench_add_message(db_manager, session_id: int, turns: int) -> float:
+    started = time.perf_counter()
+    for _ in range(turns):
+        db_manager.add_message(session_id, "user", QUESTION)
+        db_manager.add_message(session_id, "assistant", ANSWER)
+    return time.perf_counter() - started
+
+
+def bench_add_turn(db_manager, session_id: int, turns: int) -> float:
+    started = time.perf_counter()
+    for _ in range(turns):
+        db_manager.add_turn(session_id, QUESTION, ANSWER)
+    return time.perf_counter() - started
+
+
+def bench_writer(db_manager, session_id: int, turns: int) -> tuple:
+    """Retorna (tiempo de encolado visto por la UI, tiempo hasta quedar en disco)."""
+    writer = MessageWriter(db_manager)
+    try:
+        started = time.perf_counter()
+        for _ in range(turns):
+            writer.submit_turn(session_id, QUESTION, ANSWER)
+        submitted = time.perf_counter() - started
+        writer.flush()
+        return submitted, time.perf_counter() - started
+    finally:
+        writer.close()
+
+
+def run(turns: int, profile: str = None):
+    with temporary_database() as (_, db_path):
+        db_manager = DatabaseManager(f"sqlite:///{db_path}", profile=profile)
+        user = db_manager.create_user("bench_turns", "turns@example.com", "Bench1234")
+        session_id = db_manager.create_chat_session(user.id, "Benchmark").id
+
+        print(f"Turnos guardados por estrategia: {turns} (perfil {db_manager._engine_entry.profile})")
+        print(f"{'Estrategia':>28} | {'ms/turno':>9} | {'Turnos/s':>9}")
+        print("-" * 54)
+
+        def report(label, elapsed):
+            print(f"{label:>28} | {elapsed / turns * 1000:>9.3f} | {turns / elapsed:>9.0f}")
+
+        report("2 x add_message", bench_add_message(db_manager, session_id, turns))
+        report("add_turn", bench_add_turn(db_manager, session_id, turns))
+        submitted, persisted = bench_writer(db_manager, session_id, turns)
+        report("escritor (espera de la UI)", submitted)
+        report("escritor (hasta el disco)", persisted)
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 500, sys.argv[2] if len(sys.argv) > 2 else None)
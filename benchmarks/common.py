@@ -0,0 +1,122 @@
+"""
+Utilidades compartidas por los benchmarks: bases temporales, generación
+masiva de historial y medición de tiempos y consultas.
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, insert
+
+from db.models import DatabaseManager, ChatSession, ChatMessage
+
+MODES = ["charlemos", "estudiemos", "evaluemos", "simulemos"]
+
+SAMPLE_MESSAGES = {
+    "user": [
+        "¿Puedes explicarme la gestión de riesgos?",
+        "Mi respuesta es la opción B",
+        "Quiero un simulacro de 60 minutos",
+        "No entiendo la diferencia entre alcance y cronograma",
+    ],
+    "assistant": [
+        "¡Correcto! La opción B es la respuesta adecuada para este escenario de riesgo.",
+        "Incorrecto. Revisa el proceso de control del alcance antes de continuar.",
+        "Pregunta 3: selecciona la alternativa que mejor describe a los interesados.",
+        "Simulacro finalizado. Tu resultado es 72%. Repasemos calidad y costos.",
+    ],
+}
+
+
+@contextmanager
+def temporary_database():
+    """Crea un DatabaseManager sobre un archivo SQLite temporal y lo elimina al salir."""
+    temp_dir = tempfile.mkdtemp(prefix="pmp_bench_")
+    db_path = os.path.join(temp_dir, "bench.db")
+    try:
+        yield DatabaseManager(f"sqlite:///{db_path}"), db_path
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def seed_user_history(db_manager, sessions: int, messages_per_session: int = 4, seed: int = 42,
+                      make_content=None) -> int:
+    """
+    Genera un usuario con el número indicado de sesiones y mensajes usando
+    inserciones masivas. Retorna el ID del usuario creado.
+
+    make_content(rnd, role) permite generar el texto de cada mensaje; por
+    defecto se elige uno de SAMPLE_MESSAGES.
+    """
+    rnd = random.Random(seed)
+    user = db_manager.create_user(f"bench_{sessions}", f"bench_{sessions}@example.com", "Bench1234")
+    start = datetime(2024, 1, 1, 8, 0)
+    batch_size = 5000
+
+    with db_manager.get_session() as db:
+        for batch_start in range(0, sessions, batch_size):
+            batch_end = min(batch_start + batch_size, sessions)
+            session_rows = []
+            for i in range(batch_start, batch_end):
+                created = start + timedelta(hours=i * 3 + rnd.randint(0, 2))
+                session_rows.append({
+                    "user_id": user.id,
+                    "name": f"Sesión {i}",
+                    "mode": MODES[i % len(MODES)],
+                    "created_at": created,
+                    "last_used_at": created,
+                })
+            db.execute(insert(ChatSession), session_rows)
+            first_id = db.query(ChatSession.id).order_by(ChatSession.id.desc()).limit(1).scalar() - len(session_rows) + 1
+
+            message_rows = []
+            for offset, session_row in enumerate(session_rows):
+                timestamp = session_row["created_at"]
+                for j in range(messages_per_session):
+                    role = "user" if j % 2 == 0 else "assistant"
+                    timestamp = timestamp + timedelta(minutes=rnd.choice([1, 2, 4, 8, 15]))
+                    message_rows.append({
+                        "session_id": first_id + offset,
+                        "role": role,
+                        "content": make_content(rnd, role) if make_content else rnd.choice(SAMPLE_MESSAGES[role]),
+                        "timestamp": timestamp,
+                    })
+            db.execute(insert(ChatMessage), message_rows)
+            db.commit()
+
+    # Las inserciones masivas no pasan por add_message
+    db_manager.rebuild_session_stats()
+    db_manager.rebuild_session_summaries()
+    db_manager.rebuild_daily_activity([user.id])
+    db_manager.rebuild_search_index()
+    return user.id
+
+
+@contextmanager
+def count_queries(engine):
+    """Cuenta las sentencias SQL emitidas por el engine dentro del bloque."""
+    counter = {"queries": 0}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter["queries"] += 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def measure(func, repeat: int = 3) -> float:
+    """Ejecuta la función varias veces y retorna el mejor tiempo en segundos."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
@@ -7,13 +7,18 @@ import flet as ft
 from typing import List, Tuple
 from chatbot import ChatBot
 from db.models import User, get_local_datetime
+from db.timestamps import to_local
+from db.analytics import RECENT_DAYS, recent_days_window
+from db.async_manager import AsyncDatabaseManager
+from db.writer import MessageWriteError
 import threading
 import time
 import datetime
 
-def create_chat_message(message: str, is_user: bool):
+def create_chat_message(message: str, is_user: bool, key: str = None):
     """
     Función para crear mensajes individuales del chat con estilo Slack/Discord.
+    La key opcional permite volver a un mensaje con scroll_to.
     """
     # Obtener timestamp actual en GMT-3
     timestamp = get_local_datetime().strftime("%H:%M")
@@ -101,6 +106,7 @@ def create_chat_message(message: str, is_user: bool):
     
     # Contenedor principal con hover effect
     return ft.Container(
+        key=key,
         content=message_row,
         padding=ft.padding.symmetric(horizontal=16, vertical=8),
         margin=ft.margin.only(bottom=2),
@@ -120,6 +126,7 @@ class ChatUI:
     def __init__(self, user: User):
         self.user = user
         self.chatbot = None
+        self.async_db = AsyncDatabaseManager()  # Consultas de los handlers asíncronos
         self.on_logout_callback = None  # Callback para logout
         self.current_session = None
         self.sessions_list = []
@@ -134,7 +141,9 @@ class ChatUI:
             spacing=5,
             expand=True,
             width=None,  # Se ajusta al contenedor padre
-            horizontal_alignment=ft.CrossAxisAlignment.STRETCH
+            horizontal_alignment=ft.CrossAxisAlignment.STRETCH,
+            on_scroll=self.handle_chat_scroll,  # Carga mensajes anteriores al llegar arriba
+            on_scroll_interval=100
         )
         
         # Lista de conversaciones (sidebar)
@@ -144,6 +153,18 @@ class ChatUI:
             width=250
         )
         
+        # Búsqueda en el historial de conversaciones (sidebar)
+        self.search_input = ft.TextField(
+            hint_text="Buscar en conversaciones...",
+            prefix_icon=ft.Icons.SEARCH,
+            dense=True,
+            border_radius=20,
+            text_size=12,
+            content_padding=ft.padding.symmetric(8, 10),
+            on_submit=self.search_conversations,
+            on_change=self.handle_search_change
+        )
+        
         # Campo de entrada de mensajes
         self.message_input = ft.TextField(
             hint_text="Escribe tu mensaje aquí...",
@@ -179,6 +200,7 @@ class ChatUI:
         self.page = None
         self.sidebar_visible = True
         self.should_auto_scroll = False  # Controla cuándo hacer auto-scroll
+        self.is_loading_older = False  # Evita cargar la misma página dos veces
         self.showing_profile = False  # Controla si se está mostrando el formulario de perfil
         self.cronometro_visible = False
         self.cronometro_segundos = 0
@@ -223,7 +245,7 @@ class ChatUI:
             try:
                 # Solo inicializar chatbot si hay un modo seleccionado
                 if self.current_mode:
-                    self.chatbot = ChatBot(self.user.id, self.current_mode)
+                    self.chatbot = ChatBot(self.user.id, self.current_mode, write_behind=True)
                     if self.chatbot.is_api_key_valid():
                         self.status_text.value = f"✅ Conectado como {self.user.username}"
                         self.status_text.color = ft.Colors.GREEN_600
@@ -316,6 +338,12 @@ Análisis profundo de casos prácticos
         self.load_conversations_list()
         
         # Cargar historial de la conversación actual
+        self.render_conversation_history()
+    
+    def render_conversation_history(self):
+        """
+        Dibuja en el chat el historial ya cargado por el chatbot.
+        """
         history = self.chatbot.get_conversation_history()
         self.chat_container.controls.clear()
         for role, content in history:
@@ -328,30 +356,211 @@ Análisis profundo de casos prácticos
             self.should_auto_scroll = True
             self.scroll_to_bottom()
     
+    async def handle_chat_scroll(self, e):
+        """
+        Carga la página anterior del historial cuando el usuario llega al inicio del chat.
+        """
+        if e.pixels is None or e.min_scroll_extent is None:
+            return
+        if e.pixels <= e.min_scroll_extent + 50:
+            await self.load_older_messages()
+    
+    async def load_older_messages(self):
+        """
+        Agrega arriba del chat la página anterior del historial y mantiene
+        visible el mensaje que el usuario estaba leyendo.
+        """
+        if self.is_loading_older or not self.chatbot or not self.chatbot.has_older_messages:
+            return
+        
+        self.is_loading_older = True
+        try:
+            anchor_id = self.chatbot.history_cursor
+            older = await self.chatbot.aload_older_messages()
+            if not older:
+                return
+            
+            # El primer mensaje visible pasa a ser el ancla del scroll
+            anchor = self.chat_container.controls[0] if self.chat_container.controls else None
+            if anchor is not None and anchor.key is None:
+                anchor.key = f"msg-{anchor_id}"
+            
+            widgets = [
+                create_chat_message(content, role == "user", key=f"msg-{message_id}")
+                for message_id, role, content in older
+            ]
+            self.chat_container.controls[0:0] = widgets
+            
+            if self.page:
+                self.page.update()
+                if anchor is not None:
+                    self.chat_container.scroll_to(key=anchor.key, duration=0)
+        except Exception as e:
+            print(f"Error al cargar mensajes anteriores: {e}")
+        finally:
+            self.is_loading_older = False
+    
     def load_conversations_list(self):
         """
         Carga la lista de conversaciones del usuario en el sidebar, filtradas por modo actual.
+        Versión síncrona para hilos de trabajo; los handlers usan refresh_conversations_list.
         """
         if not self.chatbot:
             return
         
         try:
+            # Con una búsqueda activa, el sidebar muestra sus resultados actualizados
+            query = self.get_search_query()
+            if query:
+                results = self.chatbot.db_manager.search_messages(self.user.id, query, mode=self.current_mode, limit=30)
+                self.render_search_results(results)
+                return
+            
             # Obtener sesiones del usuario filtradas por modo actual
             mode_filter = self.current_mode if self.current_mode else None
-            self.sessions_list = self.chatbot.db_manager.get_user_sessions(self.user.id, mode_filter)
-            self.conversations_list.controls.clear()
-            
-            # Agregar cada conversación a la lista
-            for session in self.sessions_list:
-                conversation_item = self.create_conversation_item(session)
-                self.conversations_list.controls.append(conversation_item)
+            db_manager = self.chatbot.db_manager
+            self.render_conversations_list(
+                db_manager.get_user_sessions(self.user.id, mode_filter),
+                db_manager.get_archived_sessions(self.user.id, mode_filter)
+            )
+                
+        except Exception as e:
+            print(f"Error al cargar conversaciones: {e}")
+    
+    async def refresh_conversations_list(self):
+        """
+        Versión asíncrona de load_conversations_list: consulta la base de datos
+        sin bloquear el event loop de la UI.
+        """
+        if not self.chatbot:
+            return
+        
+        try:
+            query = self.get_search_query()
+            if query:
+                results = await self.async_db.search_messages(self.user.id, query, mode=self.current_mode, limit=30)
+                self.render_search_results(results)
+                return
             
-            if self.page:
-                self.page.update()
+            mode_filter = self.current_mode if self.current_mode else None
+            self.render_conversations_list(
+                await self.async_db.get_user_sessions(self.user.id, mode_filter),
+                await self.async_db.get_archived_sessions(self.user.id, mode_filter)
+            )
                 
         except Exception as e:
             print(f"Error al cargar conversaciones: {e}")
     
+    def render_conversations_list(self, sessions: list, archived_sessions: list = ()):
+        """
+        Dibuja en el sidebar las conversaciones indicadas y, debajo, las
+        del archivo histórico.
+        """
+        self.sessions_list = sessions
+        self.conversations_list.controls.clear()
+        
+        # Agregar cada conversación a la lista
+        for session in self.sessions_list:
+            conversation_item = self.create_conversation_item(session)
+            self.conversations_list.controls.append(conversation_item)
+        
+        if archived_sessions:
+            self.conversations_list.controls.append(
+                ft.Container(
+                    content=ft.Text("📦 Archivadas", size=12, weight=ft.FontWeight.BOLD, color=ft.Colors.GREY_600),
+                    padding=ft.padding.only(left=4, top=12, bottom=4)
+                )
+            )
+            for session in archived_sessions:
+                self.conversations_list.controls.append(self.create_archived_item(session))
+        
+        if self.page:
+            self.page.update()
+    
+    def get_search_query(self) -> str:
+        """
+        Retorna el texto de búsqueda del sidebar, vacío si no hay búsqueda activa.
+        """
+        return (self.search_input.value or "").strip()
+    
+    async def handle_search_change(self, e):
+        """
+        Vuelve al listado de conversaciones cuando se borra la búsqueda.
+        """
+        if not self.get_search_query():
+            await self.refresh_conversations_list()
+    
+    async def search_conversations(self, e=None):
+        """
+        Busca el texto ingresado en los mensajes del modo actual y muestra
+        los resultados en el sidebar, ordenados por relevancia.
+        """
+        await self.refresh_conversations_list()
+    
+    def render_search_results(self, results: list):
+        """
+        Dibuja en el sidebar los resultados de la búsqueda.
+        """
+        self.conversations_list.controls.clear()
+        
+        if not results:
+            self.conversations_list.controls.append(
+                ft.Text("Sin resultados", size=12, color=ft.Colors.GREY_600)
+            )
+        for result in results:
+            self.conversations_list.controls.append(self.create_search_result_item(result))
+        
+        if self.page:
+            self.page.update()
+    
+    def create_search_result_item(self, result):
+        """
+        Crea un elemento del sidebar para un mensaje encontrado; al hacer
+        clic abre la conversación que lo contiene.
+        """
+        colors = self.get_mode_colors(result.mode)
+        author = "Tú" if result.role == "user" else "Asistente PMP"
+        
+        async def open_session(e):
+            session = await self.async_db.get_chat_session(result.session_id)
+            if session:
+                await self.switch_conversation(session)
+        
+        return ft.Container(
+            content=ft.Column(
+                controls=[
+                    ft.Text(
+                        result.session_name,
+                        size=13,
+                        weight=ft.FontWeight.BOLD,
+                        color=colors["text"],
+                        overflow=ft.TextOverflow.ELLIPSIS
+                    ),
+                    ft.Text(
+                        f"{author}: {result.snippet}",
+                        size=11,
+                        color=ft.Colors.GREY_700,
+                        max_lines=3,
+                        overflow=ft.TextOverflow.ELLIPSIS
+                    ),
+                    ft.Text(
+                        self.format_date(result.timestamp),
+                        size=9,
+                        color=ft.Colors.GREY_500,
+                        text_align=ft.TextAlign.RIGHT
+                    )
+                ],
+                spacing=3
+            ),
+            padding=ft.padding.all(10),
+            margin=ft.margin.symmetric(0, 2),
+            bgcolor=colors["light"],
+            border=ft.border.all(1, colors["primary"]),
+            border_radius=8,
+            on_click=open_session,
+            ink=True
+        )
+    
     def get_mode_colors(self, mode: str):
         """
         Retorna los colores asociados a cada modo.
@@ -403,10 +612,9 @@ Análisis profundo de casos prácticos
             if isinstance(date_obj, str):
                 date_obj = datetime.fromisoformat(date_obj.replace('Z', '+00:00'))
             
-            # Asegurar que ambas fechas estén en la misma zona horaria (sin timezone)
+            # La base entrega fechas en UTC: se comparan en hora local (GMT-3), sin timezone
             now = get_local_datetime().replace(tzinfo=None)
-            if date_obj.tzinfo:
-                date_obj = date_obj.replace(tzinfo=None)
+            date_obj = to_local(date_obj).replace(tzinfo=None)
             
             # Calcular diferencia
             diff = now - date_obj
@@ -472,15 +680,11 @@ Análisis profundo de casos prácticos
             session_mode = getattr(session, 'mode', 'charlemos')
             colors = self.get_mode_colors(session_mode)
             
-            # Obtener preview del último mensaje
-            try:
-                messages = self.chatbot.db_manager.get_session_messages(session.id)
-                if messages:
-                    last_message = messages[-1][1]  # content del último mensaje
-                    preview = last_message[:45] + "..." if len(last_message) > 45 else last_message
-                else:
-                    preview = "Nueva conversación"
-            except:
+            # Preview del último mensaje (resumen guardado en la sesión)
+            last_message = getattr(session, 'last_message_preview', None)
+            if last_message:
+                preview = last_message[:45] + "..." if len(last_message) > 45 else last_message
+            else:
                 preview = "Nueva conversación"
             
             # Formatear fecha de último uso
@@ -560,7 +764,7 @@ Análisis profundo de casos prácticos
                 bgcolor=colors["primary"] if is_current else colors["light"],
                 border=ft.border.all(1, colors["primary"]) if not is_current else None,
                 border_radius=8,
-                on_click=lambda e, s=session: self.switch_conversation(s),
+                on_click=self.create_switch_handler(session),
                 ink=True
             )
             
@@ -576,10 +780,56 @@ Análisis profundo de casos prácticos
                 ),
                 padding=ft.padding.all(10),
                 margin=ft.margin.symmetric(0, 2),
-                on_click=lambda e, s=session: self.switch_conversation(s)
+                on_click=self.create_switch_handler(session)
             )
     
-    def switch_conversation(self, session):
+    def create_archived_item(self, session):
+        """
+        Crea un elemento del sidebar para una conversación archivada; al hacer
+        clic la devuelve a la base activa y la abre.
+        """
+        async def open_archived(e):
+            session_id = await self.async_db.restore_session(session.id)
+            restored = await self.async_db.get_chat_session(session_id) if session_id else None
+            if restored:
+                await self.switch_conversation(restored)
+        
+        return ft.Container(
+            content=ft.Column(
+                controls=[
+                    ft.Text(
+                        session.name,
+                        size=13,
+                        color=ft.Colors.GREY_700,
+                        overflow=ft.TextOverflow.ELLIPSIS
+                    ),
+                    ft.Text(
+                        self.format_date(session.last_used_at),
+                        size=9,
+                        color=ft.Colors.GREY_500,
+                        text_align=ft.TextAlign.RIGHT
+                    )
+                ],
+                spacing=3
+            ),
+            padding=ft.padding.all(10),
+            margin=ft.margin.symmetric(0, 2),
+            bgcolor=ft.Colors.GREY_100,
+            border_radius=8,
+            tooltip="Restaurar y abrir",
+            on_click=open_archived,
+            ink=True
+        )
+    
+    def create_switch_handler(self, session):
+        """
+        Crea el handler asíncrono que abre una conversación desde el sidebar.
+        """
+        async def handler(e):
+            await self.switch_conversation(session)
+        return handler
+    
+    async def switch_conversation(self, session):
         """
         Cambia a una conversación diferente.
         """
@@ -589,10 +839,11 @@ Análisis profundo de casos prácticos
         try:
             self.current_session = session
             self.chatbot.current_session = session
-            self.chatbot._load_conversation_history()
+            await self.chatbot.aload_conversation_history()
             
             # Recargar la interfaz
-            self.load_conversation_history()
+            await self.refresh_conversations_list()
+            self.render_conversation_history()
             
             # Hacer scroll hacia abajo al cambiar de conversación
             self.should_auto_scroll = True
@@ -659,28 +910,23 @@ Análisis profundo de casos prácticos
             autofocus=True
         )
         
-        def on_save(e):
+        async def on_save(e):
             print(f"Guardando nuevo nombre: {name_field.value}")
             new_name = name_field.value.strip()
             if new_name and new_name != session.name:
                 try:
                     # Actualizar en base de datos
-                    with self.chatbot.db_manager.get_session() as db:
-                        from db.models import ChatSession
-                        
-                        db_session = db.query(ChatSession).filter(
-                            ChatSession.id == session.id
-                        ).first()
-                        if db_session:
-                            db_session.name = new_name
-                            db.commit()
-                            print(f"Nombre actualizado en BD: {new_name}")
+                    if await self.async_db.rename_chat_session(session.id, new_name):
+                        print(f"Nombre actualizado en BD: {new_name}")
                     
-                    # Actualizar en memoria
-                    session.name = new_name
+                    # Actualizar en memoria la conversación abierta (los registros son inmutables)
+                    if self.current_session and self.current_session.id == session.id:
+                        self.current_session = self.current_session._replace(name=new_name)
+                        if self.chatbot:
+                            self.chatbot.current_session = self.current_session
                     
                     # Recargar lista
-                    self.load_conversations_list()
+                    await self.refresh_conversations_list()
                     print("Lista de conversaciones recargada")
                     
                 except Exception as error:
@@ -783,25 +1029,12 @@ Análisis profundo de casos prácticos
         """
         print(f"Mostrando diálogo de eliminar para: {session.name}")
         
-        def on_delete(e):
+        async def on_delete(e):
             print(f"Eliminando conversación: {session.name}")
             try:
-                # Eliminar de base de datos
-                with self.chatbot.db_manager.get_session() as db:
-                    from db.models import ChatMessage, ChatSession
-                    
-                    # Eliminar mensajes
-                    db.query(ChatMessage).filter(
-                        ChatMessage.session_id == session.id
-                    ).delete()
-                    
-                    # Eliminar sesión
-                    db.query(ChatSession).filter(
-                        ChatSession.id == session.id
-                    ).delete()
-                    
-                    db.commit()
-                    print("Conversación eliminada de la BD")
+                # Eliminar de base de datos (después de guardar los turnos pendientes)
+                await self.async_db.delete_chat_session(session.id)
+                print("Conversación eliminada de la BD")
                 
                 # Si era la conversación actual, limpiar la interfaz
                 if self.current_session and self.current_session.id == session.id:
@@ -811,7 +1044,7 @@ Análisis profundo de casos prácticos
                     print("Conversación actual eliminada, interfaz limpiada")
                 
                 # Recargar la lista de conversaciones
-                self.load_conversations_list()
+                await self.refresh_conversations_list()
                 print("Lista de conversaciones recargada")
                 
                 # Actualizar la página
@@ -1016,7 +1249,7 @@ Análisis profundo de casos prácticos
         )
         self.chat_container.controls.append(error_widget)
     
-    def new_conversation(self, e):
+    async def new_conversation(self, e):
         """
         Inicia una nueva conversación.
         """
@@ -1025,7 +1258,7 @@ Análisis profundo de casos prácticos
             return
             
         if self.chatbot:
-            self.chatbot.start_new_conversation()
+            await self.async_db.run(self.chatbot.start_new_conversation)
             self.current_session = self.chatbot.current_session
             self.chat_container.controls.clear()
             
@@ -1042,7 +1275,7 @@ Análisis profundo de casos prácticos
                 self.update_analicemos_mode()
             
             # Recargar lista de conversaciones
-            self.load_conversations_list()
+            await self.refresh_conversations_list()
             
             # Hacer scroll hacia abajo al crear nueva conversación
             self.should_auto_scroll = True
@@ -1325,7 +1558,7 @@ Análisis profundo de casos prácticos
                     color=ft.Colors.BLACK26 if is_dark_mode else ft.Colors.BLACK12,
                     offset=ft.Offset(0, 2)
                 ) if is_selected else None,
-                on_click=lambda e, mode=item["key"]: self.switch_mode(mode),
+                on_click=self.create_mode_handler(item["key"]),
                 ink=True,
                 animate=200
             )
@@ -1340,9 +1573,19 @@ Análisis profundo de casos prácticos
             scroll=ft.ScrollMode.AUTO
         )
     
-    def switch_mode(self, mode: str):
+    def create_mode_handler(self, mode: str):
+        """
+        Crea el handler asíncrono que cambia de modo desde el menú de navegación.
+        """
+        async def handler(e):
+            await self.switch_mode(mode)
+        return handler
+    
+    async def switch_mode(self, mode: str):
         """
         Cambia el modo de la aplicación.
+        El chatbot, las conversaciones y las analíticas se cargan en el pool de
+        la base de datos, sin bloquear el renderizado.
         """
         if self.current_mode != mode:
             # Detener cronómetro si cambiamos de modo
@@ -1362,15 +1605,33 @@ Análisis profundo de casos prácticos
                 autofocus=True  # Hacer autofocus cuando se activa un modo
             )
             
+            # Mostrar el cambio de inmediato mientras se cargan los datos
+            self.chat_container.controls.clear()
+            self.status_text.value = f"⏳ Cargando modo {mode.upper()}..."
+            if self.page:
+                self.page.update()
+            
             # Inicializar el chatbot con el nuevo modo
-            self.chatbot = ChatBot(self.user.id, self.current_mode)
+            chatbot = await self.async_db.run(ChatBot, self.user.id, mode, write_behind=True)
+            analytics = recent = None
+            if mode == "analicemos":
+                try:
+                    analytics = await self.async_db.get_user_analytics_data(self.user.id)
+                    since, until = recent_days_window(RECENT_DAYS)
+                    recent = await self.async_db.get_user_analytics_data(
+                        self.user.id, since=since, until=until, compare=True)
+                except Exception as e:
+                    print(f"Error obteniendo datos analíticos: {e}")
+            if self.current_mode != mode:
+                return  # Otro cambio de modo más reciente tomó el control
+            self.chatbot = chatbot
             # Limpiar el chat para el nuevo modo
             self.chat_container.controls.clear()
             # Limpiar la sesión actual para que se cree una nueva cuando sea necesario
             self.current_session = None
             
             # Recargar las conversaciones filtradas por el nuevo modo
-            self.load_conversations_list()
+            await self.refresh_conversations_list()
             
             # Actualizar la interfaz según el modo
             if mode == "charlemos":
@@ -1382,7 +1643,7 @@ Análisis profundo de casos prácticos
             elif mode == "simulemos":
                 self.update_simulemos_mode()
             elif mode == "analicemos":
-                self.update_analicemos_mode()
+                self.update_analicemos_mode(analytics, recent)
             
             # Actualizar el status text
             self.status_text.value = f"✅ Conectado como {self.user.username} - Modo {mode.upper()} activo"
@@ -1471,9 +1732,12 @@ Análisis profundo de casos prácticos
             welcome_widget = create_chat_message(welcome_message, False)
             self.chat_container.controls.append(welcome_widget)
     
-    def update_analicemos_mode(self):
+    def update_analicemos_mode(self, analytics: dict = None, recent: dict = None):
         """
         Actualiza la interfaz para el modo ANALICEMOS CÓMO VAMOS.
+        Si no se reciben las analíticas ya cargadas, se consultan aquí.
+        recent son las analíticas de los últimos RECENT_DAYS días comparadas
+        con los anteriores; solo leen las sesiones de esas dos ventanas.
         """
         # Utilidad para traducción de días y formato de fecha
         dias_es = {
@@ -1499,13 +1763,20 @@ Análisis profundo de casos prácticos
         self.chat_container.controls.clear()
 
         # Obtener datos reales del usuario
-        analytics = None
-        if self.chatbot and hasattr(self.chatbot, 'db_manager'):
+        if analytics is None and self.chatbot and hasattr(self.chatbot, 'db_manager'):
             try:
                 analytics = self.chatbot.db_manager.get_user_analytics_data(self.user.id)
             except Exception as e:
                 analytics = None
                 print(f"Error obteniendo datos analíticos: {e}")
+        if recent is None and self.chatbot and hasattr(self.chatbot, 'db_manager'):
+            try:
+                since, until = recent_days_window(RECENT_DAYS)
+                recent = self.chatbot.db_manager.get_user_analytics_data(
+                    self.user.id, since=since, until=until, compare=True)
+            except Exception as e:
+                recent = None
+                print(f"Error obteniendo datos analíticos recientes: {e}")
 
         # Valores por defecto si no hay datos
         overview = analytics['overview'] if analytics and 'overview' in analytics else {}
@@ -1553,6 +1824,41 @@ Análisis profundo de casos prácticos
             )
         ], spacing=16)
 
+        # Últimos días comparados con los anteriores
+        comparison = recent.get('comparison') if recent else None
+        recent_section = []
+        if comparison:
+            def recent_card(label, key, unit, color, bgcolor):
+                value = comparison['current'][key]
+                change = comparison['change'][key]
+                if change is None:
+                    change_text, change_color = "sin datos previos", ft.Colors.GREY_600
+                else:
+                    change_text = f"{change:+g}{unit} vs. {RECENT_DAYS} días anteriores"
+                    change_color = ft.Colors.GREEN_700 if change >= 0 else ft.Colors.RED_700
+                return ft.Container(
+                    content=ft.Column([
+                        ft.Text(label, size=12, color=ft.Colors.GREY_700),
+                        ft.Text(f"{value}{unit}" if value is not None else "-", size=20,
+                                weight=ft.FontWeight.BOLD, color=color),
+                        ft.Text(change_text, size=11, color=change_color)
+                    ], spacing=2),
+                    padding=ft.padding.all(12),
+                    bgcolor=bgcolor,
+                    border_radius=8,
+                    expand=True
+                )
+            recent_section = [
+                ft.Text(f"Últimos {RECENT_DAYS} días", size=16, weight=ft.FontWeight.BOLD, color=ft.Colors.GREY_800),
+                ft.Row([
+                    recent_card("Sesiones nuevas", 'sessions_created', "", ft.Colors.BLUE_700, ft.Colors.BLUE_50),
+                    recent_card("Horas activas", 'active_hours', "", ft.Colors.GREEN_700, ft.Colors.GREEN_50),
+                    recent_card("Días con estudio", 'active_days', "", ft.Colors.ORANGE_700, ft.Colors.ORANGE_50),
+                    recent_card("Precisión", 'accuracy_percent', "%", ft.Colors.PURPLE_700, ft.Colors.PURPLE_50)
+                ], spacing=12),
+                ft.Divider(height=24)
+            ]
+
         # Tabla de distribución por modo
         mode_labels = [
             ("charlemos", "Charlemos", ft.Colors.BLUE_600),
@@ -1615,11 +1921,20 @@ Análisis profundo de casos prácticos
         user_profile = analytics.get('user_profile', {}) if analytics else {}
         objetivo_diario = user_profile.get('study_hours_daily', 2) or 2
         objetivo_semanal = objetivo_diario * 7
-        progreso = min(total_study_hours / objetivo_semanal, 1.0) if objetivo_semanal > 0 else 0
+        # Horas activas de la semana en curso (de lunes a hoy), del resumen diario
+        weekly_activity = analytics.get('weekly_activity', {}) if analytics else {}
+        this_week = weekly_activity.get('this_week', {})
+        horas_semana = this_week.get('active_hours', 0)
+        progreso = min(horas_semana / objetivo_semanal, 1.0) if objetivo_semanal > 0 else 0
         progreso_section = ft.Column([
             ft.Text("Progreso hacia tu objetivo semanal de estudio", size=16, weight=ft.FontWeight.BOLD, color=ft.Colors.GREY_800),
             ft.ProgressBar(value=progreso, width=320, color=ft.Colors.BLUE_600),
-            ft.Text(f"{total_study_hours}h / {objetivo_semanal}h esta semana", size=14)
+            ft.Text(f"{horas_semana}h / {objetivo_semanal}h esta semana", size=14),
+            ft.Text(
+                f"{this_week.get('sessions', 0)} sesiones y {this_week.get('active_days', 0)} días de estudio esta semana "
+                f"(promedio: {weekly_activity.get('sessions_per_week', 0)} sesiones por semana)",
+                size=12, color=ft.Colors.GREY_600
+            )
         ], spacing=6)
 
         # --- 3. Rendimiento en evaluaciones ---
@@ -1651,6 +1966,30 @@ Análisis profundo de casos prácticos
         else:
             eval_section.append(ft.Text("No hay evaluaciones registradas.", color=ft.Colors.GREY_600))
 
+        # Aciertos por dominio de las preguntas con resultado registrado (EVALUEMOS y SIMULEMOS)
+        question_accuracy = analytics.get('question_accuracy', {}) if analytics else {}
+        if question_accuracy.get('has_data'):
+            dominios_es = {'people': 'Personas', 'process': 'Procesos', 'business_environment': 'Entorno de negocio',
+                           'sin_clasificar': 'Sin clasificar'}
+            accuracy_table = [ft.Row([
+                ft.Text("Dominio", width=140, weight=ft.FontWeight.BOLD),
+                ft.Text("Preguntas", width=80, weight=ft.FontWeight.BOLD),
+                ft.Text("Correctas", width=80, weight=ft.FontWeight.BOLD),
+                ft.Text("% Acierto", width=80, weight=ft.FontWeight.BOLD)
+            ], spacing=8)]
+            for group in question_accuracy.get('by_domain', []):
+                accuracy_table.append(ft.Row([
+                    ft.Text(dominios_es.get(group['name'], group['name']), width=140),
+                    ft.Text(str(group['attempts']), width=80),
+                    ft.Text(str(group['correct']), width=80),
+                    ft.Text(f"{group['accuracy_percent']}%", width=80)
+                ], spacing=8))
+            eval_section.append(ft.Text(
+                f"Aciertos por dominio: {question_accuracy['correct_answers']}/{question_accuracy['total_attempts']} "
+                f"({question_accuracy['accuracy_percent']}%)", size=14, weight=ft.FontWeight.BOLD
+            ))
+            eval_section.append(ft.Column(accuracy_table, spacing=2))
+
         # --- 4. Historial de simulacros ---
         simulations = analytics.get('simulations', {}) if analytics else {}
         sim_section = [ft.Text("Historial de simulacros (SIMULEMOS)", size=16, weight=ft.FontWeight.BOLD, color=ft.Colors.GREY_800)]
@@ -1765,6 +2104,7 @@ Análisis profundo de casos prácticos
             ft.Divider(height=16),
             summary_cards,
             ft.Divider(height=24),
+            *recent_section,
             ft.Text("Distribución de sesiones por modo", size=16, weight=ft.FontWeight.BOLD, color=ft.Colors.GREY_800),
             mode_table,
             ft.Divider(height=24),
@@ -1930,6 +2270,7 @@ Análisis profundo de casos prácticos
                                     ],
                                     alignment=ft.MainAxisAlignment.SPACE_BETWEEN
                                 ),
+                                self.search_input,
                                 ft.Container(
                                     content=self.conversations_list,
                                     expand=True
@@ -1965,6 +2306,13 @@ Análisis profundo de casos prácticos
         """
         Cierra la sesión del usuario actual y regresa a la pantalla de login.
         """
+        # Guardar los turnos que el escritor en segundo plano aún no escribió
+        if self.chatbot:
+            try:
+                self.chatbot.flush_pending_writes()
+            except MessageWriteError as e:
+                print(f"❌ {e}")
+        
         if self.on_logout_callback:
             self.on_logout_callback()
     
@@ -2075,69 +2423,69 @@ Análisis profundo de casos prácticos
         def save_profile(e):
             try:
                 # Actualizar datos del usuario en la base de datos
-                from db.database import DatabaseManager
-                db_manager = DatabaseManager()
+                # Reutilizar el gestor del chatbot (engine compartido) si está disponible
+                if self.chatbot:
+                    db_manager = self.chatbot.db_manager
+                else:
+                    from db.storage import open_storage
+                    db_manager = open_storage()
                 
-                with db_manager.get_session() as db:
-                    from db.models import User
+                def optional_int(value):
+                    try:
+                        return int(value) if value else None
+                    except ValueError:
+                        return None
+                
+                def optional_text(value):
+                    return value.strip() if value else None
+                
+                # También invalida las analíticas en caché, de las que forma parte el perfil
+                user = db_manager.update_user_profile(
+                    self.user.id,
+                    username=username_field.value.strip(),
+                    email=email_field.value.strip(),
+                    full_name=optional_text(full_name_field.value),
+                    phone=optional_text(phone_field.value),
+                    company=optional_text(company_field.value),
+                    position=optional_text(position_field.value),
+                    experience_years=optional_int(experience_field.value),
+                    target_exam_date=optional_text(target_date_field.value),
+                    study_hours_daily=optional_int(study_hours_field.value)
+                )
+                if user:
+                    # Registro local del usuario con el perfil actualizado
+                    self.user = user
+                    
+                    # Actualizar header con nuevo nombre
+                    self.rebuild_ui()
+                    
+                    # Mostrar mensaje de éxito
+                    success_message = ft.Container(
+                        content=ft.Text(
+                            "✅ Perfil actualizado exitosamente",
+                            color=ft.Colors.GREEN_600,
+                            size=16,
+                            weight=ft.FontWeight.BOLD
+                        ),
+                        padding=ft.padding.all(15),
+                        margin=ft.margin.only(bottom=20),
+                        bgcolor=ft.Colors.GREEN_50,
+                        border_radius=8,
+                        border=ft.border.all(1, ft.Colors.GREEN_200)
+                    )
+                    
+                    self.chat_container.controls.insert(0, success_message)
+                    self.page.update()
+                    
+                    # Volver al chat después de 2 segundos
+                    import threading
+                    import time
+                    def return_to_chat():
+                        time.sleep(2)
+                        self.return_to_chat()
+                    
+                    threading.Thread(target=return_to_chat, daemon=True).start()
                     
-                    user = db.query(User).filter(User.id == self.user.id).first()
-                    if user:
-                        user.username = username_field.value.strip()
-                        user.email = email_field.value.strip()
-                        user.full_name = full_name_field.value.strip() if full_name_field.value else None
-                        user.phone = phone_field.value.strip() if phone_field.value else None
-                        user.company = company_field.value.strip() if company_field.value else None
-                        user.position = position_field.value.strip() if position_field.value else None
-                        
-                        try:
-                            user.experience_years = int(experience_field.value) if experience_field.value else None
-                        except ValueError:
-                            user.experience_years = None
-                            
-                        user.target_exam_date = target_date_field.value.strip() if target_date_field.value else None
-                        
-                        try:
-                            user.study_hours_daily = int(study_hours_field.value) if study_hours_field.value else None
-                        except ValueError:
-                            user.study_hours_daily = None
-                        
-                        db.commit()
-                        
-                        # Actualizar objeto usuario local
-                        self.user.username = user.username
-                        self.user.email = user.email
-                        
-                        # Actualizar header con nuevo nombre
-                        self.rebuild_ui()
-                        
-                        # Mostrar mensaje de éxito
-                        success_message = ft.Container(
-                            content=ft.Text(
-                                "✅ Perfil actualizado exitosamente",
-                                color=ft.Colors.GREEN_600,
-                                size=16,
-                                weight=ft.FontWeight.BOLD
-                            ),
-                            padding=ft.padding.all(15),
-                            margin=ft.margin.only(bottom=20),
-                            bgcolor=ft.Colors.GREEN_50,
-                            border_radius=8,
-                            border=ft.border.all(1, ft.Colors.GREEN_200)
-                        )
-                        
-                        self.chat_container.controls.insert(0, success_message)
-                        self.page.update()
-                        
-                        # Volver al chat después de 2 segundos
-                        import threading
-                        import time
-                        def return_to_chat():
-                            time.sleep(2)
-                            self.return_to_chat()
-                        
-                        threading.Thread(target=return_to_chat, daemon=True).start()
-                        
             except Exception as error:
                 print(f"Error al actualizar perfil: {error}")
                 error_message = ft.Container(
@@ -8,7 +8,10 @@ from typing import List, Tuple
 from langchain_openai import ChatOpenAI
 from langchain.schema import HumanMessage, AIMessage, SystemMessage
 from langchain.memory import ConversationBufferMemory
-from db.models import DatabaseManager
+from db.models import get_local_datetime
+from db.attempts import VERDICT_INSTRUCTIONS, parse_verdicts
+from db.storage import open_storage
+from db.async_manager import AsyncDatabaseManager
 from dotenv import load_dotenv
 
 # Cargar variables de entorno
@@ -20,13 +23,22 @@ class ChatBot:
     y maneja la persistencia de datos.
     """
     
-    def __init__(self, user_id: int, mode: str = "charlemos"):
+    # Mensajes por página de historial; la última página es además el
+    # historial previo que se envía a la IA
+    HISTORY_PAGE_SIZE = 50
+    
+    # Modos en los que el modelo informa el resultado de cada respuesta (ver db/attempts.py)
+    ASSESSMENT_MODES = ("evaluemos", "simulemos")
+    
+    def __init__(self, user_id: int, mode: str = "charlemos", write_behind: bool = False):
         """
         Inicializa el chatbot con configuración de OpenAI y base de datos.
         
         Args:
             user_id (int): ID del usuario autenticado
             mode (str): Modo de operación del chatbot (charlemos, etc.)
+            write_behind (bool): Guardar los turnos en segundo plano en lugar
+                de esperar a la base de datos en send_message
         """
         self.user_id = user_id
         self.mode = mode
@@ -42,7 +54,9 @@ class ChatBot:
         )
         
         # Inicializar base de datos
-        self.db_manager = DatabaseManager()
+        self.db_manager = open_storage()
+        self.async_db = AsyncDatabaseManager(db_manager=self.db_manager)
+        self.message_writer = self.db_manager.get_message_writer() if write_behind else None
         
         # Obtener o crear sesión actual para el usuario
         self.current_session = self.db_manager.get_latest_chat_session(user_id)
@@ -248,7 +262,7 @@ ESTILO DE INTERACCIÓN:
 - Usa emojis para organizar visualmente el contenido
 - Proporciona estadísticas y analytics de manera clara y motivadora
 
-Responde siempre en español con un enfoque evaluativo y analítico."""
+Responde siempre en español con un enfoque evaluativo y analítico.""" + VERDICT_INSTRUCTIONS
             )
         elif mode == "simulemos":
             return SystemMessage(
@@ -382,7 +396,7 @@ ESTILO DE ADMINISTRACIÓN:
 - Motiva para continuar la preparación
 - Usa formato estructurado para presentar resultados
 
-Responde siempre en español con un enfoque de administrador de examen profesional."""
+Responde siempre en español con un enfoque de administrador de examen profesional.""" + VERDICT_INSTRUCTIONS
             )
         elif mode == "analicemos":
             return SystemMessage(
@@ -474,12 +488,28 @@ Responde siempre en español con un enfoque analítico, honesto y basado en dato
     
     def _load_conversation_history(self):
         """
-        Carga el historial de conversación desde la base de datos.
+        Carga la página más reciente del historial de conversación desde la
+        base de datos. Las páginas anteriores se obtienen con load_older_messages.
+        """
+        page = self.db_manager.get_session_messages_page(self.current_session.id, limit=self.HISTORY_PAGE_SIZE)
+        self._apply_history_page(page)
+    
+    async def aload_conversation_history(self):
+        """
+        Versión asíncrona de _load_conversation_history para los handlers de la UI.
+        """
+        page = await self.async_db.get_session_messages_page(self.current_session.id, limit=self.HISTORY_PAGE_SIZE)
+        self._apply_history_page(page)
+    
+    def _apply_history_page(self, page: list):
+        """
+        Reemplaza el historial local por la página más reciente.
         """
-        messages = self.db_manager.get_session_messages(self.current_session.id)
         self.conversation_history = []
+        self.history_cursor = page[0][0] if page else None
+        self.has_older_messages = len(page) == self.HISTORY_PAGE_SIZE
         
-        for role, content in messages:
+        for _, role, content in page:
             if role == "user":
                 self.conversation_history.append(HumanMessage(content=content))
             elif role == "assistant":
@@ -496,6 +526,8 @@ Responde siempre en español con un enfoque analítico, honesto y basado en dato
             str: Respuesta de la IA
         """
         try:
+            user_timestamp = get_local_datetime()
+            
             # Crear mensaje del usuario
             human_message = HumanMessage(content=user_message)
             
@@ -512,14 +544,22 @@ Responde siempre en español con un enfoque analítico, honesto y basado en dato
             response = self.llm.invoke(messages_to_send)
             ai_response = response.content
             
+            # En EVALUEMOS y SIMULEMOS, separar los veredictos estructurados del texto visible
+            verdicts = []
+            if self.mode in self.ASSESSMENT_MODES:
+                ai_response, verdicts = parse_verdicts(ai_response)
+            
             # Guardar ambos mensajes en el historial local (mensaje original del usuario, no el enhanced)
             original_human_message = HumanMessage(content=user_message)
             self.conversation_history.append(original_human_message)
             self.conversation_history.append(AIMessage(content=ai_response))
             
-            # Guardar en base de datos (mensaje original del usuario)
-            self.db_manager.add_message(self.current_session.id, "user", user_message)
-            self.db_manager.add_message(self.current_session.id, "assistant", ai_response)
+            # Guardar el turno completo en base de datos (mensaje original del usuario)
+            if self.message_writer:
+                self.message_writer.submit_turn(self.current_session.id, user_message, ai_response, user_timestamp,
+                                                verdicts)
+            else:
+                self.db_manager.add_turn(self.current_session.id, user_message, ai_response, user_timestamp, verdicts)
             
             return ai_response
             
@@ -571,6 +611,17 @@ Responde siempre en español con un enfoque analítico, honesto y basado en dato
                 context_parts.append(f"Total de mensajes: {overview.get('total_messages', 0)}")
                 context_parts.append(f"Tiempo total de estudio estimado: {overview.get('study_time_hours', 0)} horas")
                 context_parts.append(f"Racha de estudio: {overview.get('study_streak_days', 0)} días consecutivos")
+                weekly = analytics_data.get('weekly_activity', {})
+                if weekly.get('has_data'):
+                    this_week, last_week = weekly['this_week'], weekly['last_week']
+                    context_parts.append(
+                        f"Esta semana: {this_week['sessions']} sesiones, {this_week['active_hours']} horas activas, "
+                        f"{this_week['active_days']} días de estudio"
+                    )
+                    context_parts.append(
+                        f"Semana anterior: {last_week['sessions']} sesiones, {last_week['active_hours']} horas activas"
+                    )
+                    context_parts.append(f"Promedio reciente: {weekly['sessions_per_week']} sesiones por semana")
                 
                 if overview.get('sessions_by_mode'):
                     context_parts.append("Distribución por modo:")
@@ -590,7 +641,11 @@ Responde siempre en español con un enfoque analítico, honesto y basado en dato
                         context_parts.append(f"  - {session['date']}: {session['session_name']}")
                         context_parts.append(f"    Duración: {session['duration_minutes']} minutos")
                         context_parts.append(f"    Interacciones: {session['total_interactions']}")
-                        context_parts.append(f"    Preguntas estimadas: {session['questions_attempted']}")
+                        if session.get('answers_recorded'):
+                            context_parts.append(f"    Preguntas respondidas: {session['questions_attempted']}")
+                            context_parts.append(f"    Aciertos: {session['correct_answers']} ({session['accuracy_percent']}%)")
+                        else:
+                            context_parts.append(f"    Preguntas estimadas: {session['questions_attempted']}")
                         if session['topics_covered']:
                             context_parts.append(f"    Temas cubiertos: {', '.join(session['topics_covered'])}")
                 context_parts.append("")
@@ -599,6 +654,20 @@ Responde siempre en español con un enfoque analítico, honesto y basado en dato
                 context_parts.append(analytics_data.get('evaluations', {}).get('message', 'No hay datos de evaluaciones'))
                 context_parts.append("")
             
+            # Aciertos registrados con veredicto, por dominio y tema
+            if analytics_data.get('question_accuracy', {}).get('has_data'):
+                accuracy = analytics_data['question_accuracy']
+                context_parts.append("=== ACIERTOS EN PREGUNTAS ===")
+                context_parts.append(f"Preguntas respondidas: {accuracy['total_attempts']}")
+                context_parts.append(f"Respuestas correctas: {accuracy['correct_answers']} ({accuracy['accuracy_percent']}%)")
+                for title, key in (("Por dominio", 'by_domain'), ("Por tema", 'by_topic'), ("Por dificultad", 'by_difficulty')):
+                    context_parts.append(f"{title}:")
+                    for group in accuracy[key]:
+                        context_parts.append(
+                            f"  - {group['name']}: {group['correct']}/{group['attempts']} ({group['accuracy_percent']}%)"
+                        )
+                context_parts.append("")
+            
             # Datos de simulacros
             if analytics_data.get('simulations', {}).get('has_data'):
                 simulations = analytics_data['simulations']
@@ -683,6 +752,44 @@ Responde siempre en español con un enfoque analítico, honesto y basado en dato
                 history.append(("assistant", message.content))
         return history
     
+    def load_older_messages(self) -> List[Tuple[int, str, str]]:
+        """
+        Obtiene la página anterior a los mensajes ya cargados, para mostrarla
+        al hacer scroll hacia arriba. No modifica el contexto enviado a la IA.
+        
+        Returns:
+            List[Tuple[int, str, str]]: Mensajes como (id, role, content) en
+                orden cronológico; vacía si no hay más historial
+        """
+        if not self.current_session or not self.has_older_messages:
+            return []
+        
+        page = self.db_manager.get_session_messages_page(
+            self.current_session.id, before_id=self.history_cursor, limit=self.HISTORY_PAGE_SIZE
+        )
+        return self._advance_history_cursor(page)
+    
+    async def aload_older_messages(self) -> List[Tuple[int, str, str]]:
+        """
+        Versión asíncrona de load_older_messages para los handlers de la UI.
+        """
+        if not self.current_session or not self.has_older_messages:
+            return []
+        
+        page = await self.async_db.get_session_messages_page(
+            self.current_session.id, before_id=self.history_cursor, limit=self.HISTORY_PAGE_SIZE
+        )
+        return self._advance_history_cursor(page)
+    
+    def _advance_history_cursor(self, page: list) -> list:
+        """
+        Mueve el cursor de historial al inicio de la página obtenida.
+        """
+        if page:
+            self.history_cursor = page[0][0]
+        self.has_older_messages = len(page) == self.HISTORY_PAGE_SIZE
+        return page
+    
     def start_new_conversation(self, name: str = "Nueva Conversación"):
         """
         Inicia una nueva conversación.
@@ -692,6 +799,17 @@ Responde siempre en español con un enfoque analítico, honesto y basado en dato
         """
         self.current_session = self.db_manager.create_chat_session(self.user_id, name, self.mode)
         self.conversation_history = []
+        self.history_cursor = None
+        self.has_older_messages = False
+    
+    def flush_pending_writes(self):
+        """
+        Espera a que se guarden los turnos encolados en segundo plano.
+        
+        Raises:
+            MessageWriteError: Si hubo turnos que no se pudieron guardar
+        """
+        self.db_manager.flush_pending_writes()
     
     def is_api_key_valid(self) -> bool:
         """
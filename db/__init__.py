@@ -3,6 +3,12 @@ Paquete de base de datos para la aplicación de chat.
 Contiene los modelos SQLAlchemy y la gestión de datos.
 """
 
-from .models import DatabaseManager, User, ChatSession, ChatMessage
+from .models import (DatabaseManager, User, ChatSession, ChatMessage, SessionStats, PendingTurn,
+                     UserRecord, SessionRecord, MessageRecord, dispose_engines)
+from .writer import MessageWriter
+from .analytics_cache import AnalyticsCache
+from .memory import MemoryDatabaseManager
+from .storage import ChatStorage, open_storage
+from .async_manager import AsyncDatabaseManager
 
-__all__ = ['DatabaseManager', 'User', 'ChatSession', 'ChatMessage'] 
\ No newline at end of file
+__all__ = ['DatabaseManager', 'AsyncDatabaseManager', 'User', 'ChatSession', 'ChatMessage', 'SessionStats', 'PendingTurn', 'UserRecord', 'SessionRecord', 'MessageRecord', 'MessageWriter', 'AnalyticsCache', 'MemoryDatabaseManager', 'ChatStorage', 'open_storage', 'dispose_engines'] 
\ No newline at end of file
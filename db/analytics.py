@@ -0,0 +1,663 @@
+"""
+Cálculo de las analíticas por usuario, común a los backends de almacenamiento.
+
+Cada backend lee las sesiones, sus estadísticas, las preguntas respondidas
+(agrupadas por sesión, dominio, tema y dificultad) y los mensajes de
+EVALUEMOS y SIMULEMOS a su manera y delega en UserAnalyticsMixin el armado del resultado,
+de modo que get_user_analytics_data devuelve lo mismo en SQLite y en memoria.
+
+Las sesiones llegan una sola vez como columnas de NumPy (SessionTimeline):
+tiempo de estudio, histogramas por hora y día, conteos por modo y
+frecuencia se calculan con operaciones sobre arreglos, sin recorrer las
+sesiones en Python. La racha y la actividad semanal salen del resumen
+diario (daily_activity, ActivityDays): una fila por día con actividad,
+cualquiera sea el tamaño del historial. Las fechas son milisegundos UTC;
+días y horas se cuentan en la hora local (GMT-3).
+
+Con una ventana de fechas (since/until) el resultado tiene el mismo formato
+y cada cifra se filtra por su propia fecha: las que resumen sesiones
+(total_sessions, sesiones por modo, tiempo estimado, detalle de
+evaluaciones y simulacros, patrones y tendencias) cuentan las sesiones
+creadas en la ventana, con todos sus mensajes; question_accuracy cuenta las
+respuestas dadas en ella, y active_hours, active_days, active_messages y
+weekly_activity, los días de daily_activity que cubre, aunque la sesión sea
+anterior. Con compare=True se agrega la comparación con la ventana anterior
+de igual duración.
+"""
+
+import calendar
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from .keywords import MessageKeywords, classify_message
+from .timestamps import LOCAL_UTC_OFFSET_MS, get_local_datetime, to_epoch_ms, from_epoch_ms, to_local
+
+# Pausa máxima entre mensajes que se considera tiempo activo de estudio
+SESSION_GAP_CAP_SECONDS = 10 * 60
+
+MS_PER_HOUR = 3_600_000
+MS_PER_DAY = 24 * MS_PER_HOUR
+# El 1/1/1970 fue jueves (lunes = 0, como datetime.weekday)
+EPOCH_WEEKDAY = 3
+# Semanas (incluida la actual) y días recientes que resume weekly_activity
+RECENT_WEEKS = 8
+HEATMAP_DAYS = 12 * 7
+# Días de la ventana reciente del dashboard (recent_days_window)
+RECENT_DAYS = 7
+
+class AssessmentMessage(NamedTuple):
+    """Mensaje de una sesión de EVALUEMOS o SIMULEMOS leído para las analíticas"""
+    role: str
+    content: str
+    timestamp_ms: int
+
+class AttemptGroup(NamedTuple):
+    """Preguntas respondidas de una sesión con igual dominio, tema y dificultad (GROUP BY de question_attempts)"""
+    session_id: int
+    domain: Optional[str]
+    topic: Optional[str]
+    difficulty: Optional[str]
+    attempts: int
+    correct: int
+
+class ClassifiedMessage(NamedTuple):
+    """Rol de un mensaje y sus palabras clave (ver db/keywords.py)"""
+    role: str
+    keywords: MessageKeywords
+
+class SessionTimeline(NamedTuple):
+    """
+    Sesiones de un usuario con sus estadísticas (session_stats), una columna
+    de NumPy por campo, en orden cronológico. Las sesiones sin estadísticas
+    tienen conteos y fechas de mensajes en 0.
+    """
+    session_id: np.ndarray
+    name: np.ndarray
+    mode: np.ndarray
+    created_ms: np.ndarray
+    message_count: np.ndarray
+    user_message_count: np.ndarray
+    first_ms: np.ndarray
+    last_ms: np.ndarray
+    active_seconds: np.ndarray
+    correct_count: np.ndarray
+    incorrect_count: np.ndarray
+    
+    @classmethod
+    def from_rows(cls, rows: list) -> 'SessionTimeline':
+        """Arma las columnas a partir de filas con los campos en orden y las ordena por fecha de creación"""
+        columns = list(zip(*rows)) if rows else [()] * len(cls._fields)
+        timeline = cls(*(np.array(column, dtype=dtype) for column, dtype in zip(columns, _TIMELINE_DTYPES)))
+        order = np.argsort(timeline.created_ms, kind='stable')
+        return cls(*(column[order] for column in timeline))
+    
+    def local_days(self) -> np.ndarray:
+        """Día local (GMT-3) de creación de cada sesión, como días desde 1970"""
+        return (self.created_ms + LOCAL_UTC_OFFSET_MS) // MS_PER_DAY
+    
+    def local_hours(self) -> np.ndarray:
+        """Hora local (0-23) de creación de cada sesión"""
+        return (self.created_ms + LOCAL_UTC_OFFSET_MS) // MS_PER_HOUR % 24
+
+_TIMELINE_DTYPES = (np.int64, object, object, np.int64, np.int64, np.int64, np.int64, np.int64,
+                    np.float64, np.int64, np.int64)
+
+class ActivityDays(NamedTuple):
+    """
+    Actividad del usuario por día local (daily_activity sumada entre modos),
+    una columna de NumPy por campo y en orden cronológico. Solo hay días con
+    sesiones creadas o mensajes.
+    """
+    day: np.ndarray             # Días desde 1970 en hora local
+    sessions: np.ndarray
+    messages: np.ndarray
+    active_seconds: np.ndarray
+    
+    @classmethod
+    def from_rows(cls, rows: list) -> 'ActivityDays':
+        """Arma las columnas a partir de filas (day, sessions, messages, active_seconds); suma los días repetidos"""
+        columns = list(zip(*rows)) if rows else [()] * len(cls._fields)
+        day, sessions, messages, active_seconds = (
+            np.array(column, dtype=dtype) for column, dtype in zip(columns, _ACTIVITY_DTYPES)
+        )
+        days, index = np.unique(day, return_inverse=True)
+        return cls(days, *(np.bincount(index, weights=column, minlength=len(days)).astype(column.dtype)
+                           for column in (sessions, messages, active_seconds)))
+
+_ACTIVITY_DTYPES = (np.int64, np.int64, np.int64, np.float64)
+
+def local_day(timestamp_ms: int) -> int:
+    """Día local (GMT-3) de una fecha en milisegundos UTC, como días desde 1970"""
+    return (timestamp_ms + LOCAL_UTC_OFFSET_MS) // MS_PER_DAY
+
+class AnalyticsWindow(NamedTuple):
+    """
+    Rango [since_ms, until_ms) de las analíticas en milisegundos UTC; None
+    deja el extremo abierto. daily_activity se filtra con los días locales
+    que toca el rango (resolución de un día).
+    """
+    since_ms: Optional[int] = None
+    until_ms: Optional[int] = None
+    
+    @property
+    def first_day(self) -> Optional[int]:
+        return local_day(self.since_ms) if self.since_ms is not None else None
+    
+    @property
+    def last_day(self) -> Optional[int]:
+        return local_day(self.until_ms - 1) if self.until_ms is not None else None
+
+LIFETIME = AnalyticsWindow()
+
+def recent_days_window(days: int, now: datetime = None) -> tuple:
+    """
+    (since, until) de los últimos `days` días locales, hoy incluido, alineados
+    a la medianoche GMT-3: la ventana reciente del dashboard de ANALICEMOS.
+    """
+    today = local_day(to_epoch_ms(now or get_local_datetime()))
+    since_ms = (today - days + 1) * MS_PER_DAY - LOCAL_UTC_OFFSET_MS
+    until_ms = (today + 1) * MS_PER_DAY - LOCAL_UTC_OFFSET_MS
+    return to_local(from_epoch_ms(since_ms)), to_local(from_epoch_ms(until_ms))
+
+def _iso_dates(days: np.ndarray) -> list:
+    """Días desde 1970 como textos 'YYYY-MM-DD'"""
+    return (np.datetime64('1970-01-01', 'D') + days).astype(str).tolist()
+
+def _counts_in_order_of_appearance(values: np.ndarray) -> dict:
+    """
+    Cuenta los valores en el orden en que aparecen por primera vez, como el
+    dict que se llenaría recorriendo las sesiones: max() sobre sus items
+    desempata igual.
+    """
+    if not len(values):
+        return {}
+    uniques, first_index, counts = np.unique(values, return_index=True, return_counts=True)
+    order = np.argsort(first_index, kind='stable')
+    return dict(zip(uniques[order].tolist(), counts[order].tolist()))
+
+class UserAnalyticsMixin:
+    """Armado de get_user_analytics_data a partir de sesiones, agregados y mensajes."""
+    
+    def _analytics_for_window(self, cache, user_id: int, since=None, until=None, compare: bool = False) -> dict:
+        """
+        Resultado de get_user_analytics_data, común a los backends: analíticas
+        en caché por usuario, ventana y día local, calculadas con
+        self._compute_user_analytics_data(user_id, window).
+        
+        Args:
+            cache (AnalyticsCache): Caché del backend
+            since (datetime): Inicio de la ventana (incluido); None desde el comienzo
+            until (datetime): Fin de la ventana (excluido); None hasta ahora
+            compare (bool): Agregar 'comparison' con la ventana anterior de igual duración
+        
+        Raises:
+            ValueError: Si since no es anterior a until, o si compare no tiene since
+        """
+        window = AnalyticsWindow(to_epoch_ms(since) if since is not None else None,
+                                 to_epoch_ms(until) if until is not None else None)
+        if None not in window and window.since_ms >= window.until_ms:
+            raise ValueError("La fecha de inicio debe ser anterior a la de fin")
+        if compare and window.since_ms is None:
+            raise ValueError("La comparación requiere una fecha de inicio (since)")
+        
+        # La racha y la semana actual dependen del día: el resultado de ayer no
+        # se reutiliza aunque el usuario no haya escrito desde entonces
+        today = local_day(to_epoch_ms(get_local_datetime()))
+        
+        def cached(window: AnalyticsWindow) -> dict:
+            return cache.get(user_id, lambda: self._compute_user_analytics_data(user_id, window), key=(window, today))
+        
+        data = cached(window)
+        if not compare or not data:
+            return data
+        # Sin until, la ventana actual llega hasta el fin de hoy: la anterior no
+        # cambia con cada llamada y se reutiliza de la caché durante el día
+        end_ms = window.until_ms if window.until_ms is not None else (today + 1) * MS_PER_DAY - LOCAL_UTC_OFFSET_MS
+        previous = cached(AnalyticsWindow(2 * window.since_ms - end_ms, window.since_ms))
+        # Copia superficial: el resultado en caché no se modifica
+        return dict(data, comparison=self._compare_windows(data, previous))
+    
+    def _window_summary(self, data: dict) -> dict:
+        """
+        Cifras principales de un resultado, para comparar ventanas: las
+        sesiones creadas en la ventana y los mensajes, horas, días y respuestas
+        de la ventana (también los de sesiones anteriores)
+        """
+        overview = data['overview']
+        accuracy = data['question_accuracy']
+        return {
+            'sessions_created': overview['total_sessions'],
+            'messages': overview['active_messages'],
+            'active_hours': overview['active_hours'],
+            'active_days': overview['active_days'],
+            'questions_answered': accuracy.get('total_attempts', 0),
+            'correct_answers': accuracy.get('correct_answers', 0),
+            'accuracy_percent': accuracy.get('accuracy_percent')
+        }
+    
+    def _compare_windows(self, current: dict, previous: dict) -> dict:
+        """Cifras de la ventana actual y la anterior, con la diferencia (None si falta alguna)"""
+        current_summary = self._window_summary(current)
+        previous_summary = self._window_summary(previous)
+        return {
+            'previous_window': previous['window'],
+            'current': current_summary,
+            'previous': previous_summary,
+            'change': {
+                key: (round(value - previous_summary[key], 1)
+                      if value is not None and previous_summary[key] is not None else None)
+                for key, value in current_summary.items()
+            }
+        }
+    
+    def _build_user_analytics(self, profile_data: dict, timeline: SessionTimeline, assessment_messages: dict,
+                              attempt_groups: list = (), activity: ActivityDays = None, today: int = None,
+                              window: AnalyticsWindow = LIFETIME) -> dict:
+        """
+        Arma el resultado de get_user_analytics_data a partir de los datos ya
+        leídos por el backend de almacenamiento.
+        
+        Args:
+            profile_data (dict): Campos del perfil del usuario
+            timeline (SessionTimeline): Todas las sesiones del usuario con sus estadísticas
+            assessment_messages (dict): session_id -> mensajes (role, content, timestamp_ms)
+                de las sesiones de EVALUEMOS y SIMULEMOS, en orden cronológico
+            attempt_groups (list): AttemptGroup con las preguntas respondidas del usuario
+            activity (ActivityDays): Resumen diario del usuario (daily_activity)
+            today (int): Día local de referencia para la semana actual; por
+                defecto el último día de la ventana, u hoy
+            window (AnalyticsWindow): Ventana de fechas de los datos recibidos
+        """
+        if activity is None:
+            activity = ActivityDays.from_rows([])
+        if today is None:
+            today = window.last_day if window.until_ms is not None else local_day(to_epoch_ms(get_local_datetime()))
+        
+        # Separar sesiones por modo (posiciones en el timeline)
+        evaluemos_sessions = np.flatnonzero(timeline.mode == "evaluemos")
+        simulemos_sessions = np.flatnonzero(timeline.mode == "simulemos")
+        
+        # Calcular estadísticas básicas
+        total_sessions = len(timeline.session_id)
+        total_messages = int(timeline.message_count.sum())
+        sessions_by_mode = _counts_in_order_of_appearance(timeline.mode)
+        
+        # Calcular tiempo total de estudio (aproximado por número de mensajes y sesiones)
+        study_time_hours = self._estimate_study_time(timeline)
+        
+        # Clasificar cada mensaje una sola vez (temas, preguntas, tipo de examen, resultado)
+        classified_messages = {
+            session_id: [ClassifiedMessage(message.role, classify_message(message.content)) for message in messages]
+            for session_id, messages in assessment_messages.items()
+        }
+        
+        # Obtener datos de evaluaciones
+        evaluation_data = self._extract_evaluation_data(timeline, evaluemos_sessions, classified_messages, attempt_groups)
+        
+        # Obtener datos de simulacros
+        simulation_data = self._extract_simulation_data(timeline, simulemos_sessions, classified_messages)
+        
+        # Calcular streak de estudio (días con actividad en daily_activity)
+        study_streak = self._calculate_study_streak(activity)
+        
+        return {
+            'user_profile': profile_data,
+            'window': {
+                'since': to_local(from_epoch_ms(window.since_ms)) if window.since_ms is not None else None,
+                'until': to_local(from_epoch_ms(window.until_ms)) if window.until_ms is not None else None
+            },
+            'overview': {
+                'total_sessions': total_sessions,
+                'total_messages': total_messages,
+                'study_time_hours': study_time_hours,
+                'active_hours': round(float(activity.active_seconds.sum()) / 3600, 1),
+                'active_days': len(activity.day),
+                'active_messages': int(activity.messages.sum()),
+                'study_streak_days': study_streak,
+                'sessions_by_mode': {
+                    'charlemos': sessions_by_mode.get('charlemos', 0),
+                    'estudiemos': sessions_by_mode.get('estudiemos', 0),
+                    'evaluemos': sessions_by_mode.get('evaluemos', 0),
+                    'simulemos': sessions_by_mode.get('simulemos', 0)
+                }
+            },
+            'evaluations': evaluation_data,
+            'simulations': simulation_data,
+            'question_accuracy': self._summarize_question_attempts(attempt_groups),
+            'weekly_activity': self._calculate_weekly_activity(activity, today),
+            'study_patterns': self._analyze_study_patterns(timeline),
+            'progress_trends': self._calculate_progress_trends(timeline, evaluemos_sessions, simulemos_sessions)
+        }
+    
+    def _estimate_study_time(self, timeline: SessionTimeline) -> float:
+        """Estima el tiempo total de estudio basado en sesiones y mensajes"""
+        # Duración entre el primer y el último mensaje, o 3 minutos promedio por
+        # mensaje si es mayor; las sesiones muy cortas suman un tiempo mínimo
+        session_hours = (timeline.last_ms - timeline.first_ms) / 1000 / 3600
+        message_time = timeline.message_count * 0.05
+        hours = np.where(timeline.message_count >= 2, np.maximum(session_hours, message_time), 0.1)
+        # Suma en orden, como la acumulación sesión por sesión (mismo redondeo)
+        return round(sum(hours.tolist(), 0.0), 1)
+    
+    def _extract_evaluation_data(self, timeline: SessionTimeline, evaluemos_sessions: np.ndarray,
+                                 messages_by_session: dict, attempt_groups: list = ()) -> dict:
+        """Extrae datos específicos de las sesiones de EVALUEMOS"""
+        if not len(evaluemos_sessions):
+            return {'has_data': False, 'message': 'No hay sesiones de EVALUEMOS completadas'}
+        
+        evaluation_stats = {
+            'has_data': True,
+            'total_sessions': len(evaluemos_sessions),
+            'sessions_detail': []
+        }
+        
+        # Preguntas respondidas con veredicto registrado (question_attempts)
+        recorded = {}
+        recorded_topics = {}
+        for group in attempt_groups:
+            totals = recorded.setdefault(group.session_id, [0, 0])
+            totals[0] += group.attempts
+            totals[1] += group.correct
+            if group.topic:
+                recorded_topics.setdefault(group.session_id, set()).add(group.topic.title())
+        session_ids = timeline.session_id[evaluemos_sessions].tolist()
+        recorded_totals = np.array([recorded.get(session_id, (0, 0)) for session_id in session_ids],
+                                   dtype=np.int64).reshape(-1, 2)
+        answers_recorded = recorded_totals[:, 0] > 0
+        
+        # Sin veredictos (sesiones anteriores), las respuestas contabilizadas por palabra clave al guardar los mensajes
+        correctas = np.where(answers_recorded, recorded_totals[:, 1], timeline.correct_count[evaluemos_sessions])
+        incorrectas = np.where(answers_recorded, recorded_totals[:, 0] - recorded_totals[:, 1],
+                               timeline.incorrect_count[evaluemos_sessions])
+        total_preguntas = correctas + incorrectas
+        porcentaje_acierto = np.where(
+            total_preguntas > 0, (correctas / np.maximum(total_preguntas, 1)) * 100, 0
+        ).astype(np.int64)
+        
+        for (session_id, name, date, active_seconds, interactions, correct, incorrect, accuracy, answered,
+             has_verdicts) in zip(
+            session_ids,
+            timeline.name[evaluemos_sessions].tolist(),
+            _iso_dates(timeline.local_days()[evaluemos_sessions]),
+            timeline.active_seconds[evaluemos_sessions].tolist(),
+            timeline.user_message_count[evaluemos_sessions].tolist(),
+            correctas.tolist(), incorrectas.tolist(), porcentaje_acierto.tolist(),
+            recorded_totals[:, 0].tolist(), answers_recorded.tolist()
+        ):
+            messages = messages_by_session.get(session_id, [])
+            topics = self._extract_topics_from_messages(messages)
+            topics += sorted(recorded_topics.get(session_id, set()).difference(topics))
+            
+            # Analizar contenido de mensajes (ya clasificados) para extraer datos de evaluación
+            session_data = {
+                'session_id': session_id,
+                'session_name': name,
+                'date': date,
+                'duration_minutes': int(active_seconds // 60),
+                'total_interactions': interactions,
+                'questions_attempted': answered if has_verdicts else self._count_questions_in_session(messages),
+                'topics_covered': topics,
+                'correct_answers': correct,
+                'incorrect_answers': incorrect,
+                'accuracy_percent': accuracy,
+                'answers_recorded': has_verdicts
+            }
+            
+            evaluation_stats['sessions_detail'].append(session_data)
+        
+        return evaluation_stats
+    
+    def _extract_simulation_data(self, timeline: SessionTimeline, simulemos_sessions: np.ndarray,
+                                 messages_by_session: dict) -> dict:
+        """Extrae datos específicos de las sesiones de SIMULEMOS"""
+        if not len(simulemos_sessions):
+            return {'has_data': False, 'message': 'No hay sesiones de SIMULEMOS completadas'}
+        
+        simulation_stats = {
+            'has_data': True,
+            'total_sessions': len(simulemos_sessions),
+            'sessions_detail': []
+        }
+        
+        for session_id, name, date, active_seconds, interactions in zip(
+            timeline.session_id[simulemos_sessions].tolist(),
+            timeline.name[simulemos_sessions].tolist(),
+            _iso_dates(timeline.local_days()[simulemos_sessions]),
+            timeline.active_seconds[simulemos_sessions].tolist(),
+            timeline.user_message_count[simulemos_sessions].tolist()
+        ):
+            messages = messages_by_session.get(session_id, [])
+            
+            session_data = {
+                'session_id': session_id,
+                'session_name': name,
+                'date': date,
+                'duration_minutes': int(active_seconds // 60),
+                'total_interactions': interactions,
+                'exam_type': self._identify_exam_type_from_messages(messages),
+                'completion_status': self._assess_completion_status(messages)
+            }
+            
+            simulation_stats['sessions_detail'].append(session_data)
+        
+        return simulation_stats
+    
+    def _summarize_question_attempts(self, attempt_groups: list) -> dict:
+        """Aciertos de las preguntas con veredicto registrado, en total y por dominio, tema y dificultad"""
+        if not attempt_groups:
+            return {'has_data': False, 'message': 'No hay preguntas con resultado registrado'}
+        
+        def breakdown(field: str) -> list:
+            totals = {}
+            for group in attempt_groups:
+                counts = totals.setdefault(getattr(group, field) or 'sin_clasificar', [0, 0])
+                counts[0] += group.attempts
+                counts[1] += group.correct
+            return [
+                {'name': name, 'attempts': attempts, 'correct': correct,
+                 'accuracy_percent': int(correct / attempts * 100)}
+                for name, (attempts, correct) in sorted(totals.items(), key=lambda item: (-item[1][0], item[0]))
+            ]
+        
+        total_attempts = sum(group.attempts for group in attempt_groups)
+        total_correct = sum(group.correct for group in attempt_groups)
+        return {
+            'has_data': True,
+            'total_attempts': total_attempts,
+            'correct_answers': total_correct,
+            'accuracy_percent': int(total_correct / total_attempts * 100),
+            'by_domain': breakdown('domain'),
+            'by_topic': breakdown('topic'),
+            'by_difficulty': breakdown('difficulty')
+        }
+    
+    def _count_questions_in_session(self, messages: list) -> int:
+        """Cuenta aproximadamente cuántas preguntas se respondieron en la sesión"""
+        return sum(1 for message in messages if message.role == 'assistant' and message.keywords.question)
+    
+    def _extract_topics_from_messages(self, messages: list) -> list:
+        """Extrae temas/áreas de conocimiento (PMBOK_AREAS) mencionados en los mensajes"""
+        topics_found = set()
+        for message in messages:
+            topics_found.update(message.keywords.topics)
+        return [area.title() for area in topics_found]
+    
+    def _identify_exam_type_from_messages(self, messages: list) -> str:
+        """Identifica el tipo de examen/simulacro basado en el contenido"""
+        for message in messages:
+            if message.keywords.exam_type is not None:
+                return message.keywords.exam_type
+        return 'general'
+    
+    def _assess_completion_status(self, messages: list) -> str:
+        """Evalúa si el simulacro fue completado"""
+        if any(message.role == 'assistant' and message.keywords.completion for message in messages):
+            return 'completado'
+        return 'en_progreso'
+    
+    def _calculate_study_streak(self, activity: ActivityDays) -> int:
+        """Calcula la racha de días consecutivos de estudio, hasta el último día con actividad"""
+        # Días con actividad (únicos), del más reciente al más antiguo
+        study_days = activity.day[::-1]
+        if not len(study_days):
+            return 0
+        
+        # La racha sigue mientras el i-ésimo día sea exactamente i días antes del último
+        consecutive = (study_days[0] - study_days) == np.arange(len(study_days))
+        return len(study_days) if consecutive.all() else int(np.argmin(consecutive))
+    
+    def _calculate_weekly_activity(self, activity: ActivityDays, today: int) -> dict:
+        """
+        Sesiones, mensajes, horas activas y días de estudio por semana (de
+        lunes a domingo, hora local) en las últimas RECENT_WEEKS semanas, y
+        el detalle diario de los últimos HEATMAP_DAYS días para el mapa de calor.
+        """
+        if not len(activity.day):
+            return {'has_data': False, 'message': 'No hay actividad registrada'}
+        
+        week_start = today - (today + EPOCH_WEEKDAY) % 7
+        # Semana de cada día contada hacia atrás desde la actual (0 = esta semana)
+        weeks_ago = (week_start + 6 - activity.day) // 7
+        recent = (weeks_ago >= 0) & (weeks_ago < RECENT_WEEKS)
+        
+        def per_week(column: np.ndarray) -> np.ndarray:
+            return np.bincount(weeks_ago[recent], weights=column[recent], minlength=RECENT_WEEKS)
+        
+        sessions, messages, seconds = (per_week(column) for column in
+                                       (activity.sessions, activity.messages, activity.active_seconds))
+        active_days = np.bincount(weeks_ago[recent], minlength=RECENT_WEEKS)
+        weeks = [
+            {'week_start': start, 'sessions': int(sessions[n]), 'messages': int(messages[n]),
+             'active_hours': round(float(seconds[n]) / 3600, 1), 'active_days': int(active_days[n])}
+            for n, start in enumerate(_iso_dates(week_start - 7 * np.arange(RECENT_WEEKS)))
+        ]
+        # Promedio sobre las semanas desde la primera actividad (como máximo RECENT_WEEKS)
+        weeks_tracked = int(min(max(weeks_ago.max(), 0) + 1, RECENT_WEEKS))
+        
+        heatmap = (activity.day > today - HEATMAP_DAYS) & (activity.day <= today)
+        return {
+            'has_data': True,
+            'this_week': weeks[0],
+            'last_week': weeks[1],
+            'sessions_per_week': round(float(sessions[:weeks_tracked].sum()) / weeks_tracked, 1),
+            'weeks': weeks,
+            'daily_history': [
+                {'date': date, 'sessions': day_sessions, 'messages': day_messages,
+                 'active_minutes': int(day_seconds // 60)}
+                for date, day_sessions, day_messages, day_seconds in zip(
+                    _iso_dates(activity.day[heatmap]), activity.sessions[heatmap].tolist(),
+                    activity.messages[heatmap].tolist(), activity.active_seconds[heatmap].tolist()
+                )
+            ]
+        }
+    
+    def _analyze_study_patterns(self, timeline: SessionTimeline) -> dict:
+        """Analiza patrones de estudio del usuario"""
+        if not len(timeline.session_id):
+            return {'has_data': False}
+        
+        # Horarios, días de la semana y modos
+        hour_distribution = _counts_in_order_of_appearance(timeline.local_hours())
+        weekdays = _counts_in_order_of_appearance((timeline.local_days() + EPOCH_WEEKDAY) % 7)
+        day_distribution = {calendar.day_name[weekday]: count for weekday, count in weekdays.items()}
+        mode_preferences = _counts_in_order_of_appearance(timeline.mode)
+        
+        # Encontrar el mejor horario
+        best_hour = max(hour_distribution.items(), key=lambda x: x[1])[0] if hour_distribution else None
+        best_day = max(day_distribution.items(), key=lambda x: x[1])[0] if day_distribution else None
+        preferred_mode = max(mode_preferences.items(), key=lambda x: x[1])[0] if mode_preferences else None
+        
+        return {
+            'has_data': True,
+            'best_study_hour': best_hour,
+            'best_study_day': best_day,
+            'preferred_mode': preferred_mode,
+            'hour_distribution': hour_distribution,
+            'day_distribution': day_distribution,
+            'mode_distribution': mode_preferences
+        }
+    
+    def _calculate_progress_trends(self, timeline: SessionTimeline, evaluemos_sessions: np.ndarray,
+                                   simulemos_sessions: np.ndarray) -> dict:
+        """Calcula tendencias de progreso a lo largo del tiempo"""
+        all_assessment_sessions = np.concatenate((evaluemos_sessions, simulemos_sessions))
+        
+        if len(all_assessment_sessions) < 2:
+            return {'has_data': False, 'message': 'Necesitas al menos 2 sesiones de evaluación/simulacro para mostrar tendencias'}
+        
+        # Ordenar sesiones por fecha (a igual fecha, evaluaciones antes que simulacros)
+        order = np.argsort(timeline.created_ms[all_assessment_sessions], kind='stable')
+        sorted_sessions = all_assessment_sessions[order]
+        first_date, latest_date = _iso_dates(timeline.local_days()[sorted_sessions[[0, -1]]])
+        
+        trends = {
+            'has_data': True,
+            'total_assessment_sessions': len(all_assessment_sessions),
+            'first_session_date': first_date,
+            'latest_session_date': latest_date,
+            'session_frequency': self._calculate_session_frequency(timeline, sorted_sessions),
+            'engagement_trend': self._calculate_engagement_trend(timeline, sorted_sessions)
+        }
+        
+        return trends
+    
+    def _calculate_session_frequency(self, timeline: SessionTimeline, sessions: np.ndarray) -> dict:
+        """Calcula la frecuencia de sesiones (posiciones en el timeline, en orden cronológico)"""
+        if len(sessions) < 2:
+            return {'frequency': 'insuficientes_datos'}
+        
+        first_ms, last_ms = timeline.created_ms[sessions[[0, -1]]].tolist()
+        days_span = (last_ms - first_ms) // MS_PER_DAY
+        
+        if days_span == 0:
+            return {'frequency': 'mismo_dia', 'sessions_per_week': len(sessions) * 7}
+        
+        sessions_per_week = (len(sessions) / days_span) * 7
+        
+        return {
+            'days_span': days_span,
+            'sessions_per_week': round(sessions_per_week, 1),
+            'frequency_category': self._categorize_frequency(sessions_per_week)
+        }
+    
+    def _categorize_frequency(self, sessions_per_week: float) -> str:
+        """Categoriza la frecuencia de estudio"""
+        if sessions_per_week >= 5:
+            return 'muy_alta'
+        elif sessions_per_week >= 3:
+            return 'alta'
+        elif sessions_per_week >= 1:
+            return 'moderada'
+        else:
+            return 'baja'
+    
+    def _calculate_engagement_trend(self, timeline: SessionTimeline, sessions: np.ndarray) -> dict:
+        """Calcula la tendencia de engagement (participación)"""
+        # Número de interacciones del usuario por sesión
+        scores = timeline.user_message_count[sessions].tolist()
+        engagement_data = [
+            {'date': date, 'engagement_score': score}
+            for date, score in zip(_iso_dates(timeline.local_days()[sessions]), scores)
+        ]
+        
+        # Calcular tendencia (simple: comparar primera mitad vs segunda mitad)
+        if len(scores) >= 4:
+            mid_point = len(scores) // 2
+            first_half_avg = sum(scores[:mid_point]) / mid_point
+            second_half_avg = sum(scores[mid_point:]) / (len(scores) - mid_point)
+            
+            if second_half_avg > first_half_avg * 1.1:
+                trend = 'mejorando'
+            elif second_half_avg < first_half_avg * 0.9:
+                trend = 'declinando'
+            else:
+                trend = 'estable'
+        else:
+            trend = 'insuficientes_datos'
+        
+        return {
+            'trend': trend,
+            'engagement_history': engagement_data
+        }
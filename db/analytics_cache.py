@@ -0,0 +1,104 @@
+"""
+Caché en memoria de las analíticas por usuario.
+
+Cada usuario tiene una versión de datos que las escrituras incrementan
+(mensajes, sesiones creadas, renombradas o eliminadas, cambios de perfil).
+Un resultado se reutiliza mientras la versión con la que se calculó siga
+vigente; las llamadas concurrentes para el mismo usuario comparten un único
+cálculo en curso y la caché retiene como máximo `max_users` resultados.
+Un usuario puede tener un resultado por clave (por ejemplo, por ventana de
+fechas); una escritura invalida todos los del usuario.
+"""
+
+import threading
+from collections import OrderedDict
+
+class _Flight:
+    """Cálculo en curso compartido por las llamadas concurrentes de un usuario"""
+
+    def __init__(self, version: int):
+        self.version = version
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class AnalyticsCache:
+    """
+    Caché LRU de resultados por usuario (y clave) con invalidación por versión.
+
+    Args:
+        max_users (int): Resultados retenidos antes de descartar el menos usado
+    """
+
+    def __init__(self, max_users: int = 128):
+        self.max_users = max_users
+        self.hits = 0
+        self.misses = 0
+        self._versions = {}
+        self._entries = OrderedDict()  # (user_id, clave) -> (versión, resultado)
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def version(self, user_id: int) -> int:
+        """Versión actual de los datos del usuario"""
+        return self._versions.get(user_id, 0)
+
+    def bump(self, *user_ids):
+        """Invalida los resultados de los usuarios indicados (tras confirmar la escritura)"""
+        with self._lock:
+            for user_id in user_ids:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            for entry_key in [entry_key for entry_key in self._entries if entry_key[0] in user_ids]:
+                del self._entries[entry_key]
+
+    def clear(self):
+        """Invalida los resultados de todos los usuarios"""
+        with self._lock:
+            for user_id in set(self._versions) | {user_id for user_id, _ in [*self._entries, *self._flights]}:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._entries.clear()
+
+    def get(self, user_id: int, compute, key=None):
+        """
+        Retorna el resultado vigente del usuario para `key` (hashable) o lo
+        calcula con `compute()`. El resultado se comparte entre llamadas: no debe modificarse.
+        """
+        entry_key = (user_id, key)
+        with self._lock:
+            version = self._versions.get(user_id, 0)
+            entry = self._entries.get(entry_key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(entry_key)
+                self.hits += 1
+                return entry[1]
+            flight = self._flights.get(entry_key)
+            leader = flight is None or flight.version != version
+            if leader:
+                flight = self._flights[entry_key] = _Flight(version)
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = compute()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(entry_key) is flight:
+                    del self._flights[entry_key]
+                # Una escritura durante el cálculo deja el resultado sin guardar
+                if flight.error is None and self._versions.get(user_id, 0) == version:
+                    self._entries[entry_key] = (version, flight.result)
+                    self._entries.move_to_end(entry_key)
+                    while len(self._entries) > self.max_users:
+                        self._entries.popitem(last=False)
+            flight.done.set()
+        return flight.result
@@ -0,0 +1,60 @@
+"""
+Capa asíncrona de acceso a datos para los handlers de la UI.
+
+AsyncDatabaseManager expone los mismos métodos públicos que DatabaseManager
+como corrutinas. Cada llamada se ejecuta en un pool de hilos dedicado a la
+base de datos, de modo que el event loop de Flet sigue renderizando mientras
+SQLite trabaja. Comparte engine, perfil de conexión y escritor en segundo
+plano con los DatabaseManager de la misma URL.
+"""
+
+import asyncio
+import functools
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+from .models import DatabaseManager
+from .storage import open_storage
+
+# Hilos reservados para la base de datos, separados del pool por defecto del
+# event loop (que Flet usa para los handlers síncronos)
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="async-db")
+
+class AsyncDatabaseManager:
+    """
+    Versión asíncrona de DatabaseManager.
+
+    Args:
+        database_url (str): URL del almacenamiento (ver open_storage); por
+            defecto DATABASE_URL o chat_history.db
+        profile (str): Perfil de conexión SQLite ('durable' o 'fast')
+        db_manager (ChatStorage): Gestor síncrono a envolver; si se indica,
+            se ignoran database_url y profile
+    """
+
+    def __init__(self, database_url: str = None, profile: str = None, db_manager=None):
+        self.db_manager = db_manager or open_storage(database_url, profile)
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Ejecuta en el pool de la base de datos una operación síncrona que
+        combina varias consultas (por ejemplo, crear un ChatBot).
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+def _make_async(name: str):
+    """Crea la corrutina que delega en el método homónimo de DatabaseManager"""
+    method = getattr(DatabaseManager, name)
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        return await self.run(getattr(self.db_manager, name), *args, **kwargs)
+
+    return wrapper
+
+# get_session no se expone: la sesión de SQLAlchemy debe usarse en el hilo que la crea
+_SYNC_ONLY = {'get_session'}
+
+for _name, _method in inspect.getmembers(DatabaseManager, inspect.isfunction):
+    if not _name.startswith('_') and _name not in _SYNC_ONLY:
+        setattr(AsyncDatabaseManager, _name, _make_async(_name))
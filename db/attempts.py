@@ -0,0 +1,74 @@
+"""
+Veredictos estructurados de las preguntas de EVALUEMOS y SIMULEMOS.
+
+En esos modos el ChatBot pide al modelo (VERDICT_INSTRUCTIONS) que, al
+corregir cada respuesta del usuario, agregue al final un bloque como:
+
+    [VEREDICTO]{"domain": "process", "topic": "riesgo", "difficulty": "media", "is_correct": false}[/VEREDICTO]
+
+parse_verdicts quita esos bloques del texto que ve el usuario y los
+convierte en AttemptVerdict, que se guardan junto con el turno en la tabla
+question_attempts. Las analíticas de aciertos leen esa tabla con GROUP BY en
+lugar de buscar 'correcto' en las respuestas.
+"""
+
+import json
+import re
+from typing import NamedTuple, Optional
+
+DOMAINS = ('people', 'process', 'business_environment')
+DIFFICULTIES = ('baja', 'media', 'alta')
+TOPIC_MAX_LENGTH = 100
+
+VERDICT_INSTRUCTIONS = """
+
+REGISTRO DE RESPUESTAS (OBLIGATORIO):
+Cada vez que el usuario responda una pregunta y determines si es correcta, agrega al final de tu mensaje, en una línea aparte, un bloque con este formato exacto (un bloque por pregunta respondida):
+[VEREDICTO]{"domain": "people|process|business_environment", "topic": "área del PMBOK en minúsculas", "difficulty": "baja|media|alta", "is_correct": true|false}[/VEREDICTO]
+El bloque no se muestra al usuario: inclúyelo aunque durante el simulacro no reveles si la respuesta fue correcta. No agregues el bloque cuando no hubo una respuesta que corregir."""
+
+_BLOCK = re.compile(r'\s*\[VEREDICTO\](.*?)\[/VEREDICTO\]', re.DOTALL | re.IGNORECASE)
+
+class AttemptVerdict(NamedTuple):
+    """Resultado de una pregunta respondida, tal como lo informa el modelo"""
+    is_correct: bool
+    domain: Optional[str] = None
+    topic: Optional[str] = None
+    difficulty: Optional[str] = None
+
+def _choice(value, options: tuple) -> Optional[str]:
+    """Valor normalizado si está entre las opciones; None si no"""
+    if not isinstance(value, str):
+        return None
+    value = value.strip().lower().replace(' ', '_')
+    return value if value in options else None
+
+def _parse_block(body: str) -> Optional[AttemptVerdict]:
+    """Convierte el JSON de un bloque; None si no es válido o no trae is_correct"""
+    # Algunos modelos envuelven el JSON en un bloque de código
+    body = body.strip().strip('`').strip()
+    if body[:4].lower() == 'json':
+        body = body[4:]
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get('is_correct'), bool):
+        return None
+    topic = data.get('topic')
+    topic = (topic.strip().lower()[:TOPIC_MAX_LENGTH] or None) if isinstance(topic, str) else None
+    return AttemptVerdict(data['is_correct'], _choice(data.get('domain'), DOMAINS), topic,
+                          _choice(data.get('difficulty'), DIFFICULTIES))
+
+def parse_verdicts(response: str) -> tuple:
+    """
+    Separa los bloques de veredicto de la respuesta del modelo.
+
+    Returns:
+        tuple: (texto sin los bloques, lista de AttemptVerdict). Los bloques
+            mal formados se quitan del texto pero no se registran.
+    """
+    if not _BLOCK.search(response):
+        return response, []
+    verdicts = [_parse_block(match.group(1)) for match in _BLOCK.finditer(response)]
+    return _BLOCK.sub('', response).strip(), [verdict for verdict in verdicts if verdict is not None]
@@ -0,0 +1,130 @@
+"""
+Clasificación de mensajes por palabras clave para las estadísticas y las
+analíticas de EVALUEMOS y SIMULEMOS.
+
+Todas las palabras clave (áreas del PMBOK, indicadores de pregunta, de
+resultado, de tipo de simulacro y los veredictos) forman una sola expresión
+regular compilada: classify_message recorre el texto una vez y devuelve
+todo junto, en lugar de buscar cada palabra con `in` sobre el mensaje en
+cada función de análisis.
+
+Las coincidencias empiezan en un límite de palabra y pueden continuar
+('riesgo' cuenta en 'riesgos'), pero no empiezan a mitad de una palabra:
+'correcto' ya no se encuentra dentro de 'incorrecto'.
+"""
+
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+# Áreas de conocimiento del PMBOK
+PMBOK_AREAS = (
+    'integration', 'integración', 'scope', 'alcance', 'schedule', 'cronograma',
+    'cost', 'costo', 'quality', 'calidad', 'resource', 'recursos',
+    'communications', 'comunicaciones', 'risk', 'riesgo', 'procurement', 'adquisiciones',
+    'stakeholder', 'interesados', 'people', 'personas', 'process', 'proceso',
+    'business environment', 'entorno de negocio'
+)
+QUESTION_INDICATORS = ('pregunta', 'respuesta', 'opción', 'alternativa', 'selecciona', 'elige')
+COMPLETION_INDICATORS = ('completado', 'finalizado', 'terminado', 'score', 'resultado')
+# Tipos de simulacro en orden de prioridad
+EXAM_TYPES = {
+    'completo': ('180 preguntas', 'examen completo', 'simulacro completo'),
+    'por_tiempo': ('30 minutos', '60 minutos', '90 minutos', 'tiempo limitado'),
+    'por_dominio': ('people domain', 'process domain', 'business environment'),
+}
+VERDICTS = ('correcto', 'incorrecto')
+
+class MessageKeywords(NamedTuple):
+    """Resultado de clasificar un mensaje"""
+    topics: frozenset          # Áreas del PMBOK mencionadas, como en PMBOK_AREAS
+    question: bool             # Menciona una pregunta u opciones de respuesta
+    completion: bool           # Anuncia un resultado o el fin del simulacro
+    exam_type: Optional[str]   # Primer tipo de EXAM_TYPES que menciona, o None
+    verdict: Optional[str]     # 'correcto' o 'incorrecto', el que aparece primero
+
+def _keyword_roles() -> dict:
+    """Palabra clave -> roles que cumple (una palabra puede estar en varias listas)"""
+    roles = {}
+    for area in PMBOK_AREAS:
+        roles.setdefault(area, set()).add(('topic', area))
+    for indicator in QUESTION_INDICATORS:
+        roles.setdefault(indicator, set()).add(('question', None))
+    for indicator in COMPLETION_INDICATORS:
+        roles.setdefault(indicator, set()).add(('completion', None))
+    for exam_type, indicators in EXAM_TYPES.items():
+        for indicator in indicators:
+            roles.setdefault(indicator, set()).add(('exam_type', exam_type))
+    for verdict in VERDICTS:
+        roles.setdefault(verdict, set()).add(('verdict', verdict))
+    return roles
+
+def _trie_pattern(words: list) -> str:
+    """
+    Alternativa de expresión regular con forma de árbol de prefijos:
+    'cost', 'costo' y 'communications' quedan como c(?:ost(?:o)?|ommunications).
+    El motor descarta cada posición mirando un carácter por nivel en lugar
+    de probar las palabras una por una, y siempre prefiere la más larga.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return '(?:' + body + ')?' if '' in node else body
+
+    return build(trie)
+
+_ROLES = _keyword_roles()
+_MATCHER = re.compile(r'\b(' + _trie_pattern(list(_ROLES)) + ')')
+# Cada coincidencia es la palabra clave más larga en esa posición y la
+# búsqueda sigue después de ella; las palabras clave que empiezan dentro de
+# la coincidencia (prefijos como 'cost' en 'costo', o 'pregunta' en
+# '180 preguntas') se agregan desde aquí.
+_IMPLIED = {
+    keyword: frozenset(
+        role for other in _ROLES if re.search(r'\b' + re.escape(other), keyword) for role in _ROLES[other]
+    )
+    for keyword in _ROLES
+}
+_EXAM_PRIORITY = {exam_type: rank for rank, exam_type in enumerate(EXAM_TYPES)}
+
+NO_KEYWORDS = MessageKeywords(frozenset(), False, False, None, None)
+
+def classify_message(content: str) -> MessageKeywords:
+    """Clasifica un mensaje en una sola pasada sobre el texto"""
+    if not content:
+        return NO_KEYWORDS
+    found = _MATCHER.findall(content.lower())
+    if not found:
+        return NO_KEYWORDS
+    # Palabras clave distintas en orden de aparición (el orden decide el veredicto)
+    return _merge_keywords(tuple(dict.fromkeys(found)))
+
+@lru_cache(maxsize=4096)
+def _merge_keywords(keywords: tuple) -> MessageKeywords:
+    """Combina los roles de las palabras clave encontradas; las combinaciones se repiten mucho"""
+    topics = set()
+    question = completion = False
+    exam_type = verdict = None
+    for keyword in keywords:
+        for role, value in _IMPLIED[keyword]:
+            if role == 'topic':
+                topics.add(value)
+            elif role == 'question':
+                question = True
+            elif role == 'completion':
+                completion = True
+            elif role == 'exam_type':
+                if exam_type is None or _EXAM_PRIORITY[value] < _EXAM_PRIORITY[exam_type]:
+                    exam_type = value
+            elif verdict is None:
+                verdict = value
+    return MessageKeywords(frozenset(topics), question, completion, exam_type, verdict)
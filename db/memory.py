@@ -0,0 +1,448 @@
+"""
+Backend de almacenamiento en memoria.
+
+MemoryDatabaseManager implementa el mismo protocolo que DatabaseManager
+(ver db/storage.py) sobre diccionarios y listas de Python, con la misma
+semántica: registros de solo lectura, resumen del sidebar, estadísticas
+por sesión y actividad diaria mantenidos al guardar mensajes, búsqueda por palabras con la
+última como prefijo, analíticas en caché con invalidación por escritura y
+escritor en segundo plano. No hay archivo histórico ni persistencia.
+
+Se selecciona con una URL memory:// (por ejemplo memory://pruebas); las
+instancias con la misma URL comparten los datos dentro del proceso, igual
+que los DatabaseManager comparten el engine.
+"""
+
+import itertools
+import threading
+from datetime import datetime
+from typing import NamedTuple
+
+from .analytics import (UserAnalyticsMixin, SessionTimeline, ActivityDays, AnalyticsWindow, AssessmentMessage,
+                        AttemptGroup, LIFETIME, local_day)
+from .analytics_cache import AnalyticsCache
+from .timestamps import to_epoch_ms, from_epoch_ms
+from .search import build_snippet, match_terms, search_terms, tokenize
+from .models import (User, SessionStats, UserRecord, SessionRecord, MessageRecord, SearchResult, PendingTurn,
+                     PROFILE_FIELDS, SESSION_PREVIEW_LENGTH, get_local_datetime)
+
+MEMORY_URL_PREFIX = "memory://"
+
+class _StoredMessage(NamedTuple):
+    """Mensaje guardado; mismos atributos que las filas que usan las analíticas"""
+    id: int
+    session_id: int
+    role: str
+    content: str
+    timestamp: datetime
+    words: tuple  # (palabra normalizada, inicio, fin) para la búsqueda, calculadas al guardar
+
+class _MemoryStore:
+    """Datos compartidos por los MemoryDatabaseManager de una misma URL"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.users = {}  # user_id -> dict de columnas, con password_hash y salt
+        self.sessions = {}  # session_id -> dict con los campos de SessionRecord
+        self.messages = {}  # session_id -> lista de _StoredMessage en orden de inserción
+        self.stats = {}  # session_id -> SessionStats (instancia sin sesión de SQLAlchemy)
+        self.attempts = {}  # session_id -> lista de (milisegundos, AttemptVerdict) respondidos
+        self.daily_activity = {}  # (user_id, día local, modo) -> [sesiones, mensajes, segundos activos]
+        self.user_ids = itertools.count(1)
+        self.session_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.analytics_cache = AnalyticsCache()
+        self.message_writer = None
+
+# Almacenes por URL (uno por nombre en todo el proceso)
+_memory_stores = {}
+_memory_stores_lock = threading.Lock()
+
+def get_memory_store(database_url: str) -> _MemoryStore:
+    """Retorna el almacén de la URL, creándolo la primera vez"""
+    with _memory_stores_lock:
+        store = _memory_stores.get(database_url)
+        if store is None:
+            store = _memory_stores[database_url] = _MemoryStore()
+        return store
+
+def dispose_memory_stores():
+    """
+    Cierra los escritores y descarta todos los almacenes en memoria.
+    
+    Raises:
+        MessageWriteError: Si algún escritor no pudo guardar sus turnos; se
+            lanza después de descartar todo
+    """
+    from .writer import MessageWriteError
+    errors = []
+    with _memory_stores_lock:
+        for store in _memory_stores.values():
+            if store.message_writer is not None:
+                try:
+                    store.message_writer.close()
+                except MessageWriteError as e:
+                    errors.append(e)
+        _memory_stores.clear()
+    if errors:
+        raise errors[0]
+
+def _naive(timestamp: datetime) -> datetime:
+    """Las fechas de usuario se guardan sin zona horaria, como las devuelve SQLite"""
+    return timestamp.replace(tzinfo=None)
+
+def _epoch(timestamp: datetime) -> datetime:
+    """Fechas de sesiones y mensajes en UTC con precisión de milisegundos, como las columnas EpochMillis"""
+    return from_epoch_ms(to_epoch_ms(timestamp))
+
+class MemoryDatabaseManager(UserAnalyticsMixin):
+    """
+    Almacenamiento en memoria con la interfaz de DatabaseManager.
+
+    Args:
+        database_url (str): URL memory://<nombre>; las instancias con el mismo
+            nombre comparten los datos
+        profile (str): Ignorado; se acepta por compatibilidad con DatabaseManager
+    """
+
+    def __init__(self, database_url: str = MEMORY_URL_PREFIX, profile: str = None):
+        if not database_url.startswith(MEMORY_URL_PREFIX):
+            raise ValueError(f"URL de almacenamiento en memoria inválida: {database_url}")
+        self.database_url = database_url
+        self._store = get_memory_store(database_url)
+
+    # Usuarios
+    def create_user(self, username: str, email: str, password: str) -> UserRecord:
+        """Crea un nuevo usuario"""
+        store = self._store
+        with store.lock:
+            for user in store.users.values():
+                if user['username'] == username:
+                    raise ValueError("El nombre de usuario ya existe")
+                if user['email'] == email:
+                    raise ValueError("El email ya está registrado")
+            credentials = User()
+            credentials.set_password(password)
+            user_id = next(store.user_ids)
+            store.users[user_id] = dict(
+                {field: None for field in UserRecord._fields},
+                id=user_id, username=username, email=email, created_at=_naive(get_local_datetime()),
+                is_active=True, password_hash=credentials.password_hash, salt=credentials.salt
+            )
+        store.analytics_cache.bump(user_id)
+        return self.get_user_by_id(user_id)
+
+    def authenticate_user(self, username: str, password: str) -> UserRecord:
+        """Autentica un usuario"""
+        with self._store.lock:
+            user = next((u for u in self._store.users.values() if u['username'] == username), None)
+            if user is None or not user['is_active']:
+                return None
+            if user['password_hash'] != User._hash_password(password, user['salt']):
+                return None
+            return UserRecord(**{field: user[field] for field in UserRecord._fields})
+
+    def get_user_by_id(self, user_id: int) -> UserRecord:
+        """Obtiene un usuario por ID"""
+        with self._store.lock:
+            user = self._store.users.get(user_id)
+            return UserRecord(**{field: user[field] for field in UserRecord._fields}) if user else None
+
+    def update_user_profile(self, user_id: int, **fields) -> UserRecord:
+        """Actualiza los datos de cuenta y perfil indicados (ver PROFILE_FIELDS)"""
+        unknown = set(fields) - set(PROFILE_FIELDS)
+        if unknown:
+            raise ValueError(f"Campos de perfil desconocidos: {', '.join(sorted(unknown))}")
+        store = self._store
+        with store.lock:
+            for field, message in (('username', "El nombre de usuario ya existe"), ('email', "El email ya está registrado")):
+                if field in fields and any(u[field] == fields[field] and u['id'] != user_id for u in store.users.values()):
+                    raise ValueError(message)
+            if user_id in store.users:
+                store.users[user_id].update(fields)
+        store.analytics_cache.bump(user_id)
+        return self.get_user_by_id(user_id)
+
+    # Sesiones
+    def create_chat_session(self, user_id: int, name: str = "Nueva Conversación", mode: str = "charlemos") -> SessionRecord:
+        """Crea una nueva sesión de chat para un usuario"""
+        store = self._store
+        with store.lock:
+            if user_id not in store.users:
+                raise ValueError(f"Usuario inexistente: {user_id}")
+            session_id = next(store.session_ids)
+            now = _epoch(get_local_datetime())
+            store.sessions[session_id] = dict(
+                id=session_id, user_id=user_id, name=name, mode=mode, created_at=now, last_used_at=now,
+                last_message_preview=None, last_role=None, message_count=0
+            )
+            store.messages[session_id] = []
+            store.daily_activity.setdefault((user_id, local_day(to_epoch_ms(now)), mode), [0, 0, 0.0])[0] += 1
+            record = SessionRecord(**store.sessions[session_id])
+        store.analytics_cache.bump(user_id)
+        return record
+
+    def get_chat_session(self, session_id: int) -> SessionRecord:
+        """Obtiene una sesión de chat por ID"""
+        with self._store.lock:
+            session = self._store.sessions.get(session_id)
+            return SessionRecord(**session) if session else None
+
+    def rename_chat_session(self, session_id: int, name: str) -> bool:
+        """Cambia el nombre de una sesión; retorna False si no existe"""
+        with self._store.lock:
+            session = self._store.sessions.get(session_id)
+            if session is None:
+                return False
+            session['name'] = name
+        self._store.analytics_cache.bump(session['user_id'])
+        return True
+
+    def delete_chat_session(self, session_id: int):
+        """Elimina una sesión con sus mensajes, estadísticas y preguntas respondidas"""
+        self.delete_sessions([session_id])
+
+    def delete_sessions(self, session_ids: list, batch_size: int = 500) -> int:
+        """Elimina varias sesiones con sus mensajes, estadísticas y preguntas respondidas; retorna cuántas existían"""
+        self._wait_for_pending_writes()
+        store = self._store
+        owners = set()
+        deleted = 0
+        with store.lock:
+            for session_id in session_ids:
+                session = store.sessions.pop(session_id, None)
+                if session is None:
+                    continue
+                store.messages.pop(session_id, None)
+                store.stats.pop(session_id, None)
+                store.attempts.pop(session_id, None)
+                owners.add(session['user_id'])
+                deleted += 1
+        if owners:
+            store.analytics_cache.bump(*owners)
+        return deleted
+
+    def get_latest_chat_session(self, user_id: int) -> SessionRecord:
+        """Obtiene la sesión de chat más reciente de un usuario"""
+        with self._store.lock:
+            sessions = [s for s in self._store.sessions.values() if s['user_id'] == user_id]
+            if sessions:
+                return SessionRecord(**max(sessions, key=lambda s: (s['created_at'], s['id'])))
+        return self.create_chat_session(user_id)
+
+    def get_user_sessions(self, user_id: int, mode: str = None) -> list:
+        """Obtiene todas las sesiones de un usuario (SessionRecord), opcionalmente filtradas por modo"""
+        self._wait_for_pending_writes()
+        with self._store.lock:
+            sessions = [SessionRecord(**s) for s in self._store.sessions.values()
+                        if s['user_id'] == user_id and (not mode or s['mode'] == mode)]
+        return sorted(sessions, key=lambda s: (s.last_used_at, s.id), reverse=True)
+
+    def get_archived_sessions(self, user_id: int, mode: str = None) -> list:
+        """Sin archivo histórico: no hay sesiones archivadas"""
+        return []
+
+    def restore_session(self, archived_session_id: int) -> int:
+        """Sin archivo histórico: no hay sesiones que restaurar"""
+        return None
+
+    # Mensajes
+    def add_message(self, session_id: int, role: str, content: str) -> MessageRecord:
+        """Añade un nuevo mensaje a la sesión especificada"""
+        message = self._add_rows([(session_id, role, content, get_local_datetime())])[0]
+        return MessageRecord(message.id, message.role, message.content)
+
+    def add_turn(self, session_id: int, user_message: str, assistant_message: str, user_timestamp: datetime = None,
+                 verdicts: list = None):
+        """Guarda un turno completo (mensaje del usuario y respuesta de la IA) con sus preguntas respondidas"""
+        now = get_local_datetime()
+        self.add_turns([PendingTurn(session_id, user_message, assistant_message, user_timestamp or now, now,
+                                    tuple(verdicts or ()))])
+
+    def add_turns(self, turns: list):
+        """Guarda varios turnos (PendingTurn) de una sola vez"""
+        rows = []
+        for turn in turns:
+            rows.append((turn.session_id, 'user', turn.user_message, turn.user_timestamp))
+            rows.append((turn.session_id, 'assistant', turn.assistant_message, turn.assistant_timestamp))
+        if rows:
+            self._add_rows(rows, [(turn.session_id, turn.verdicts, to_epoch_ms(turn.assistant_timestamp))
+                                  for turn in turns if turn.verdicts])
+
+    def _add_rows(self, rows: list, verdicts: list = ()) -> list:
+        """
+        Guarda mensajes (session_id, role, content, timestamp) y actualiza resumen y
+        estadísticas, junto con las preguntas respondidas (session_id, AttemptVerdicts,
+        milisegundos de la respuesta)
+        """
+        store = self._store
+        owners = set()
+        with store.lock:
+            missing = {row[0] for row in rows} - set(store.sessions)
+            if missing:
+                raise ValueError(f"Sesión inexistente: {min(missing)}")
+            added = []
+            for session_id, role, content, timestamp in rows:
+                message = _StoredMessage(next(store.message_ids), session_id, role, content, _epoch(timestamp),
+                                         tokenize(content))
+                store.messages[session_id].append(message)
+                added.append(message)
+
+                stats = store.stats.get(session_id)
+                if stats is None:
+                    stats = store.stats[session_id] = SessionStats(session_id=session_id)
+                active_seconds = stats.active_seconds or 0.0
+                stats.apply_message(role, content, message.timestamp)
+
+                session = store.sessions[session_id]
+                activity = store.daily_activity.setdefault(
+                    (session['user_id'], local_day(to_epoch_ms(message.timestamp)), session['mode']), [0, 0, 0.0]
+                )
+                activity[1] += 1
+                activity[2] += (stats.active_seconds or 0.0) - active_seconds
+                session.update(last_used_at=message.timestamp, last_message_preview=content[:SESSION_PREVIEW_LENGTH],
+                               last_role=role, message_count=session['message_count'] + 1)
+                owners.add(session['user_id'])
+            for session_id, session_verdicts, answered_ms in verdicts:
+                store.attempts.setdefault(session_id, []).extend(
+                    (answered_ms, verdict) for verdict in session_verdicts
+                )
+        store.analytics_cache.bump(*owners)
+        return added
+
+    def get_message_writer(self):
+        """Retorna el escritor en segundo plano compartido por el almacén"""
+        store = self._store
+        with store.lock:
+            if store.message_writer is None:
+                from .writer import MessageWriter
+                store.message_writer = MessageWriter(self)
+            return store.message_writer
+
+    def flush_pending_writes(self):
+        """
+        Espera a que el escritor en segundo plano guarde los turnos pendientes.
+
+        Raises:
+            MessageWriteError: Si hubo turnos que no se pudieron guardar y aún no se informaron
+        """
+        writer = self._store.message_writer
+        if writer is not None:
+            writer.flush()
+
+    def _wait_for_pending_writes(self):
+        """
+        Espera al escritor antes de una lectura o un mantenimiento, sin
+        informar sus fallos: ese aviso es de flush_pending_writes y dispose_engines.
+        """
+        writer = self._store.message_writer
+        if writer is not None:
+            writer.wait()
+
+    def get_session_messages(self, session_id: int) -> list:
+        """Obtiene todos los mensajes (role, content) de una sesión específica"""
+        self._wait_for_pending_writes()
+        with self._store.lock:
+            messages = sorted(self._store.messages.get(session_id, ()), key=lambda m: (m.timestamp, m.id))
+        return [(m.role, m.content) for m in messages]
+
+    def get_session_messages_page(self, session_id: int, before_id: int = None, limit: int = 50) -> list:
+        """Obtiene los `limit` mensajes anteriores a `before_id` (MessageRecord, en orden cronológico)"""
+        self._wait_for_pending_writes()
+        with self._store.lock:
+            messages = [m for m in self._store.messages.get(session_id, ()) if before_id is None or m.id < before_id]
+        return [MessageRecord(m.id, m.role, m.content) for m in messages[-limit:]] if limit > 0 else []
+
+    def search_messages(self, user_id: int, query: str, mode: str = None, limit: int = 20, offset: int = 0) -> list:
+        """
+        Busca en los mensajes del usuario: las palabras se combinan con AND y
+        la última se busca como prefijo. Ordena por cantidad de coincidencias.
+        """
+        terms = search_terms(query)
+        if not terms:
+            return []
+
+        self._wait_for_pending_writes()
+        results = []
+        with self._store.lock:
+            for session in self._store.sessions.values():
+                if session['user_id'] != user_id or (mode and session['mode'] != mode):
+                    continue
+                for message in self._store.messages[session['id']]:
+                    hits = match_terms(message.words, terms)
+                    if hits is not None:
+                        results.append(SearchResult(
+                            message.id, session['id'], session['name'], session['mode'], message.role,
+                            message.timestamp, build_snippet(message.content, message.words, hits), -float(len(hits))
+                        ))
+        results.sort(key=lambda r: (r.rank, r.message_id))
+        return results[offset:offset + limit]
+
+    # Analíticas
+    def get_user_analytics_data(self, user_id: int, since: datetime = None, until: datetime = None,
+                                compare: bool = False) -> dict:
+        """Obtiene los datos de análisis del usuario, opcionalmente en una ventana (mismo formato que DatabaseManager)"""
+        self._wait_for_pending_writes()
+        return self._analytics_for_window(self._store.analytics_cache, user_id, since, until, compare)
+
+    def invalidate_analytics(self, user_id: int = None):
+        """Descarta las analíticas en caché del usuario (o de todos)"""
+        if user_id is None:
+            self._store.analytics_cache.clear()
+        else:
+            self._store.analytics_cache.bump(user_id)
+
+    def _compute_user_analytics_data(self, user_id: int, window: AnalyticsWindow = LIFETIME) -> dict:
+        """
+        Lee del almacén las sesiones creadas en la ventana con sus estadísticas
+        y mensajes, las preguntas respondidas en ella y la actividad diaria de
+        esos días, y arma las analíticas
+        """
+        store = self._store
+        with store.lock:
+            user = store.users.get(user_id)
+            if not user:
+                return {}
+            profile_data = {field: user[field] for field in (
+                'full_name', 'experience_years', 'target_exam_date', 'study_hours_daily', 'company', 'position'
+            )}
+            since_ms, until_ms = window
+            sessions = [s for s in store.sessions.values() if s['user_id'] == user_id
+                        and (since_ms is None or to_epoch_ms(s['created_at']) >= since_ms)
+                        and (until_ms is None or to_epoch_ms(s['created_at']) < until_ms)]
+            timeline_rows = []
+            for session in sessions:
+                row = [session['id'], session['name'], session['mode'], to_epoch_ms(session['created_at'])]
+                stats = store.stats.get(session['id'])
+                if stats is None:
+                    row += [0, 0, 0, 0, 0.0, 0, 0]
+                else:
+                    row += [stats.message_count, stats.user_message_count or 0, to_epoch_ms(stats.first_ts),
+                            to_epoch_ms(stats.last_ts), stats.active_seconds or 0.0, stats.correct_count or 0,
+                            stats.incorrect_count or 0]
+                timeline_rows.append(row)
+            # Respuestas dadas en la ventana, aunque la sesión sea anterior
+            attempt_counts = {}
+            for session in store.sessions.values():
+                if session['user_id'] != user_id:
+                    continue
+                for answered_ms, verdict in store.attempts.get(session['id'], ()):
+                    if since_ms is not None and answered_ms < since_ms:
+                        continue
+                    if until_ms is not None and answered_ms >= until_ms:
+                        continue
+                    key = (session['id'], verdict.domain, verdict.topic, verdict.difficulty)
+                    counts = attempt_counts.setdefault(key, [0, 0])
+                    counts[0] += 1
+                    counts[1] += verdict.is_correct
+            activity_rows = [(day, *totals) for (owner, day, _), totals in store.daily_activity.items()
+                             if owner == user_id and (window.first_day is None or day >= window.first_day)
+                             and (window.last_day is None or day <= window.last_day)]
+            assessment_messages = {
+                s['id']: sorted((AssessmentMessage(m.role, m.content, to_epoch_ms(m.timestamp))
+                                 for m in store.messages[s['id']]), key=lambda m: m.timestamp_ms)
+                for s in sessions if s['mode'] in ("evaluemos", "simulemos") and store.messages[s['id']]
+            }
+        attempt_groups = [AttemptGroup(*key, *counts) for key, counts in attempt_counts.items()]
+        return self._build_user_analytics(profile_data, SessionTimeline.from_rows(timeline_rows), assessment_messages,
+                                          attempt_groups, ActivityDays.from_rows(activity_rows), window=window)
@@ -0,0 +1,365 @@
+"""
+Migraciones versionadas del esquema.
+
+La tabla schema_version registra cada migración aplicada. Al iniciar,
+DatabaseManager aplica en una sola pasada las migraciones pendientes, en
+orden y cada una en su propia transacción; si la base ya está en la última
+versión, el costo es una consulta. Una base nueva se crea directamente con
+el esquema actual y se marca en la última versión.
+
+Las migraciones que recalculan datos (backfills) los procesan en lotes con
+marca de agua en maintenance_state, así que una actualización interrumpida
+continúa donde quedó. Las marcadas como `background` corren en un hilo
+aparte para no demorar el arranque en bases grandes.
+
+Antes de migrar una base existente se hace una copia con la API de backup
+de SQLite, página por página, sin bloquear a la aplicación.
+
+Para agregar una migración: definir su función `upgrade(conn)` (idempotente)
+y sumarla al final de MIGRATIONS con la versión siguiente.
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Callable, NamedTuple
+
+from sqlalchemy import inspect as sa_inspect, select, func, text
+from sqlalchemy.schema import CreateColumn, CreateIndex
+
+from .models import (Base, User, ChatSession, ChatMessage, SessionStats, QuestionAttempt, DailyActivity,
+                     MaintenanceState,
+                     SchemaVersion, SEARCH_INDEX_TABLE, SEARCH_CONTENT_VIEW, SEARCH_INDEX_TRIGGERS, ARCHIVE_SCHEMA,
+                     ARCHIVE_TABLES, database_path_for, get_local_datetime)
+from .timestamps import LOCAL_UTC_OFFSET_MS
+
+class Migration(NamedTuple):
+    """
+    Paso del esquema.
+
+    upgrade(conn): cambios de esquema, idempotentes (la base puede venir de
+        los scripts de migración anteriores con parte del cambio aplicado)
+    backfill(db_manager, progress): recálculo de datos reanudable por lotes
+    backfill_key: clave de maintenance_state del backfill
+    background: si el backfill corre en segundo plano tras el arranque
+    transactional: si upgrade corre en una transacción (VACUUM no puede)
+    """
+    version: int
+    name: str
+    upgrade: Callable = None
+    backfill: Callable = None
+    backfill_key: str = None
+    background: bool = False
+    transactional: bool = True
+
+# Páginas copiadas por paso de la copia de seguridad (4 MB con páginas de 4 KB)
+BACKUP_PAGES_PER_STEP = 1024
+
+def add_missing_columns(conn, table, names: tuple = None):
+    """Agrega a la tabla existente las columnas del modelo que le faltan"""
+    existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+    for column in table.columns:
+        if column.name in existing or (names is not None and column.name not in names):
+            continue
+        ddl = str(CreateColumn(column).compile(dialect=conn.dialect))
+        # SQLite exige un valor por defecto para agregar columnas NOT NULL
+        if not column.nullable and column.default is not None and column.default.is_scalar:
+            ddl += f" DEFAULT {column.default.arg!r}"
+        conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+
+def _create_legacy_tables(conn):
+    """Tablas nuevas y columnas de usuario, modo y último uso de las primeras versiones"""
+    Base.metadata.create_all(conn)
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(chat_sessions)")}
+    if 'user_id' not in columns:
+        # Las sesiones anteriores a la autenticación pasan al primer usuario (o a uno por defecto)
+        user_id = conn.execute(select(User.id).order_by(User.id).limit(1)).scalar()
+        if user_id is None:
+            user = User()
+            user.set_password("admin123")
+            user_id = conn.execute(User.__table__.insert().values(
+                username="admin", email="admin@demo.com", password_hash=user.password_hash, salt=user.salt
+            )).inserted_primary_key[0]
+        conn.exec_driver_sql("ALTER TABLE chat_sessions ADD COLUMN user_id INTEGER REFERENCES users(id)")
+        conn.execute(text("UPDATE chat_sessions SET user_id = :user_id WHERE user_id IS NULL"), {"user_id": user_id})
+    if 'mode' not in columns:
+        conn.exec_driver_sql("ALTER TABLE chat_sessions ADD COLUMN mode VARCHAR(50) DEFAULT 'charlemos'")
+    if 'last_used_at' not in columns:
+        conn.exec_driver_sql("ALTER TABLE chat_sessions ADD COLUMN last_used_at DATETIME")
+        conn.exec_driver_sql("UPDATE chat_sessions SET last_used_at = created_at WHERE last_used_at IS NULL")
+
+def _add_profile_columns(conn):
+    add_missing_columns(conn, User.__table__)
+
+def _add_summary_columns(conn):
+    add_missing_columns(conn, ChatSession.__table__, ('last_message_preview', 'last_role', 'message_count'))
+
+def _create_indexes(conn):
+    """Índices compuestos de las consultas frecuentes, tomados de los modelos"""
+    for table in (ChatSession.__table__, ChatMessage.__table__):
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            conn.execute(CreateIndex(index, if_not_exists=True))
+    # Actualizar las estadísticas del planificador para los nuevos índices
+    conn.exec_driver_sql("PRAGMA optimize")
+
+def _add_delete_cascade(conn):
+    """
+    Recrea chat_messages y session_stats con ON DELETE CASCADE hacia
+    chat_sessions (SQLite no permite alterar una clave foránea). Las filas
+    huérfanas de sesiones ya borradas no se copian.
+    """
+    for table in (ChatMessage.__table__, SessionStats.__table__):
+        foreign_keys = conn.exec_driver_sql(f"PRAGMA foreign_key_list({table.name})").fetchall()
+        # (id, seq, tabla, desde, hacia, on_update, on_delete, match)
+        if any(fk[2] == 'chat_sessions' and fk[6] == 'CASCADE' for fk in foreign_keys):
+            continue
+        if table is ChatMessage.__table__:
+            # El índice de búsqueda se recrea con la tabla; el trigger de inserción encola los mensajes copiados
+            for trigger in SEARCH_INDEX_TRIGGERS:
+                conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+            conn.exec_driver_sql(f"DROP VIEW IF EXISTS {SEARCH_CONTENT_VIEW}")
+            conn.exec_driver_sql(f"DROP TABLE IF EXISTS {SEARCH_INDEX_TABLE}")
+        old_name = f"{table.name}_old"
+        conn.exec_driver_sql(f"ALTER TABLE {table.name} RENAME TO {old_name}")
+        for (index,) in conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (old_name,)
+        ).fetchall():
+            conn.exec_driver_sql(f"DROP INDEX {index}")
+        table.create(conn)
+        existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({old_name})")}
+        columns = ', '.join(column.name for column in table.columns if column.name in existing)
+        conn.exec_driver_sql(
+            f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {old_name} "
+            f"WHERE session_id IN (SELECT id FROM chat_sessions) ORDER BY rowid"
+        )
+        conn.exec_driver_sql(f"DROP TABLE {old_name}")
+
+def _enable_incremental_vacuum(conn):
+    """
+    Pide auto_vacuum=INCREMENTAL en una base existente. SQLite lo aplica recién
+    con un VACUUM completo, que reescribe el archivo: no se hace al iniciar,
+    sino con DatabaseManager.compact_database (python migrate_db.py --compact).
+    """
+    conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+
+# Columnas de fecha que pasan de texto a milisegundos UTC (EpochMillis)
+EPOCH_MS_COLUMNS = (
+    ('chat_sessions', ('created_at', 'last_used_at')),
+    ('chat_messages', ('timestamp',)),
+    ('session_stats', ('first_ts', 'last_ts')),
+)
+
+def convert_timestamps_to_epoch_ms(conn, schema: str = 'main'):
+    """
+    Convierte a milisegundos UTC las fechas que SQLAlchemy guardaba como texto
+    en hora GMT-3 ('2024-01-01 10:00:00.000000'). Las columnas conservan su
+    tipo declarado (DATETIME, afinidad NUMERIC), que guarda los enteros tal
+    cual, así que no hace falta recrear las tablas ni sus índices. Solo toca
+    los valores de texto: es idempotente.
+    """
+    offset_ms = -LOCAL_UTC_OFFSET_MS
+    for table, columns in EPOCH_MS_COLUMNS:
+        for column in columns:
+            conn.exec_driver_sql(
+                f"UPDATE {schema}.{table} "
+                f"SET {column} = CAST(ROUND((julianday({column}) - 2440587.5) * 86400000.0) AS INTEGER) + {offset_ms} "
+                f"WHERE typeof({column}) = 'text' AND julianday({column}) IS NOT NULL"
+            )
+
+def _convert_archive_timestamps(db_manager, progress=None):
+    """Misma conversión en el archivo histórico, si la base tiene uno"""
+    with db_manager._archive_connection() as conn:
+        if conn is not None:
+            convert_timestamps_to_epoch_ms(conn, ARCHIVE_SCHEMA)
+            conn.commit()
+
+def _create_question_attempts(conn):
+    """Tabla de preguntas respondidas (veredictos de EVALUEMOS y SIMULEMOS) con su índice"""
+    QuestionAttempt.__table__.create(conn, checkfirst=True)
+
+def _create_archive_question_attempts(db_manager, progress=None):
+    """Misma tabla en el archivo histórico, si la base tiene uno"""
+    with db_manager._archive_connection() as conn:
+        if conn is not None:
+            ARCHIVE_TABLES.attempts.create(conn, checkfirst=True)
+            conn.commit()
+
+def _create_daily_activity(conn):
+    """Resumen de actividad por usuario, día y modo (se llena con backfill_daily_activity)"""
+    DailyActivity.__table__.create(conn, checkfirst=True)
+
+# Orden de aplicación; una migración nueva se agrega al final con la versión siguiente
+MIGRATIONS = (
+    Migration(1, 'usuarios_y_modos', _create_legacy_tables),
+    Migration(2, 'perfil_de_usuario', _add_profile_columns),
+    Migration(3, 'resumen_del_sidebar', _add_summary_columns,
+              backfill=lambda db, progress: db.backfill_session_summaries(progress=progress),
+              backfill_key='session_summary_backfill'),
+    Migration(4, 'estadisticas_por_sesion',
+              backfill=lambda db, progress: db.backfill_session_stats(progress=progress),
+              backfill_key='session_stats_backfill'),
+    Migration(5, 'indices_de_consultas', _create_indexes),
+    Migration(6, 'busqueda_de_texto_completo',
+              backfill=lambda db, progress: db._ensure_search_index()),
+    Migration(7, 'compresion_de_mensajes',
+              backfill=lambda db, progress: db.compress_messages(progress=progress),
+              backfill_key='message_compression_backfill', background=True),
+    Migration(8, 'borrado_en_cascada', _add_delete_cascade),
+    Migration(9, 'vacio_incremental', _enable_incremental_vacuum, transactional=False),
+    Migration(10, 'fechas_en_milisegundos', convert_timestamps_to_epoch_ms, backfill=_convert_archive_timestamps),
+    Migration(11, 'veredictos_por_palabra',
+              backfill=lambda db, progress: db.recount_answer_verdicts(progress=progress),
+              backfill_key='answer_verdict_backfill'),
+    Migration(12, 'preguntas_respondidas', _create_question_attempts, backfill=_create_archive_question_attempts),
+    Migration(13, 'actividad_diaria', _create_daily_activity,
+              backfill=lambda db, progress: db.backfill_daily_activity(progress=progress),
+              backfill_key='daily_activity_backfill'),
+    # El índice de la migración 6 leía el texto con pmp_decompress, que solo registra DatabaseManager
+    Migration(14, 'busqueda_sin_funciones_sql', backfill=lambda db, progress: db._ensure_search_index()),
+    # Índice sin copia del texto (content=''): se recrea y se llena desde chat_messages
+    Migration(15, 'busqueda_sin_copia_del_texto', backfill=lambda db, progress: db._ensure_search_index()),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+class _BackfillStopped(Exception):
+    """El proceso se cierra: el backfill en segundo plano se retoma en el próximo arranque"""
+
+def current_version(conn) -> int:
+    """Última versión aplicada; 0 si la base es anterior a schema_version"""
+    if not sa_inspect(conn).has_table(SchemaVersion.__tablename__):
+        return 0
+    return conn.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+
+def _record_version(conn, migration: Migration):
+    conn.execute(SchemaVersion.__table__.insert().values(
+        version=migration.version, name=migration.name, applied_at=get_local_datetime()
+    ))
+
+def backup_database(db_path: str, backup_path: str, pages: int = BACKUP_PAGES_PER_STEP, progress=None) -> str:
+    """
+    Copia la base con la API de backup de SQLite, `pages` páginas por paso.
+    Entre pasos la base queda libre para las demás conexiones, y si otra
+    conexión escribe durante la copia, SQLite la reinicia para que sea consistente.
+    
+    Args:
+        db_path (str): Base de datos de origen
+        backup_path (str): Archivo de destino (se sobrescribe)
+        pages (int): Páginas copiadas por paso
+        progress (callable): Callback opcional (páginas restantes, páginas totales)
+        
+    Returns:
+        str: Ruta de la copia
+    """
+    source = sqlite3.connect(db_path)
+    target = sqlite3.connect(backup_path)
+    try:
+        source.backup(target, pages=pages,
+                      progress=(lambda status, remaining, total: progress(remaining, total)) if progress else None)
+    finally:
+        target.close()
+        source.close()
+    return backup_path
+
+def backup_path_for(db_path: str, version: int) -> str:
+    """Ruta de la copia previa a migrar una base en la versión `version`"""
+    root, ext = os.path.splitext(db_path)
+    return f"{root}_backup_v{version}{ext or '.db'}"
+
+def run_migrations(db_manager, backup: bool = True, progress=None) -> list:
+    """
+    Aplica las migraciones pendientes en orden. Cada una registra su versión
+    recién cuando terminan su cambio de esquema y su backfill, así que una
+    actualización interrumpida se retoma en el siguiente arranque. Los
+    backfills en segundo plano quedan en un hilo y se retoman mientras no
+    marquen su clave como completa.
+    
+    Args:
+        db_manager (DatabaseManager): Base a migrar
+        backup (bool): Copiar antes una base existente con migraciones pendientes
+        progress (callable): Callback opcional que recibe mensajes de avance
+        
+    Returns:
+        list: Migraciones aplicadas en esta llamada
+    """
+    report = progress or (lambda message: None)
+    engine = db_manager.engine
+    with engine.connect() as conn:
+        version = current_version(conn)
+        is_new = version == 0 and not sa_inspect(conn).get_table_names()
+    
+    if is_new:
+        # Base nueva: esquema actual completo y sin datos que recalcular
+        with engine.begin() as conn:
+            Base.metadata.create_all(conn)
+            for migration in MIGRATIONS:
+                _record_version(conn, migration)
+                if migration.backfill_key:
+                    conn.execute(MaintenanceState.__table__.insert(),
+                                 {'key': migration.backfill_key, 'value': 'done'})
+        return list(MIGRATIONS)
+    
+    pending = [migration for migration in MIGRATIONS if migration.version > version]
+    db_path = database_path_for(engine.url)
+    if pending and backup and db_path:
+        target = backup_database(db_path, backup_path_for(db_path, version))
+        report(f"Copia de seguridad creada: {target}")
+    
+    for migration in pending:
+        report(f"Migración {migration.version}: {migration.name}")
+        if migration.upgrade is not None and migration.transactional:
+            with engine.begin() as conn:
+                migration.upgrade(conn)
+        elif migration.upgrade is not None:
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                migration.upgrade(conn)
+        if migration.backfill is not None and not migration.background:
+            migration.backfill(db_manager, lambda total: report(f"   {total} filas procesadas"))
+        with engine.begin() as conn:
+            _record_version(conn, migration)
+    
+    start_background_backfills(db_manager)
+    return pending
+
+def start_background_backfills(db_manager):
+    """
+    Lanza en un hilo los backfills en segundo plano que no terminaron y la
+    indexación de los mensajes que otras conexiones dejaron en la cola de
+    búsqueda. Cada lote se confirma con su marca de agua (o sale de la cola),
+    así que al cerrar el proceso (dispose_engines) el hilo se detiene tras el
+    lote en curso.
+    
+    Returns:
+        threading.Thread: Hilo lanzado, o None si no hay trabajo pendiente
+    """
+    entry = db_manager._engine_entry
+    background = [migration for migration in MIGRATIONS if migration.background]
+    with db_manager.get_session() as db:
+        done = set(db.execute(
+            select(MaintenanceState.key).where(
+                MaintenanceState.key.in_([migration.backfill_key for migration in background]),
+                MaintenanceState.value == 'done'
+            )
+        ).scalars())
+    pending = [migration.backfill for migration in background if migration.backfill_key not in done]
+    if db_manager.has_pending_search_index():
+        pending.append(lambda db, progress: db.index_pending_messages(progress=progress))
+    if not pending:
+        return None
+    
+    def check_closing(total):
+        if entry.closing.is_set():
+            raise _BackfillStopped()
+    
+    def run():
+        try:
+            for backfill in pending:
+                backfill(db_manager, check_closing)
+        except _BackfillStopped:
+            pass
+        except Exception as e:
+            print(f"❌ Error en la migración en segundo plano: {e}")
+    
+    entry.backfill_thread = threading.Thread(target=run, name="schema-backfill", daemon=True)
+    entry.backfill_thread.start()
+    return entry.backfill_thread
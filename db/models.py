@@ -3,22 +3,92 @@ Modelos de base de datos para el chat.
 Utiliza SQLAlchemy ORM para definir las estructuras de datos.
 """
 
-from datetime import datetime, timedelta, timezone
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, MetaData, Table, Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Float, LargeBinary, Index, select, func, case, delete, insert, update, text, DDL, bindparam, TypeDecorator, type_coerce
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from contextlib import contextmanager
+from typing import NamedTuple
+import atexit
 import os
 import hashlib
+import json
 import secrets
+import threading
+import zlib
+from urllib.request import pathname2url
+
+from .analytics import (UserAnalyticsMixin, SessionTimeline, AttemptGroup, ActivityDays, AnalyticsWindow, LIFETIME,
+                        SESSION_GAP_CAP_SECONDS, MS_PER_DAY, local_day)
+from .analytics_cache import AnalyticsCache
+from .keywords import classify_message
+from .search import build_search_query, highlight, search_terms
+from .timestamps import EpochMillis, get_local_datetime, as_utc, to_epoch_ms, LOCAL_UTC_OFFSET_MS
 
 Base = declarative_base()
 
-# Zona horaria GMT-3 (Argentina/Chile/Uruguay)
-GMT_MINUS_3 = timezone(timedelta(hours=-3))
+# Caracteres del último mensaje guardados en chat_sessions para el sidebar
+SESSION_PREVIEW_LENGTH = 100
+
+# Compresión transparente del contenido de los mensajes. Los textos cortos se
+# guardan tal cual (TEXT); los largos, como BLOB con un byte de formato seguido
+# de los datos comprimidos, de modo que ambos conviven en la misma columna.
+COMPRESSION_THRESHOLD = 1024  # Bytes UTF-8 a partir de los cuales se comprime
+ZLIB_MARKER = 0x01
+
+def compress_content(content: str):
+    """Retorna marcador + zlib si el texto es largo y se reduce, o el texto sin cambios"""
+    if content is None:
+        return None
+    encoded = content.encode('utf-8')
+    if len(encoded) < COMPRESSION_THRESHOLD:
+        return content
+    compressed = zlib.compress(encoded, 6)
+    if len(compressed) + 1 >= len(encoded):
+        return content
+    return bytes((ZLIB_MARKER,)) + compressed
+
+def decompress_content(value):
+    """Inversa de compress_content; acepta textos sin comprimir"""
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    if value[:1] == bytes((ZLIB_MARKER,)):
+        return zlib.decompress(value[1:]).decode('utf-8')
+    raise ValueError(f"Formato de contenido desconocido: {value[:1]!r}")
+
+class CompressedText(TypeDecorator):
+    """Text que se comprime al escribir y se descomprime al leer."""
+    impl = Text
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        return compress_content(value)
+    
+    def process_result_value(self, value, dialect):
+        return decompress_content(value)
+
+class SearchResult(NamedTuple):
+    """Mensaje encontrado por search_messages, con un fragmento resaltado."""
+    message_id: int
+    session_id: int
+    session_name: str
+    mode: str
+    role: str
+    timestamp: datetime
+    snippet: str
+    rank: float
 
-def get_local_datetime():
-    """Retorna la fecha y hora actual en GMT-3"""
-    return datetime.now(GMT_MINUS_3)
+class PendingTurn(NamedTuple):
+    """Turno de conversación (pregunta y respuesta) pendiente de guardar."""
+    session_id: int
+    user_message: str
+    assistant_message: str
+    user_timestamp: datetime
+    assistant_timestamp: datetime
+    verdicts: tuple = ()  # AttemptVerdict de la respuesta (ver db/attempts.py)
 
 class User(Base):
     """
@@ -67,17 +137,34 @@ class ChatSession(Base):
     Permite separar diferentes conversaciones por usuario.
     """
     __tablename__ = 'chat_sessions'
+    __table_args__ = (
+        # Sidebar filtrado por modo: WHERE user_id = ? AND mode = ? ORDER BY last_used_at
+        Index('ix_chat_sessions_user_mode_last_used', 'user_id', 'mode', 'last_used_at'),
+        # Sidebar sin filtro de modo: WHERE user_id = ? ORDER BY last_used_at
+        Index('ix_chat_sessions_user_last_used', 'user_id', 'last_used_at'),
+        # Sesión más reciente y analíticas: WHERE user_id = ? ORDER BY created_at
+        Index('ix_chat_sessions_user_created', 'user_id', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     name = Column(String(255), default="Nueva Conversación")
     mode = Column(String(50), default="charlemos")  # Modo de la conversación
-    created_at = Column(DateTime, default=get_local_datetime)
-    last_used_at = Column(DateTime, default=get_local_datetime)  # Última vez que se usó
+    # Milisegundos UTC (ver db/timestamps.py)
+    created_at = Column(EpochMillis, default=get_local_datetime)
+    last_used_at = Column(EpochMillis, default=get_local_datetime)  # Última vez que se usó
+    
+    # Resumen para el sidebar, mantenido al guardar mensajes
+    last_message_preview = Column(String(SESSION_PREVIEW_LENGTH), nullable=True)
+    last_role = Column(String(50), nullable=True)
+    message_count = Column(Integer, default=0, nullable=False)
     
     # Relaciones
     user = relationship("User", back_populates="chat_sessions")
-    messages = relationship("ChatMessage", back_populates="session", cascade="all, delete-orphan")
+    # Los mensajes y estadísticas se borran en la base (ON DELETE CASCADE), sin cargarlos
+    messages = relationship("ChatMessage", back_populates="session", cascade="all, delete-orphan", passive_deletes=True)
+    stats = relationship("SessionStats", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+    attempts = relationship("QuestionAttempt", cascade="all, delete-orphan", passive_deletes=True)
 
 class ChatMessage(Base):
     """
@@ -85,26 +172,700 @@ class ChatMessage(Base):
     Almacena tanto mensajes del usuario como respuestas de la IA.
     """
     __tablename__ = 'chat_messages'
+    __table_args__ = (
+        # Historial de una sesión: WHERE session_id = ? ORDER BY timestamp
+        Index('ix_chat_messages_session_timestamp', 'session_id', 'timestamp'),
+        # Paginación por clave: WHERE session_id = ? AND id < ? ORDER BY id DESC
+        Index('ix_chat_messages_session_id', 'session_id', 'id'),
+    )
     
     id = Column(Integer, primary_key=True)
-    session_id = Column(Integer, ForeignKey('chat_sessions.id'), nullable=False)
+    session_id = Column(Integer, ForeignKey('chat_sessions.id', ondelete='CASCADE'), nullable=False)
     role = Column(String(50), nullable=False)  # 'user' o 'assistant'
-    content = Column(Text, nullable=False)
-    timestamp = Column(DateTime, default=get_local_datetime)
+    content = Column(CompressedText, nullable=False)  # Comprimido si supera COMPRESSION_THRESHOLD
+    timestamp = Column(EpochMillis, default=get_local_datetime)  # Milisegundos UTC
     
     # Relación con la sesión
     session = relationship("ChatSession", back_populates="messages")
 
-class DatabaseManager:
+# Índice de texto completo (FTS5) sobre el texto de chat_messages.content. El
+# contenido puede estar comprimido, así que SQLite no puede leer el texto por
+# sí solo: DatabaseManager indexa el texto en Python en la misma transacción
+# que escribe los mensajes (_index_messages). El índice no guarda copia del
+# texto (content=''): los fragmentos de resultados se arman desde el mensaje.
+# Un índice así solo borra una fila si se le entrega el texto indexado, y
+# contentless_delete (SQLite 3.43) no está disponible en todas las
+# instalaciones, así que los triggers (SQL puro, sin funciones propias)
+# guardan en SEARCH_DELETED_TABLE el contenido, tal como está guardado, de los
+# mensajes indexados que se borran o editan, y anotan en una cola los que
+# otras conexiones (los scripts de datos de demostración, la consola sqlite3)
+# insertan o editan. Ambas se procesan al escribir y en el hilo de
+# mantenimiento del arranque (index_pending_messages). Las búsquedas solo leen.
+SEARCH_INDEX_TABLE = 'chat_messages_fts'
+SEARCH_PENDING_TABLE = 'chat_messages_fts_pending'
+SEARCH_DELETED_TABLE = 'chat_messages_fts_deleted'
+# Vista de versiones anteriores, que descomprimía con la función pmp_decompress
+SEARCH_CONTENT_VIEW = 'chat_messages_search_content'
+
+SEARCH_INDEX_DDL = (
+    f"CREATE TABLE IF NOT EXISTS {SEARCH_PENDING_TABLE} (message_id INTEGER PRIMARY KEY)",
+    f"CREATE TABLE IF NOT EXISTS {SEARCH_DELETED_TABLE} (message_id INTEGER PRIMARY KEY, content)",
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_INDEX_TABLE} USING fts5(
+        content, content='', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS chat_messages_fts_insert AFTER INSERT ON chat_messages BEGIN
+        INSERT OR IGNORE INTO {SEARCH_PENDING_TABLE}(message_id) VALUES (new.id);
+    END""",
+    # Un mensaje en la cola no está indexado con su contenido actual: su texto
+    # indexado, si lo hay, ya se guardó al editarlo
+    f"""CREATE TRIGGER IF NOT EXISTS chat_messages_fts_delete AFTER DELETE ON chat_messages BEGIN
+        INSERT OR IGNORE INTO {SEARCH_DELETED_TABLE}(message_id, content) SELECT old.id, old.content
+            WHERE NOT EXISTS (SELECT 1 FROM {SEARCH_PENDING_TABLE} WHERE message_id = old.id);
+        DELETE FROM {SEARCH_PENDING_TABLE} WHERE message_id = old.id;
+    END""",
+    # compress_messages descarta lo que anota este trigger: solo recomprime el mismo texto
+    f"""CREATE TRIGGER IF NOT EXISTS chat_messages_fts_update AFTER UPDATE OF content ON chat_messages
+    WHEN old.content IS NOT new.content BEGIN
+        INSERT OR IGNORE INTO {SEARCH_DELETED_TABLE}(message_id, content) SELECT old.id, old.content
+            WHERE NOT EXISTS (SELECT 1 FROM {SEARCH_PENDING_TABLE} WHERE message_id = old.id);
+        INSERT OR IGNORE INTO {SEARCH_PENDING_TABLE}(message_id) VALUES (new.id);
+    END""",
+)
+
+SEARCH_INDEX_TRIGGERS = ('chat_messages_fts_insert', 'chat_messages_fts_delete', 'chat_messages_fts_update')
+
+for _statement in SEARCH_INDEX_DDL:
+    event.listen(ChatMessage.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+for _statement in (f"DROP TABLE IF EXISTS {SEARCH_INDEX_TABLE}", f"DROP TABLE IF EXISTS {SEARCH_PENDING_TABLE}",
+                   f"DROP TABLE IF EXISTS {SEARCH_DELETED_TABLE}"):
+    event.listen(ChatMessage.__table__, 'before_drop', DDL(_statement).execute_if(dialect='sqlite'))
+
+class SessionStats(Base):
+    """
+    Estadísticas de una sesión mantenidas de forma incremental al guardar mensajes.
+    Evita recorrer el historial completo en cada cálculo de analíticas.
+    """
+    __tablename__ = 'session_stats'
+    
+    session_id = Column(Integer, ForeignKey('chat_sessions.id', ondelete='CASCADE'), primary_key=True)
+    message_count = Column(Integer, default=0, nullable=False)
+    user_message_count = Column(Integer, default=0, nullable=False)
+    first_ts = Column(EpochMillis, nullable=True)
+    last_ts = Column(EpochMillis, nullable=True)
+    active_seconds = Column(Float, default=0.0, nullable=False)  # Pausas limitadas a SESSION_GAP_CAP_SECONDS
+    correct_count = Column(Integer, default=0, nullable=False)
+    incorrect_count = Column(Integer, default=0, nullable=False)
+    
+    def apply_message(self, role: str, content: str, timestamp: datetime):
+        """Incorpora un mensaje a las estadísticas (los mensajes llegan en orden cronológico)"""
+        timestamp = as_utc(timestamp)
+        if self.last_ts is None:
+            self.first_ts = timestamp
+        else:
+            gap = max((timestamp - self.last_ts).total_seconds(), 0)
+            self.active_seconds = (self.active_seconds or 0.0) + min(gap, SESSION_GAP_CAP_SECONDS)
+        self.last_ts = timestamp
+        self.message_count = (self.message_count or 0) + 1
+        
+        if role == 'user':
+            self.user_message_count = (self.user_message_count or 0) + 1
+        elif role == 'assistant':
+            # Veredicto por palabra completa: 'incorrecto' ya no cuenta como acierto
+            verdict = classify_message(content).verdict
+            if verdict == 'correcto':
+                self.correct_count = (self.correct_count or 0) + 1
+            elif verdict == 'incorrecto':
+                self.incorrect_count = (self.incorrect_count or 0) + 1
+
+class QuestionAttempt(Base):
+    """
+    Pregunta respondida en EVALUEMOS o SIMULEMOS, según el veredicto
+    estructurado que agrega el modelo a su respuesta (ver db/attempts.py).
+    """
+    __tablename__ = 'question_attempts'
+    __table_args__ = (
+        # Aciertos por sesión, dominio, tema y dificultad: GROUP BY sin leer la tabla
+        Index('ix_question_attempts_session_breakdown', 'session_id', 'domain', 'topic', 'difficulty', 'is_correct'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    session_id = Column(Integer, ForeignKey('chat_sessions.id', ondelete='CASCADE'), nullable=False)
+    domain = Column(String(30), nullable=True)  # people, process o business_environment
+    topic = Column(String(100), nullable=True)
+    difficulty = Column(String(20), nullable=True)  # baja, media o alta
+    is_correct = Column(Boolean, nullable=False)
+    answered_at = Column(EpochMillis, nullable=False)
+
+class DailyActivity(Base):
+    """
+    Actividad de un usuario por día local (GMT-3) y modo, mantenida de forma
+    incremental al crear sesiones y guardar mensajes. La racha y el progreso
+    semanal leen estas filas (una por día activo y modo) en lugar de las
+    sesiones. Es un registro de lo estudiado: archivar, purgar o eliminar
+    sesiones no lo modifica.
+    """
+    __tablename__ = 'daily_activity'
+    
+    # La clave primaria (user_id, day, mode) es también el índice de las consultas por rango de días
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    day = Column(Integer, primary_key=True, autoincrement=False)  # Días desde 1970 en hora local
+    mode = Column(String(50), primary_key=True)
+    sessions = Column(Integer, default=0, nullable=False)  # Sesiones creadas ese día
+    messages = Column(Integer, default=0, nullable=False)
+    active_seconds = Column(Float, default=0.0, nullable=False)  # Pausas limitadas a SESSION_GAP_CAP_SECONDS
+
+def _daily_activity_upsert():
+    """INSERT ... ON CONFLICT que suma los incrementos a la fila existente"""
+    table = DailyActivity.__table__
+    statement = sqlite_insert(table)
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.day, table.c.mode],
+        set_={column: table.c[column] + statement.excluded[column]
+              for column in ('sessions', 'messages', 'active_seconds')}
+    )
+
+# Se arma una sola vez: construir la sentencia en cada escritura cuesta más que ejecutarla
+DAILY_ACTIVITY_UPSERT = _daily_activity_upsert()
+
+def _add_daily_activity(db, increments: dict):
+    """
+    Suma a daily_activity los incrementos {(user_id, day, mode): [sesiones,
+    mensajes, segundos activos]} con un upsert por fila (sin commit).
+    """
+    if not increments:
+        return
+    db.execute(
+        DAILY_ACTIVITY_UPSERT,
+        [{'user_id': user_id, 'day': day, 'mode': mode, 'sessions': sessions, 'messages': messages,
+          'active_seconds': active_seconds}
+         for (user_id, day, mode), (sessions, messages, active_seconds) in increments.items()]
+    )
+
+class MaintenanceState(Base):
+    """
+    Estado persistente de tareas de mantenimiento (por ejemplo, la marca de
+    agua de un backfill), para poder reanudarlas tras una interrupción.
+    """
+    __tablename__ = 'maintenance_state'
+    
+    key = Column(String(100), primary_key=True)
+    value = Column(String(255), nullable=False)
+
+class SchemaVersion(Base):
+    """Migraciones del esquema aplicadas a la base de datos (ver db/migrations.py)."""
+    __tablename__ = 'schema_version'
+    
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String(100), nullable=False)
+    applied_at = Column(DateTime, nullable=False)
+
+# Archivo histórico: las sesiones sin uso reciente se mueven, con sus mensajes
+# y estadísticas, a un segundo archivo SQLite que se adjunta (ATTACH) como el
+# esquema 'archive' solo mientras se lo consulta. Las tablas son copias sin
+# claves foráneas ni índice de búsqueda; los IDs se reasignan al mover sesiones
+# entre archivos, por lo que cada archivo tiene su propia numeración.
+ARCHIVE_SCHEMA = 'archive'
+archive_metadata = MetaData()
+
+def _archive_table(table, *indexes):
+    """Copia de una tabla del historial en el esquema del archivo"""
+    columns = [Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable) for c in table.columns]
+    return Table(table.name, archive_metadata, *columns, *indexes, schema=ARCHIVE_SCHEMA)
+
+class HistoryTables(NamedTuple):
+    """Tablas de sesiones, mensajes, estadísticas y preguntas respondidas de un archivo del historial"""
+    sessions: Table
+    messages: Table
+    stats: Table
+    attempts: Table
+    # Las sesiones del archivo usan IDs negativos al combinarse con las activas
+    key_sign: int = 1
+    
+    def session_key(self, column):
+        """Columna de ID de sesión, sin colisiones entre archivos"""
+        return column if self.key_sign > 0 else (-column).label(column.name)
+
+HOT_TABLES = HistoryTables(ChatSession.__table__, ChatMessage.__table__, SessionStats.__table__,
+                           QuestionAttempt.__table__)
+ARCHIVE_TABLES = HistoryTables(
+    _archive_table(ChatSession.__table__, Index('ix_archive_sessions_user_last_used', 'user_id', 'last_used_at')),
+    _archive_table(ChatMessage.__table__, Index('ix_archive_messages_session_id', 'session_id', 'id')),
+    _archive_table(SessionStats.__table__),
+    _archive_table(QuestionAttempt.__table__, Index('ix_archive_attempts_session', 'session_id')),
+    key_sign=-1
+)
+
+# Tablas del historial con su columna de sesión, de las dependientes a chat_sessions
+HISTORY_DELETE_ORDER = (('chat_messages', 'session_id'), ('session_stats', 'session_id'),
+                        ('question_attempts', 'session_id'), ('chat_sessions', 'id'))
+
+# Registros de solo lectura que devuelven las consultas de DatabaseManager.
+# Se construyen desde select() de Core, sin instancias del ORM: no quedan
+# objetos desconectados de su sesión ni cargas diferidas ocultas, y al ser
+# tuplas no tienen __dict__. El ORM queda para las escrituras.
+class UserRecord(NamedTuple):
+    """Datos de un usuario (sin hash ni salt de la contraseña)"""
+    id: int
+    username: str
+    email: str
+    created_at: datetime
+    is_active: bool
+    full_name: str
+    phone: str
+    company: str
+    position: str
+    experience_years: int
+    target_exam_date: str
+    study_hours_daily: int
+
+# Campos que update_user_profile acepta
+PROFILE_FIELDS = ('username', 'email', 'full_name', 'phone', 'company', 'position',
+                  'experience_years', 'target_exam_date', 'study_hours_daily')
+
+class SessionRecord(NamedTuple):
+    """Sesión de chat con el resumen que muestra el sidebar"""
+    id: int
+    user_id: int
+    name: str
+    mode: str
+    created_at: datetime
+    last_used_at: datetime
+    last_message_preview: str
+    last_role: str
+    message_count: int
+
+class MessageRecord(NamedTuple):
+    """Mensaje de una página del historial"""
+    id: int
+    role: str
+    content: str
+
+def _record_columns(record_type, table: Table) -> list:
+    """Columnas de `table` en el orden de los campos del registro"""
+    return [table.c[name] for name in record_type._fields]
+
+USER_RECORD_COLUMNS = _record_columns(UserRecord, User.__table__)
+SESSION_RECORD_COLUMNS = _record_columns(SessionRecord, ChatSession.__table__)
+
+# Exportación por usuario: un registro JSON por línea, encabezado primero
+USER_EXPORT_FORMAT = 'pmp-user-export'
+USER_EXPORT_VERSION = 1
+USER_EXPORT_CHUNK_SIZE = 1000  # Filas por lectura y por inserción masiva
+
+def _to_record(record_type: str, row, table: Table, exclude: tuple = ()) -> dict:
+    """Convierte una fila en un registro JSON serializable"""
+    record = {'type': record_type}
+    for column in table.columns:
+        if column.name in exclude:
+            continue
+        value = row._mapping[column.name]
+        record[column.name] = value.isoformat() if isinstance(value, datetime) else value
+    return record
+
+def _from_record(record: dict, table: Table, exclude: tuple = ()) -> dict:
+    """Convierte un registro exportado en los valores de una fila de `table`"""
+    values = {}
+    for column in table.columns:
+        if column.name in exclude or column.name not in record:
+            continue
+        value = record[column.name]
+        if value is not None and isinstance(column.type, (DateTime, EpochMillis)):
+            value = datetime.fromisoformat(value)
+        values[column.name] = value
+    return values
+
+class ArchiveReport(NamedTuple):
+    """Sesiones, mensajes y bytes de contenido (tal como se guardan) afectados por un archivado o purga"""
+    sessions: int = 0
+    messages: int = 0
+    content_bytes: int = 0
+    
+    def __add__(self, other):
+        return ArchiveReport(*(a + b for a, b in zip(self, other)))
+
+class RetentionPolicy(NamedTuple):
+    """
+    Política de retención del historial.
+    
+    archive_after_days: días sin uso tras los cuales una sesión pasa al archivo
+    purge_after_days: días sin uso tras los cuales se elimina del archivo
+        (None conserva el archivo indefinidamente)
+    """
+    archive_after_days: int = 180
+    purge_after_days: int = None
+
+class RetentionReport(NamedTuple):
+    """Resultado (o, en modo de prueba, previsión) de aplicar una RetentionPolicy"""
+    archived: ArchiveReport
+    purged: ArchiveReport
+    dry_run: bool
+
+def database_path_for(url) -> str:
+    """Ruta del archivo de una base SQLite en disco, o None (memoria, URI u otro motor)"""
+    url = make_url(url)
+    database = url.database if url.get_backend_name() == 'sqlite' else None
+    if not database or database == ':memory:' or database.startswith('file:'):
+        return None
+    return database
+
+def archive_path_for(engine) -> str:
+    """Ruta del archivo histórico de una base SQLite en disco, o None"""
+    database = database_path_for(engine.url)
+    if database is None:
+        return None
+    root, ext = os.path.splitext(database)
+    return f"{root}_archive{ext or '.db'}"
+
+# Perfiles de conexión SQLite aplicados con PRAGMA al abrir cada conexión.
+# WAL permite que las lecturas de la UI no se bloqueen con las escrituras del
+# hilo de envío; busy_timeout espera el lock en lugar de fallar con
+# "database is locked". foreign_keys activa los ON DELETE CASCADE y
+# auto_vacuum=INCREMENTAL (efectivo solo al crear la base o tras el VACUUM de
+# compact_database) permite devolver el espacio de los borrados sin otro VACUUM.
+SQLITE_PROFILES = {
+    # Cada commit se sincroniza a disco (fsync) también en modo WAL
+    'durable': {
+        'auto_vacuum': 'INCREMENTAL',
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'busy_timeout': 5000,
+        'cache_size': -16000,  # KiB (negativo) = 16 MB
+        'mmap_size': 0,
+        'temp_store': 'MEMORY',
+        'foreign_keys': 'ON',
+    },
+    # Sincroniza solo en los checkpoints de WAL: un corte de energía puede perder
+    # los últimos commits pero nunca corrompe la base de datos
+    'fast': {
+        'auto_vacuum': 'INCREMENTAL',
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -64000,  # 64 MB
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'foreign_keys': 'ON',
+    },
+}
+
+DEFAULT_SQLITE_PROFILE = 'fast'
+
+# Las bases SQLite en disco usan dos engines. Las escrituras pasan por una
+# única conexión (SQLite admite un solo escritor a la vez: con más conexiones
+# solo se reparten el lock), y las lecturas largas (analíticas, búsqueda,
+# historial, exportación) por un pool de conexiones de solo lectura (URI
+# mode=ro y query_only) que en WAL leen una instantánea sin bloquear al
+# escritor ni ser bloqueadas por él.
+WRITE_POOL_SIZE = 1
+READ_POOL_SIZE = 4
+READ_POOL_OVERFLOW = 4
+# PRAGMA del perfil que aplican también a las conexiones de lectura (el resto escribe en la base)
+READ_PRAGMAS = ('busy_timeout', 'cache_size', 'mmap_size', 'temp_store')
+
+def _apply_sqlite_profile(engine, profile: str, read_only: bool = False):
+    """Registra un hook de conexión que aplica los PRAGMA del perfil indicado"""
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Perfil de conexión desconocido: {profile}")
+    pragmas = SQLITE_PROFILES[profile]
+    if read_only:
+        pragmas = {name: value for name, value in pragmas.items() if name in READ_PRAGMAS}
+        pragmas['query_only'] = 'ON'
+    
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+def _register_sqlite_functions(engine):
+    """Registra en cada conexión las funciones SQL que usan el esquema y los triggers"""
+    @event.listens_for(engine, "connect")
+    def register_functions(dbapi_connection, connection_record):
+        dbapi_connection.create_function("pmp_decompress", 1, decompress_content, deterministic=True)
+
+class EngineEntry:
+    """
+    Engine, fábrica de sesiones y estado del esquema compartidos por todos los
+    DatabaseManager que apuntan a la misma URL dentro del proceso.
+    """
+    
+    def __init__(self, database_url: str, profile: str):
+        self.database_url = database_url
+        self.profile = profile
+        database_path = database_path_for(database_url)
+        if database_path is None:
+            # Base en memoria u otro motor: un único engine para todo
+            self.engine = self.read_engine = create_engine(database_url, echo=False)
+        else:
+            self.engine = create_engine(database_url, echo=False, pool_size=WRITE_POOL_SIZE, max_overflow=0)
+            read_url = f"sqlite:///file:{pathname2url(os.path.abspath(database_path))}?mode=ro&uri=true"
+            self.read_engine = create_engine(read_url, echo=False, pool_size=READ_POOL_SIZE,
+                                             max_overflow=READ_POOL_OVERFLOW)
+        if self.engine.dialect.name == 'sqlite':
+            _register_sqlite_functions(self.engine)
+            _apply_sqlite_profile(self.engine, profile)
+            if self.read_engine is not self.engine:
+                _register_sqlite_functions(self.read_engine)
+                _apply_sqlite_profile(self.read_engine, profile, read_only=True)
+        self.SessionLocal = sessionmaker(bind=self.engine)
+        self.schema_ready = False
+        self.lock = threading.Lock()
+        self.backfill_thread = None  # Migraciones en segundo plano (ver db/migrations.py)
+        self.closing = threading.Event()
+        self.message_writer = None  # Escritor en segundo plano, creado bajo demanda
+        self.space_reclaimer = None  # Recuperación de páginas libres, creada con el primer borrado
+        self.archive_path = archive_path_for(self.engine)
+        self.archive_lock = threading.Lock()  # Serializa los movimientos entre archivos
+        self.analytics_cache = AnalyticsCache()
+
+# Registro de engines por URL y perfil (uno por base de datos en todo el proceso)
+_engine_registry = {}
+_engine_registry_lock = threading.Lock()
+
+def get_engine_entry(database_url: str, profile: str = None) -> EngineEntry:
+    """Retorna la entrada compartida para la URL, creándola la primera vez"""
+    profile = profile or os.getenv("PMP_DB_PROFILE", DEFAULT_SQLITE_PROFILE)
+    key = (database_url, profile)
+    entry = _engine_registry.get(key)
+    if entry is None:
+        with _engine_registry_lock:
+            entry = _engine_registry.get(key)
+            if entry is None:
+                entry = _engine_registry[key] = EngineEntry(database_url, profile)
+    return entry
+
+def dispose_engines():
+    """
+    Cierra todas las conexiones compartidas y vacía el registro de engines (y los almacenes en memoria).
+    
+    Raises:
+        MessageWriteError: Si algún escritor no pudo guardar sus turnos; se
+            lanza después de cerrar todo
+    """
+    # Importación diferida: db.writer y db.memory dependen de este módulo
+    from .writer import MessageWriteError
+    from .memory import dispose_memory_stores
+    errors = []
+    with _engine_registry_lock:
+        for entry in _engine_registry.values():
+            entry.closing.set()
+            if entry.backfill_thread is not None:
+                # El backfill se detiene tras el lote en curso y se retoma en el próximo arranque
+                entry.backfill_thread.join()
+            if entry.message_writer is not None:
+                try:
+                    entry.message_writer.close()
+                except MessageWriteError as e:
+                    errors.append(e)
+            if entry.space_reclaimer is not None:
+                entry.space_reclaimer.close()
+            entry.read_engine.dispose()
+            entry.engine.dispose()
+        _engine_registry.clear()
+    try:
+        dispose_memory_stores()
+    except MessageWriteError as e:
+        errors.append(e)
+    if errors:
+        raise errors[0]
+
+class DatabaseManager(UserAnalyticsMixin):
     """
     Gestiona la conexión y operaciones con la base de datos.
+    
+    Las instancias son livianas: el engine, el pool de conexiones y la
+    verificación del esquema se comparten por URL a través del registro
+    de engines, por lo que crear un DatabaseManager por componente no
+    vuelve a pagar el arranque de SQLAlchemy.
+    
+    Args:
+        database_url (str): URL de SQLAlchemy de la base de datos
+        profile (str): Perfil de conexión SQLite ('durable' o 'fast'); por
+            defecto el de la variable de entorno PMP_DB_PROFILE o 'fast'
+        progress (callable): Callback opcional con el avance de las
+            migraciones pendientes (solo la primera instancia por base las aplica)
     """
     Base = Base
     
-    def __init__(self, database_url: str = "sqlite:///chat_history.db"):
-        self.engine = create_engine(database_url, echo=False)
-        Base.metadata.create_all(self.engine)
-        self.SessionLocal = sessionmaker(bind=self.engine)
+    SESSION_STATS_BACKFILL_KEY = 'session_stats_backfill'
+    SESSION_SUMMARY_BACKFILL_KEY = 'session_summary_backfill'
+    MESSAGE_COMPRESSION_BACKFILL_KEY = 'message_compression_backfill'
+    ANSWER_VERDICT_BACKFILL_KEY = 'answer_verdict_backfill'
+    DAILY_ACTIVITY_BACKFILL_KEY = 'daily_activity_backfill'
+    
+    def __init__(self, database_url: str = "sqlite:///chat_history.db", profile: str = None, progress=None):
+        self._engine_entry = get_engine_entry(database_url, profile)
+        self.engine = self._engine_entry.engine
+        self.read_engine = self._engine_entry.read_engine
+        self.SessionLocal = self._engine_entry.SessionLocal
+        self.archive_path = self._engine_entry.archive_path
+        self._ensure_schema(progress)
+    
+    def _ensure_schema(self, progress=None):
+        """Aplica las migraciones pendientes una sola vez por proceso"""
+        entry = self._engine_entry
+        if entry.schema_ready:
+            return
+        with entry.lock:
+            if not entry.schema_ready:
+                # Importación diferida: db.migrations depende de los modelos de este módulo
+                from .migrations import run_migrations
+                run_migrations(self, progress=progress)
+                entry.schema_ready = True
+    
+    def schema_version(self) -> int:
+        """Última migración aplicada a la base de datos"""
+        from .migrations import current_version
+        with self.engine.connect() as conn:
+            return current_version(conn)
+    
+    def wait_for_migrations(self, timeout: float = None) -> bool:
+        """
+        Espera a que terminen los backfills que las migraciones dejaron en segundo plano.
+        
+        Returns:
+            bool: True si no queda ninguno en curso
+        """
+        thread = self._engine_entry.backfill_thread
+        if thread is not None:
+            thread.join(timeout)
+        return thread is None or not thread.is_alive()
+    
+    def _ensure_search_index(self):
+        """
+        Crea el índice FTS5 en bases de datos anteriores a la búsqueda (o con
+        el índice de versiones anteriores, que leía el texto con funciones SQL
+        propias o guardaba una copia del texto) y lo llena.
+        """
+        if self.engine.dialect.name != 'sqlite':
+            return
+        with self.engine.begin() as conn:
+            definition = conn.execute(
+                text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": SEARCH_INDEX_TABLE}
+            ).scalar()
+            queues = conn.execute(
+                text("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN (:pending, :deleted)"),
+                {"pending": SEARCH_PENDING_TABLE, "deleted": SEARCH_DELETED_TABLE}
+            ).scalar()
+            if definition and "content=''" in definition and queues == 2:
+                return
+            for trigger in SEARCH_INDEX_TRIGGERS:
+                conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+            conn.exec_driver_sql(f"DROP VIEW IF EXISTS {SEARCH_CONTENT_VIEW}")
+            conn.exec_driver_sql(f"DROP TABLE IF EXISTS {SEARCH_INDEX_TABLE}")
+            for statement in SEARCH_INDEX_DDL:
+                conn.exec_driver_sql(statement)
+            conn.exec_driver_sql(f"DELETE FROM {SEARCH_DELETED_TABLE}")
+            conn.exec_driver_sql(f"INSERT OR IGNORE INTO {SEARCH_PENDING_TABLE}(message_id) SELECT id FROM chat_messages")
+            self._index_queued_messages(conn)
+    
+    def _index_messages(self, conn, messages):
+        """
+        Indexa para la búsqueda mensajes (id, texto) dentro de la transacción
+        de `conn` (una conexión o una sesión) y los quita de la cola. Antes
+        quita del índice el texto anterior de esos IDs (mensajes editados o
+        IDs que SQLite reutilizó tras un borrado).
+        """
+        params = [{'id': message_id, 'content': content} for message_id, content in messages]
+        if not params or self.engine.dialect.name != 'sqlite':
+            return
+        self._apply_search_deletions(conn, [param['id'] for param in params])
+        conn.execute(text(f"INSERT INTO {SEARCH_INDEX_TABLE}(rowid, content) VALUES (:id, :content)"), params)
+        conn.execute(text(f"DELETE FROM {SEARCH_PENDING_TABLE} WHERE message_id = :id"), params)
+    
+    def _apply_search_deletions(self, conn, message_ids: list = None, limit: int = -1) -> int:
+        """
+        Quita del índice el texto de los mensajes borrados o editados que
+        anotaron los triggers: los de `message_ids`, o hasta `limit` de todos
+        (todos con -1). El índice no guarda el texto, así que el comando
+        'delete' de FTS5 recibe el contenido descomprimido.
+        
+        Returns:
+            int: Mensajes quitados del índice
+        """
+        if message_ids is None:
+            statement = text(
+                f"DELETE FROM {SEARCH_DELETED_TABLE} WHERE message_id IN "
+                f"(SELECT message_id FROM {SEARCH_DELETED_TABLE} ORDER BY message_id LIMIT :limit) "
+                f"RETURNING message_id, content"
+            )
+            params = {'limit': limit}
+        elif message_ids:
+            statement = text(
+                f"DELETE FROM {SEARCH_DELETED_TABLE} WHERE message_id IN :ids RETURNING message_id, content"
+            ).bindparams(bindparam('ids', expanding=True))
+            params = {'ids': message_ids}
+        else:
+            return 0
+        rows = conn.execute(statement.columns(message_id=Integer, content=CompressedText), params).all()
+        if rows:
+            conn.execute(
+                text(f"INSERT INTO {SEARCH_INDEX_TABLE}({SEARCH_INDEX_TABLE}, rowid, content) VALUES ('delete', :id, :content)"),
+                [{'id': row.message_id, 'content': row.content} for row in rows]
+            )
+        return len(rows)
+    
+    def _index_queued_messages(self, conn, limit: int = -1, batch_size: int = 500) -> int:
+        """
+        Indexa hasta `limit` mensajes de la cola (todos con -1), leyendo su
+        texto a través de CompressedText, dentro de la transacción de `conn`.
+        
+        Returns:
+            int: Mensajes tomados de la cola
+        """
+        # Tomar el lote escribiendo primero: dos hilos que vacían la cola no se pisan
+        message_ids = conn.execute(
+            text(f"DELETE FROM {SEARCH_PENDING_TABLE} WHERE message_id IN "
+                 f"(SELECT message_id FROM {SEARCH_PENDING_TABLE} ORDER BY message_id LIMIT :limit) "
+                 f"RETURNING message_id"),
+            {'limit': limit}
+        ).scalars().all()
+        messages = ChatMessage.__table__
+        for start in range(0, len(message_ids), batch_size):
+            self._index_messages(conn, conn.execute(
+                select(messages.c.id, messages.c.content).where(messages.c.id.in_(message_ids[start:start + batch_size]))
+            ).all())
+        return len(message_ids)
+    
+    def index_pending_messages(self, batch_size: int = 500, progress=None) -> int:
+        """
+        Indexa en lotes los mensajes que otras conexiones dejaron en la cola de
+        búsqueda y quita del índice los borrados. Corre en el hilo de
+        mantenimiento del arranque (ver start_background_backfills); cada lote
+        es una transacción propia.
+        
+        Args:
+            batch_size (int): Mensajes por transacción
+            progress (callable): Callback opcional que recibe el total procesado
+        
+        Returns:
+            int: Número de mensajes indexados o quitados del índice
+        """
+        if self.engine.dialect.name != 'sqlite':
+            return 0
+        total = 0
+        while True:
+            with self.engine.begin() as conn:
+                indexed = (self._apply_search_deletions(conn, limit=batch_size)
+                           + self._index_queued_messages(conn, limit=batch_size))
+            if not indexed:
+                return total
+            total += indexed
+            if progress:
+                progress(total)
+    
+    def has_pending_search_index(self) -> bool:
+        """Indica si quedan mensajes por indexar o por quitar del índice de búsqueda"""
+        if self.engine.dialect.name != 'sqlite':
+            return False
+        with self.engine.connect() as conn:
+            return bool(conn.exec_driver_sql(
+                f"SELECT EXISTS (SELECT 1 FROM {SEARCH_PENDING_TABLE}) OR EXISTS (SELECT 1 FROM {SEARCH_DELETED_TABLE})"
+            ).scalar())
     
     def get_session(self):
         """Retorna una nueva sesión de base de datos"""
@@ -130,482 +891,1269 @@ class DatabaseManager:
             db.add(user)
             db.commit()
             db.refresh(user)
-            return user
+        # SQLite puede reutilizar el ID de un usuario eliminado
+        self.invalidate_analytics(user.id)
+        return user
     
-    def authenticate_user(self, username: str, password: str) -> User:
+    def authenticate_user(self, username: str, password: str) -> UserRecord:
         """Autentica un usuario"""
-        with self.get_session() as db:
-            user = db.query(User).filter(User.username == username).first()
-            if user and user.check_password(password) and user.is_active:
-                return user
+        users = User.__table__
+        with self.read_engine.connect() as conn:
+            row = conn.execute(
+                select(users.c.password_hash, users.c.salt, *USER_RECORD_COLUMNS).where(users.c.username == username)
+            ).first()
+        if row is None:
             return None
+        user = UserRecord._make(row[2:])
+        if user.is_active and row.password_hash == User._hash_password(password, row.salt):
+            return user
+        return None
     
-    def get_user_by_id(self, user_id: int) -> User:
+    def get_user_by_id(self, user_id: int) -> UserRecord:
         """Obtiene un usuario por ID"""
+        with self.read_engine.connect() as conn:
+            row = conn.execute(select(*USER_RECORD_COLUMNS).where(User.__table__.c.id == user_id)).first()
+        return UserRecord._make(row) if row is not None else None
+    
+    def update_user_profile(self, user_id: int, **fields) -> UserRecord:
+        """
+        Actualiza los datos de cuenta y perfil indicados (ver PROFILE_FIELDS).
+        
+        Returns:
+            UserRecord: Usuario actualizado, o None si no existe
+        """
+        unknown = set(fields) - set(PROFILE_FIELDS)
+        if unknown:
+            raise ValueError(f"Campos de perfil desconocidos: {', '.join(sorted(unknown))}")
         with self.get_session() as db:
-            return db.query(User).filter(User.id == user_id).first()
+            for field, message in (('username', "El nombre de usuario ya existe"), ('email', "El email ya está registrado")):
+                if field in fields and db.execute(
+                    select(User.id).where(getattr(User, field) == fields[field], User.id != user_id)
+                ).first():
+                    raise ValueError(message)
+            if fields:
+                db.execute(update(User).where(User.id == user_id).values(**fields))
+                db.commit()
+        # El perfil forma parte de las analíticas en caché
+        self.invalidate_analytics(user_id)
+        return self.get_user_by_id(user_id)
     
-    def create_chat_session(self, user_id: int, name: str = "Nueva Conversación", mode: str = "charlemos") -> ChatSession:
+    def create_chat_session(self, user_id: int, name: str = "Nueva Conversación", mode: str = "charlemos") -> SessionRecord:
         """Crea una nueva sesión de chat para un usuario"""
         with self.get_session() as db:
-            session = ChatSession(user_id=user_id, name=name, mode=mode)
+            now = get_local_datetime()
+            session = ChatSession(user_id=user_id, name=name, mode=mode, created_at=now, last_used_at=now)
             db.add(session)
+            _add_daily_activity(db, {(user_id, local_day(to_epoch_ms(now)), mode): [1, 0, 0.0]})
             db.commit()
-            db.refresh(session)
-            return session
+            record = SessionRecord._make(getattr(session, field) for field in SessionRecord._fields)
+        self.invalidate_analytics(user_id)
+        return record
     
-    def get_latest_chat_session(self, user_id: int) -> ChatSession:
-        """Obtiene la sesión de chat más reciente de un usuario"""
+    def get_chat_session(self, session_id: int) -> SessionRecord:
+        """Obtiene una sesión de chat por ID"""
+        with self.read_engine.connect() as conn:
+            row = conn.execute(select(*SESSION_RECORD_COLUMNS).where(ChatSession.id == session_id)).first()
+        return SessionRecord._make(row) if row is not None else None
+    
+    def rename_chat_session(self, session_id: int, name: str) -> bool:
+        """Cambia el nombre de una sesión; retorna False si no existe"""
         with self.get_session() as db:
-            session = db.query(ChatSession).filter(
-                ChatSession.user_id == user_id
-            ).order_by(ChatSession.created_at.desc()).first()
+            session = db.get(ChatSession, session_id)
             if not session:
-                session = self.create_chat_session(user_id)
-            return session
+                return False
+            session.name = name
+            user_id = session.user_id
+            db.commit()
+        self.invalidate_analytics(user_id)
+        return True
     
-    def get_user_sessions(self, user_id: int, mode: str = None) -> list:
-        """Obtiene todas las sesiones de un usuario, opcionalmente filtradas por modo"""
-        with self.get_session() as db:
-            query = db.query(ChatSession).filter(ChatSession.user_id == user_id)
-            
-            if mode:
-                query = query.filter(ChatSession.mode == mode)
+    def delete_chat_session(self, session_id: int):
+        """Elimina una sesión con sus mensajes y estadísticas"""
+        self.delete_sessions([session_id])
+    
+    def delete_sessions(self, session_ids: list, batch_size: int = 500) -> int:
+        """
+        Elimina varias sesiones en una transacción. Los mensajes y estadísticas
+        se borran en la base por ON DELETE CASCADE, sin cargarlos en Python, y
+        las páginas liberadas se devuelven en segundo plano.
+        
+        Args:
+            session_ids (list): IDs de las sesiones a eliminar
+            batch_size (int): IDs por sentencia (límite de parámetros de SQLite)
             
-            sessions = query.order_by(ChatSession.last_used_at.desc()).all()
-            return sessions
+        Returns:
+            int: Número de sesiones eliminadas
+        """
+        session_ids = list(session_ids)
+        if not session_ids:
+            return 0
+        # Los turnos pendientes de las sesiones se escriben antes de borrarlas
+        self._wait_for_pending_writes()
+        owners = []
+        with self.get_session() as db:
+            for start in range(0, len(session_ids), batch_size):
+                chunk = session_ids[start:start + batch_size]
+                owners += db.execute(
+                    delete(ChatSession).where(ChatSession.id.in_(chunk)).returning(ChatSession.user_id)
+                ).scalars().all()
+            # Los triggers anotaron el texto de los mensajes borrados: sale del índice en la misma transacción
+            self._apply_search_deletions(db)
+            db.commit()
+        if owners:
+            self._engine_entry.analytics_cache.bump(*set(owners))
+            self.reclaim_space()
+        return len(owners)
+    
+    def reclaim_space(self, wait: bool = False):
+        """
+        Pide al recuperador en segundo plano que devuelva al sistema las
+        páginas libres de la base (auto_vacuum=INCREMENTAL).
+        
+        Args:
+            wait (bool): Bloquear hasta que termine la pasada
+        """
+        if self.engine.dialect.name != 'sqlite':
+            return
+        entry = self._engine_entry
+        if entry.space_reclaimer is None:
+            with entry.lock:
+                if entry.space_reclaimer is None:
+                    from .reclaim import SpaceReclaimer
+                    entry.space_reclaimer = SpaceReclaimer(self.engine)
+                    atexit.register(entry.space_reclaimer.close)
+        entry.space_reclaimer.request()
+        if wait:
+            entry.space_reclaimer.wait()
+    
+    def compact_database(self) -> bool:
+        """
+        Pasa una base creada antes de auto_vacuum=INCREMENTAL a ese modo con un
+        VACUUM completo, que reescribe el archivo y bloquea la base mientras
+        dura. Es mantenimiento explícito (python migrate_db.py --compact): las
+        migraciones del arranque no lo hacen. Sin este paso, reclaim_space no
+        devuelve espacio en esas bases.
+        
+        Returns:
+            bool: True si se convirtió la base; False si ya estaba en ese modo
+        """
+        if self.engine.dialect.name != 'sqlite':
+            return False
+        self._wait_for_pending_writes()
+        connection = self.engine.raw_connection()
+        try:
+            if connection.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:  # INCREMENTAL
+                return False
+            connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            connection.execute("VACUUM")
+            return True
+        finally:
+            connection.close()
+    
+    def get_latest_chat_session(self, user_id: int) -> SessionRecord:
+        """Obtiene la sesión de chat más reciente de un usuario"""
+        with self.read_engine.connect() as conn:
+            row = conn.execute(
+                select(*SESSION_RECORD_COLUMNS)
+                .where(ChatSession.user_id == user_id)
+                .order_by(ChatSession.created_at.desc())
+                .limit(1)
+            ).first()
+        if row is None:
+            return self.create_chat_session(user_id)
+        return SessionRecord._make(row)
     
-    def add_message(self, session_id: int, role: str, content: str):
+    def get_user_sessions(self, user_id: int, mode: str = None) -> list:
+        """Obtiene todas las sesiones de un usuario (SessionRecord), opcionalmente filtradas por modo"""
+        self._wait_for_pending_writes()
+        query = select(*SESSION_RECORD_COLUMNS).where(ChatSession.user_id == user_id)
+        if mode:
+            query = query.where(ChatSession.mode == mode)
+        with self.read_engine.connect() as conn:
+            rows = conn.execute(query.order_by(ChatSession.last_used_at.desc()))
+            return [SessionRecord._make(row) for row in rows]
+    
+    def add_message(self, session_id: int, role: str, content: str) -> MessageRecord:
         """Añade un nuevo mensaje a la sesión especificada"""
         with self.get_session() as db:
+            now = get_local_datetime()
             message = ChatMessage(
                 session_id=session_id,
                 role=role,
-                content=content
+                content=content,
+                timestamp=now
             )
             db.add(message)
-            
-            # Actualizar la fecha de último uso de la sesión
-            session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
-            if session:
-                session.last_used_at = get_local_datetime()
-            
+            db.flush()
+            self._index_messages(db, [(message.id, content)])
+            user_ids = self._record_session_activity(db, [
+                {'session_id': session_id, 'role': role, 'content': content, 'timestamp': now}
+            ])
             db.commit()
-            db.refresh(message)
-            return message
+            record = MessageRecord(message.id, role, content)
+        self._engine_entry.analytics_cache.bump(*user_ids)
+        return record
     
-    def get_session_messages(self, session_id: int) -> list:
-        """Obtiene todos los mensajes de una sesión específica"""
+    def add_turn(self, session_id: int, user_message: str, assistant_message: str, user_timestamp: datetime = None,
+                 verdicts: list = None):
+        """
+        Guarda un turno completo (mensaje del usuario y respuesta de la IA) en
+        una sola transacción: ambos mensajes, last_used_at, session_stats y
+        las preguntas respondidas.
+        
+        Args:
+            session_id (int): ID de la sesión
+            user_message (str): Mensaje del usuario
+            assistant_message (str): Respuesta de la IA
+            user_timestamp (datetime): Momento en que se envió la pregunta; por
+                defecto el mismo que la respuesta
+            verdicts (list): AttemptVerdict extraídos de la respuesta (ver db/attempts.py)
+        """
+        now = get_local_datetime()
+        self.add_turns([PendingTurn(session_id, user_message, assistant_message, user_timestamp or now, now,
+                                    tuple(verdicts or ()))])
+    
+    def add_turns(self, turns: list):
+        """Guarda varios turnos (PendingTurn) en una sola transacción"""
+        rows = []
+        attempts = []
+        for turn in turns:
+            rows.append({'session_id': turn.session_id, 'role': 'user',
+                         'content': turn.user_message, 'timestamp': turn.user_timestamp})
+            rows.append({'session_id': turn.session_id, 'role': 'assistant',
+                         'content': turn.assistant_message, 'timestamp': turn.assistant_timestamp})
+            attempts += [dict(verdict._asdict(), session_id=turn.session_id, answered_at=turn.assistant_timestamp)
+                         for verdict in turn.verdicts]
+        if not rows:
+            return
+        
         with self.get_session() as db:
-            messages = db.query(ChatMessage).filter(
-                ChatMessage.session_id == session_id
-            ).order_by(ChatMessage.timestamp.asc()).all()
-            return [(msg.role, msg.content) for msg in messages]
+            message_ids = db.execute(
+                insert(ChatMessage).returning(ChatMessage.id, sort_by_parameter_order=True), rows
+            ).scalars().all()
+            self._index_messages(db, zip(message_ids, (row['content'] for row in rows)))
+            if attempts:
+                db.execute(insert(QuestionAttempt), attempts)
+            user_ids = self._record_session_activity(db, rows)
+            db.commit()
+        self._engine_entry.analytics_cache.bump(*user_ids)
     
-    # Métodos específicos para análisis de datos
-    def get_user_analytics_data(self, user_id: int) -> dict:
+    def _record_session_activity(self, db, rows: list) -> set:
         """
-        Obtiene datos comprehensivos para análisis del usuario.
-        Incluye estadísticas de todas las sesiones de EVALUEMOS y SIMULEMOS.
+        Actualiza last_used_at, session_stats y daily_activity para mensajes recién añadidos (sin commit).
+        Retorna los IDs de los usuarios dueños de las sesiones, para invalidar sus analíticas.
         """
-        with self.get_session() as db:
-            # Obtener información básica del usuario
-            user = db.query(User).filter(User.id == user_id).first()
-            if not user:
-                return {}
+        owners = {
+            row.id: row for row in db.execute(
+                select(ChatSession.id, ChatSession.user_id, ChatSession.mode)
+                .where(ChatSession.id.in_({row['session_id'] for row in rows}))
+            )
+        }
+        stats_by_session = {}
+        last_rows = {}
+        counts = {}
+        activity = {}
+        for row in rows:
+            session_id = row['session_id']
+            stats = stats_by_session.get(session_id)
+            if stats is None:
+                stats = db.get(SessionStats, session_id)
+                if stats is None:
+                    stats = SessionStats(session_id=session_id)
+                    db.add(stats)
+                stats_by_session[session_id] = stats
+            active_seconds = stats.active_seconds or 0.0
+            stats.apply_message(row['role'], row['content'], row['timestamp'])
+            last_rows[session_id] = row  # Las filas llegan en orden cronológico
+            counts[session_id] = counts.get(session_id, 0) + 1
             
-            # Obtener todas las sesiones del usuario
-            all_sessions = db.query(ChatSession).filter(
-                ChatSession.user_id == user_id
-            ).order_by(ChatSession.created_at.asc()).all()
+            # La pausa desde el mensaje anterior cuenta en el día del mensaje nuevo
+            owner = owners.get(session_id)
+            if owner is not None:
+                day = local_day(to_epoch_ms(row['timestamp']))
+                totals = activity.setdefault((owner.user_id, day, owner.mode), [0, 0, 0.0])
+                totals[1] += 1
+                totals[2] += (stats.active_seconds or 0.0) - active_seconds
+        
+        for session_id, row in last_rows.items():
+            db.execute(
+                update(ChatSession)
+                .where(ChatSession.id == session_id)
+                .values(
+                    last_used_at=row['timestamp'],
+                    last_message_preview=row['content'][:SESSION_PREVIEW_LENGTH],
+                    last_role=row['role'],
+                    message_count=ChatSession.message_count + counts[session_id]
+                )
+            )
+        _add_daily_activity(db, activity)
+        return {owner.user_id for owner in owners.values()}
+    
+    # Escritura en segundo plano
+    def get_message_writer(self):
+        """
+        Retorna el escritor en segundo plano compartido por la base de datos,
+        creándolo la primera vez. Se vacía al cerrar el proceso.
+        """
+        entry = self._engine_entry
+        if entry.message_writer is None:
+            with entry.lock:
+                if entry.message_writer is None:
+                    from .writer import MessageWriter
+                    entry.message_writer = MessageWriter(self)
+                    atexit.register(entry.message_writer.close)
+        return entry.message_writer
+    
+    def flush_pending_writes(self):
+        """
+        Espera a que el escritor en segundo plano guarde los turnos pendientes.
+        
+        Raises:
+            MessageWriteError: Si hubo turnos que no se pudieron guardar y aún no se informaron
+        """
+        writer = self._engine_entry.message_writer
+        if writer is not None:
+            writer.flush()
+    
+    def _wait_for_pending_writes(self):
+        """
+        Espera al escritor antes de una lectura o un mantenimiento, sin
+        informar sus fallos: ese aviso es de flush_pending_writes y dispose_engines.
+        """
+        writer = self._engine_entry.message_writer
+        if writer is not None:
+            writer.wait()
+    
+    def get_session_messages(self, session_id: int) -> list:
+        """Obtiene todos los mensajes de una sesión específica"""
+        self._wait_for_pending_writes()
+        with self.read_engine.connect() as conn:
+            rows = conn.execute(
+                select(ChatMessage.role, ChatMessage.content)
+                .where(ChatMessage.session_id == session_id)
+                .order_by(ChatMessage.timestamp.asc(), ChatMessage.id.asc())
+            )
+            return [tuple(row) for row in rows]
+    
+    def get_session_messages_page(self, session_id: int, before_id: int = None, limit: int = 50) -> list:
+        """
+        Obtiene una página de mensajes de la sesión usando paginación por clave
+        sobre (session_id, id): los `limit` mensajes anteriores a `before_id`, o
+        los más recientes si no se indica. El costo no depende de la longitud
+        de la conversación.
+        
+        Returns:
+            list: MessageRecord (id, role, content) en orden cronológico; el ID
+                del primer elemento es el `before_id` de la página anterior
+        """
+        self._wait_for_pending_writes()
+        query = select(ChatMessage.id, ChatMessage.role, ChatMessage.content).where(
+            ChatMessage.session_id == session_id
+        )
+        if before_id is not None:
+            query = query.where(ChatMessage.id < before_id)
+        with self.read_engine.connect() as conn:
+            rows = conn.execute(query.order_by(ChatMessage.id.desc()).limit(limit)).all()
+        return [MessageRecord._make(row) for row in reversed(rows)]
+    
+    # Búsqueda de texto completo
+    def search_messages(self, user_id: int, query: str, mode: str = None, limit: int = 20, offset: int = 0) -> list:
+        """
+        Busca en los mensajes del usuario con el índice FTS5, ordenando por
+        relevancia (bm25).
+        
+        Args:
+            user_id (int): ID del usuario
+            query (str): Texto a buscar; las palabras se combinan con AND y la
+                última se busca como prefijo
+            mode (str): Filtrar por modo de la sesión
+            limit (int): Máximo de resultados
+            offset (int): Resultados a saltar (paginación)
             
-            # Separar sesiones por modo
-            evaluemos_sessions = [s for s in all_sessions if s.mode == "evaluemos"]
-            simulemos_sessions = [s for s in all_sessions if s.mode == "simulemos"]
-            estudiemos_sessions = [s for s in all_sessions if s.mode == "estudiemos"]
-            charlemos_sessions = [s for s in all_sessions if s.mode == "charlemos"]
+        Returns:
+            list: SearchResult con un fragmento del mensaje y los términos
+                encontrados entre corchetes (armado en Python: el índice no
+                guarda el texto)
+        """
+        match = build_search_query(query)
+        if not match:
+            return []
+        
+        self._wait_for_pending_writes()
+        mode_filter = "AND s.mode = :mode" if mode else ""
+        statement = text(f"""
+            SELECT m.id, m.session_id, s.name, s.mode, m.role, m.timestamp, m.content,
+                   bm25({SEARCH_INDEX_TABLE}) AS rank
+            FROM {SEARCH_INDEX_TABLE}
+            JOIN chat_messages m ON m.id = {SEARCH_INDEX_TABLE}.rowid
+            JOIN chat_sessions s ON s.id = m.session_id
+            WHERE {SEARCH_INDEX_TABLE} MATCH :match AND s.user_id = :user_id {mode_filter}
+            ORDER BY rank
+            LIMIT :limit OFFSET :offset
+        """).columns(timestamp=EpochMillis, content=CompressedText)
+        
+        with self.read_engine.connect() as conn:
+            rows = conn.execute(statement, {
+                "match": match, "user_id": user_id, "mode": mode, "limit": limit, "offset": offset
+            }).all()
+        terms = search_terms(query)
+        return [SearchResult(*row[:6], highlight(row.content, terms), row.rank) for row in rows]
+    
+    def rebuild_search_index(self):
+        """
+        Reconstruye el índice de búsqueda desde chat_messages y lo compacta.
+        Es la vía para cargas masivas (sin esperar al hilo de mantenimiento
+        del próximo arranque) o si el índice se dañó.
+        """
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(f"INSERT INTO {SEARCH_INDEX_TABLE}({SEARCH_INDEX_TABLE}) VALUES ('delete-all')")
+            conn.exec_driver_sql(f"DELETE FROM {SEARCH_DELETED_TABLE}")
+            conn.exec_driver_sql(f"INSERT OR IGNORE INTO {SEARCH_PENDING_TABLE}(message_id) SELECT id FROM chat_messages")
+            self._index_queued_messages(conn)
+            conn.exec_driver_sql(f"INSERT INTO {SEARCH_INDEX_TABLE}({SEARCH_INDEX_TABLE}) VALUES ('optimize')")
+    
+    # Mantenimiento de estadísticas por sesión
+    @contextmanager
+    def _archive_connection(self, create: bool = False, read_only: bool = False):
+        """
+        Conexión con el archivo histórico adjunto como esquema 'archive'.
+        Entrega None si la base no tiene archivo (y no se pide crearlo).
+        Con read_only, una conexión del engine de lectura.
+        """
+        if not self.archive_path or (not create and not os.path.exists(self.archive_path)):
+            yield None
+            return
+        with (self.read_engine if read_only else self.engine).connect() as conn:
+            conn.exec_driver_sql(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (self.archive_path,))
+            try:
+                if create:
+                    conn.exec_driver_sql(f"PRAGMA {ARCHIVE_SCHEMA}.journal_mode=WAL")
+                    archive_metadata.create_all(conn)
+                    conn.commit()
+                yield conn
+            finally:
+                conn.rollback()
+                conn.exec_driver_sql(f"DETACH DATABASE {ARCHIVE_SCHEMA}")
+    
+    def _move_sessions(self, conn, source: str, target: str, session_ids: list) -> dict:
+        """
+        Mueve sesiones con sus mensajes, estadísticas y preguntas respondidas del esquema `source` al
+        `target` (dentro de la transacción de `conn`), con IDs nuevos en el destino.
+        
+        Returns:
+            dict: ID de origen -> ID de destino
+        """
+        base = conn.exec_driver_sql(f"SELECT COALESCE(MAX(id), 0) FROM {target}.chat_sessions").scalar()
+        id_map = {old_id: base + n for n, old_id in enumerate(sorted(session_ids), 1)}
+        
+        conn.exec_driver_sql(
+            "CREATE TEMP TABLE IF NOT EXISTS session_id_map (old_id INTEGER PRIMARY KEY, new_id INTEGER NOT NULL)"
+        )
+        conn.exec_driver_sql("DELETE FROM temp.session_id_map")
+        conn.exec_driver_sql("INSERT INTO temp.session_id_map VALUES (?, ?)", list(id_map.items()))
+        
+        for table, key in ((ChatSession.__table__, 'id'), (ChatMessage.__table__, 'session_id'),
+                           (SessionStats.__table__, 'session_id'), (QuestionAttempt.__table__, 'session_id')):
+            columns = [c.name for c in table.columns if c.name not in ('id', key)]
+            target_columns = ', '.join([key] + columns)
+            source_columns = ', '.join(['m.new_id'] + [f"t.{name}" for name in columns])
+            conn.exec_driver_sql(
+                f"INSERT INTO {target}.{table.name} ({target_columns}) SELECT {source_columns} "
+                f"FROM {source}.{table.name} t JOIN temp.session_id_map m ON m.old_id = t.{key} ORDER BY t.rowid"
+            )
+        # Primero los dependientes
+        for table, key in HISTORY_DELETE_ORDER:
+            conn.exec_driver_sql(f"DELETE FROM {source}.{table} WHERE {key} IN (SELECT old_id FROM temp.session_id_map)")
+        if source == 'main':
+            # Los mensajes que salen de la base activa salen del índice de búsqueda
+            self._apply_search_deletions(conn)
+        return id_map
+    
+    def _report_sessions(self, conn, schema: str, session_filter: str, params: dict) -> ArchiveReport:
+        """Cuenta sesiones, mensajes y bytes de contenido de las sesiones que cumplen el filtro"""
+        row = conn.exec_driver_sql(
+            f"""SELECT COUNT(DISTINCT s.id), COUNT(m.id), COALESCE(SUM(LENGTH(CAST(m.content AS BLOB))), 0)
+                FROM {schema}.chat_sessions s LEFT JOIN {schema}.chat_messages m ON m.session_id = s.id
+                WHERE {session_filter}""",
+            params
+        ).one()
+        return ArchiveReport(*row)
+    
+    def apply_retention_policy(self, policy: RetentionPolicy = None, dry_run: bool = False,
+                               batch_size: int = 200, progress=None) -> RetentionReport:
+        """
+        Mueve al archivo histórico las sesiones sin uso en los últimos
+        `archive_after_days` días y elimina del archivo las que superan
+        `purge_after_days`. Cada lote de sesiones se mueve en una transacción
+        propia, así que una pasada interrumpida se retoma en la siguiente.
+        
+        Args:
+            policy (RetentionPolicy): Política a aplicar; por defecto RetentionPolicy()
+            dry_run (bool): Solo informa qué se archivaría y purgaría, sin modificar nada
+            batch_size (int): Sesiones por transacción
+            progress (callable): Callback opcional que recibe el total de sesiones archivadas
             
-            # Calcular estadísticas básicas
-            total_sessions = len(all_sessions)
-            total_messages = db.query(ChatMessage).join(ChatSession).filter(
-                ChatSession.user_id == user_id
-            ).count()
+        Returns:
+            RetentionReport: Sesiones, mensajes y bytes archivados y purgados
+        """
+        policy = policy or RetentionPolicy()
+        if not self.archive_path:
+            raise ValueError("El archivo histórico requiere una base SQLite en disco")
+        
+        self._wait_for_pending_writes()
+        now = get_local_datetime()
+        last_used = "COALESCE(s.last_used_at, s.created_at) < :cutoff"
+        # Las fechas se guardan como milisegundos UTC: el corte es un entero
+        archive_params = {'cutoff': to_epoch_ms(now - timedelta(days=policy.archive_after_days))}
+        purge_params = None
+        if policy.purge_after_days is not None:
+            purge_params = {'cutoff': to_epoch_ms(now - timedelta(days=policy.purge_after_days))}
+        
+        if dry_run:
+            with self.engine.connect() as conn:
+                archived = self._report_sessions(conn, 'main', last_used, archive_params)
+            purged = ArchiveReport()
+            if purge_params is not None:
+                with self._archive_connection() as conn:
+                    if conn is not None:
+                        purged = self._report_sessions(conn, ARCHIVE_SCHEMA, last_used, purge_params)
+                # Sesiones que pasarían al archivo y ya superan el plazo de purga
+                with self.engine.connect() as conn:
+                    purged += self._report_sessions(conn, 'main', last_used, purge_params)
+            return RetentionReport(archived, purged, dry_run=True)
+        
+        archived = ArchiveReport()
+        purged = ArchiveReport()
+        with self._engine_entry.archive_lock, self._archive_connection(create=True) as conn:
+            while True:
+                session_ids = conn.exec_driver_sql(
+                    f"SELECT s.id FROM main.chat_sessions s WHERE {last_used} ORDER BY s.id LIMIT :limit",
+                    dict(archive_params, limit=batch_size)
+                ).scalars().all()
+                if not session_ids:
+                    break
+                ids_filter = f"s.id IN ({', '.join(str(i) for i in session_ids)})"
+                archived += self._report_sessions(conn, 'main', ids_filter, {})
+                self._move_sessions(conn, 'main', ARCHIVE_SCHEMA, session_ids)
+                conn.commit()
+                if progress:
+                    progress(archived.sessions)
             
-            # Calcular tiempo total de estudio (aproximado por número de mensajes y sesiones)
-            study_time_hours = self._estimate_study_time(all_sessions, db)
+            while purge_params is not None:
+                session_ids = conn.exec_driver_sql(
+                    f"SELECT s.id FROM {ARCHIVE_SCHEMA}.chat_sessions s WHERE {last_used} ORDER BY s.id LIMIT :limit",
+                    dict(purge_params, limit=batch_size)
+                ).scalars().all()
+                if not session_ids:
+                    break
+                ids = ', '.join(str(i) for i in session_ids)
+                purged += self._report_sessions(conn, ARCHIVE_SCHEMA, f"s.id IN ({ids})", {})
+                for table, key in HISTORY_DELETE_ORDER:
+                    conn.exec_driver_sql(f"DELETE FROM {ARCHIVE_SCHEMA}.{table} WHERE {key} IN ({ids})")
+                conn.commit()
+        if archived.sessions or purged.sessions:
+            self.invalidate_analytics()
+        if archived.sessions:
+            self.reclaim_space()
+        return RetentionReport(archived, purged, dry_run=False)
+    
+    def get_archived_sessions(self, user_id: int, mode: str = None) -> list:
+        """
+        Lista las sesiones del usuario (SessionRecord) guardadas en el archivo
+        histórico, de la más reciente a la más antigua. Los IDs son los del archivo: para abrir
+        una, usar restore_session.
+        """
+        sessions = ARCHIVE_TABLES.sessions
+        with self._archive_connection(read_only=True) as conn:
+            if conn is None:
+                return []
+            query = select(*_record_columns(SessionRecord, sessions)).where(sessions.c.user_id == user_id)
+            if mode:
+                query = query.where(sessions.c.mode == mode)
+            return [SessionRecord._make(row) for row in conn.execute(query.order_by(sessions.c.last_used_at.desc()))]
+    
+    def restore_session(self, archived_session_id: int) -> int:
+        """
+        Devuelve una sesión del archivo histórico a la base activa, con sus
+        mensajes, y la marca como usada ahora.
+        
+        Returns:
+            int: ID de la sesión en la base activa, o None si no está archivada
+        """
+        with self._engine_entry.archive_lock, self._archive_connection() as conn:
+            if conn is None:
+                return None
+            sessions = ARCHIVE_TABLES.sessions
+            if conn.execute(select(sessions.c.id).where(sessions.c.id == archived_session_id)).first() is None:
+                return None
+            session_id = self._move_sessions(conn, ARCHIVE_SCHEMA, 'main', [archived_session_id])[archived_session_id]
+            messages = ChatMessage.__table__
+            self._index_messages(conn, conn.execute(
+                select(messages.c.id, messages.c.content).where(messages.c.session_id == session_id)
+            ).all())
+            conn.execute(
+                update(ChatSession.__table__)
+                .where(ChatSession.__table__.c.id == session_id)
+                .values(last_used_at=get_local_datetime())
+            )
+            user_id = conn.execute(select(ChatSession.user_id).where(ChatSession.id == session_id)).scalar()
+            conn.commit()
+        self.invalidate_analytics(user_id)
+        return session_id
+    
+    def iter_user_records(self, user_id: int):
+        """
+        Genera los registros de exportación de un usuario: encabezado, perfil,
+        sesiones, mensajes y estadísticas, incluidas las sesiones del archivo
+        histórico (con IDs negativos). Los mensajes se leen en bloques, sin
+        cargar el historial completo en memoria.
+        """
+        self._wait_for_pending_writes()
+        with self.read_engine.connect() as conn, self._archive_connection(read_only=True) as archive_conn:
+            user = conn.execute(select(User.__table__).where(User.__table__.c.id == user_id)).first()
+            if user is None:
+                raise ValueError(f"Usuario {user_id} no encontrado")
             
-            # Obtener datos de evaluaciones
-            evaluation_data = self._extract_evaluation_data(evaluemos_sessions, db)
+            yield {'type': 'header', 'format': USER_EXPORT_FORMAT, 'version': USER_EXPORT_VERSION,
+                   'exported_at': get_local_datetime().isoformat()}
+            yield _to_record('user', user, User.__table__, exclude=('id',))
             
-            # Obtener datos de simulacros
-            simulation_data = self._extract_simulation_data(simulemos_sessions, db)
+            sources = [(conn, HOT_TABLES)]
+            if archive_conn is not None:
+                sources.append((archive_conn, ARCHIVE_TABLES))
+            for record_type, table_name, key in (('session', 'sessions', 'id'), ('message', 'messages', 'session_id'),
+                                                 ('session_stats', 'stats', 'session_id'),
+                                                 ('question_attempt', 'attempts', 'session_id')):
+                for source_conn, tables in sources:
+                    table, sessions = getattr(tables, table_name), tables.sessions
+                    query = select(table)
+                    if table is not sessions:
+                        query = query.join(sessions, sessions.c.id == table.c.session_id)
+                    query = (query.where(sessions.c.user_id == user_id)
+                             .order_by(*table.primary_key.columns)
+                             .execution_options(yield_per=USER_EXPORT_CHUNK_SIZE))
+                    for row in source_conn.execute(query):
+                        record = _to_record(record_type, row, table, exclude=('id', 'user_id', key))
+                        record[key] = row._mapping[key] * tables.key_sign
+                        yield record
+    
+    def export_user(self, user_id: int, fp) -> int:
+        """
+        Escribe el historial completo de un usuario como JSONL en `fp` (un
+        archivo de texto abierto para escritura), línea por línea.
+        
+        Returns:
+            int: Número de mensajes exportados
+        """
+        messages = 0
+        for record in self.iter_user_records(user_id):
+            fp.write(json.dumps(record, ensure_ascii=False))
+            fp.write("\n")
+            messages += record['type'] == 'message'
+        return messages
+    
+    def import_user(self, fp) -> int:
+        """
+        Importa un usuario exportado con export_user, leyendo `fp` línea por
+        línea. Las sesiones reciben IDs nuevos y los mensajes se insertan en
+        bloques de USER_EXPORT_CHUNK_SIZE, todo en una transacción: si algo
+        falla no queda un usuario a medias.
+        
+        Returns:
+            int: ID del usuario creado
+        
+        Raises:
+            ValueError: Si el archivo no es una exportación válida o el nombre
+                de usuario o el email ya existen
+        """
+        records = (json.loads(line) for line in fp if line.strip())
+        header = next(records, None)
+        if not header or header.get('format') != USER_EXPORT_FORMAT or header.get('version') != USER_EXPORT_VERSION:
+            raise ValueError("El archivo no es una exportación de usuario válida")
+        
+        sessions_table = HOT_TABLES.sessions
+        # Registros que dependen de una sesión, insertados en bloques
+        dependent_tables = {'message': HOT_TABLES.messages, 'session_stats': HOT_TABLES.stats,
+                            'question_attempt': HOT_TABLES.attempts}
+        with self.engine.begin() as conn:
+            user_record = next(records, None)
+            if not user_record or user_record['type'] != 'user':
+                raise ValueError("El archivo no es una exportación de usuario válida")
+            existing = conn.execute(
+                select(User.username).where(
+                    (User.username == user_record['username']) | (User.email == user_record['email'])
+                )
+            ).first()
+            if existing:
+                if existing.username == user_record['username']:
+                    raise ValueError("El nombre de usuario ya existe")
+                raise ValueError("El email ya está registrado")
+            user_id = conn.execute(
+                insert(User.__table__).values(**_from_record(user_record, User.__table__, exclude=('id',)))
+            ).inserted_primary_key[0]
             
-            # Calcular streak de estudio
-            study_streak = self._calculate_study_streak(all_sessions)
+            session_ids = {}  # ID exportado -> ID nuevo
+            pending = {record_type: [] for record_type in dependent_tables}
             
-            # Preparar datos del perfil
-            profile_data = {
-                'full_name': user.full_name,
-                'experience_years': user.experience_years,
-                'target_exam_date': user.target_exam_date,
-                'study_hours_daily': user.study_hours_daily,
-                'company': user.company,
-                'position': user.position
-            }
+            def flush(record_type):
+                rows = pending[record_type]
+                if not rows:
+                    return
+                table = dependent_tables[record_type]
+                if record_type == 'message':
+                    # Se indexan para la búsqueda en la misma transacción
+                    message_ids = conn.execute(
+                        insert(table).returning(table.c.id, sort_by_parameter_order=True), rows
+                    ).scalars().all()
+                    self._index_messages(conn, zip(message_ids, (row['content'] for row in rows)))
+                else:
+                    conn.execute(insert(table), rows)
+                rows.clear()
             
-            return {
-                'user_profile': profile_data,
-                'overview': {
-                    'total_sessions': total_sessions,
-                    'total_messages': total_messages,
-                    'study_time_hours': study_time_hours,
-                    'study_streak_days': study_streak,
-                    'sessions_by_mode': {
-                        'charlemos': len(charlemos_sessions),
-                        'estudiemos': len(estudiemos_sessions),
-                        'evaluemos': len(evaluemos_sessions),
-                        'simulemos': len(simulemos_sessions)
-                    }
-                },
-                'evaluations': evaluation_data,
-                'simulations': simulation_data,
-                'study_patterns': self._analyze_study_patterns(all_sessions, db),
-                'progress_trends': self._calculate_progress_trends(evaluemos_sessions, simulemos_sessions, db)
-            }
+            for record in records:
+                record_type = record['type']
+                if record_type == 'session':
+                    values = _from_record(record, sessions_table, exclude=('id',))
+                    values['user_id'] = user_id
+                    session_ids[record['id']] = conn.execute(insert(sessions_table).values(**values)).inserted_primary_key[0]
+                elif record_type in pending:
+                    values = _from_record(record, dependent_tables[record_type], exclude=('id',))
+                    values['session_id'] = session_ids[record['session_id']]
+                    pending[record_type].append(values)
+                    if len(pending[record_type]) >= USER_EXPORT_CHUNK_SIZE:
+                        flush(record_type)
+                else:
+                    raise ValueError(f"Tipo de registro desconocido: {record_type}")
+            for record_type in pending:
+                flush(record_type)
+            # El resumen diario no se exporta: se recalcula desde las sesiones importadas
+            self._rebuild_daily_activity_for_users(conn, [user_id])
+        self.invalidate_analytics(user_id)
+        return user_id
     
-    def _estimate_study_time(self, sessions: list, db) -> float:
-        """Estima el tiempo total de estudio basado en sesiones y mensajes"""
-        total_hours = 0.0
+    def backfill_session_stats(self, batch_size: int = 500, progress=None) -> int:
+        """
+        Calcula session_stats para las sesiones existentes, en lotes ordenados por ID.
+        Guarda una marca de agua tras cada lote para poder reanudar si se interrumpe;
+        una vez completado, las siguientes llamadas no hacen trabajo.
         
-        for session in sessions:
-            # Obtener mensajes de la sesión
-            messages = db.query(ChatMessage).filter(
-                ChatMessage.session_id == session.id
-            ).all()
+        Args:
+            batch_size (int): Sesiones por transacción
+            progress (callable): Callback opcional que recibe el total procesado
             
-            if len(messages) >= 2:
-                # Calcular duración de la sesión basada en timestamps
-                first_message = min(messages, key=lambda m: m.timestamp)
-                last_message = max(messages, key=lambda m: m.timestamp)
-                duration = last_message.timestamp - first_message.timestamp
-                session_hours = duration.total_seconds() / 3600
-                
-                # Agregar tiempo base por número de mensajes (estimación)
-                message_time = len(messages) * 0.05  # 3 minutos promedio por mensaje
-                
-                total_hours += max(session_hours, message_time)
-            else:
-                # Sesión muy corta, estimar tiempo mínimo
-                total_hours += 0.1
-        
-        return round(total_hours, 1)
-    
-    def _extract_evaluation_data(self, evaluemos_sessions: list, db) -> dict:
-        """Extrae datos específicos de las sesiones de EVALUEMOS"""
-        if not evaluemos_sessions:
-            return {'has_data': False, 'message': 'No hay sesiones de EVALUEMOS completadas'}
-        
-        evaluation_stats = {
-            'has_data': True,
-            'total_sessions': len(evaluemos_sessions),
-            'sessions_detail': []
-        }
+        Returns:
+            int: Número de sesiones procesadas en esta llamada
+        """
+        return self._run_backfill(
+            self.SESSION_STATS_BACKFILL_KEY, ChatSession.id, self._rebuild_stats_for_sessions, batch_size, progress
+        )
+    
+    def recount_answer_verdicts(self, batch_size: int = 500, progress=None) -> int:
+        """
+        Vuelve a calcular session_stats de las sesiones existentes con el
+        veredicto por palabra completa (ver db/keywords.py): antes 'incorrecto'
+        se contaba como respuesta correcta. Reanudable igual que
+        backfill_session_stats.
         
-        for session in evaluemos_sessions:
-            messages = db.query(ChatMessage).filter(
-                ChatMessage.session_id == session.id
-            ).order_by(ChatMessage.timestamp.asc()).all()
-
-            # Contar respuestas correctas e incorrectas
-            correctas = 0
-            incorrectas = 0
-            for m in messages:
-                if m.role == 'assistant':
-                    content = m.content.lower()
-                    if 'correcto' in content:
-                        correctas += 1
-                    elif 'incorrecto' in content:
-                        incorrectas += 1
-            total_preguntas = correctas + incorrectas
-            porcentaje_acierto = int((correctas / total_preguntas) * 100) if total_preguntas > 0 else 0
-
-            # Analizar contenido de mensajes para extraer datos de evaluación
-            session_data = {
-                'session_id': session.id,
-                'session_name': session.name,
-                'date': session.created_at.strftime('%Y-%m-%d'),
-                'duration_minutes': self._calculate_session_duration(messages),
-                'total_interactions': len([m for m in messages if m.role == 'user']),
-                'questions_attempted': self._count_questions_in_session(messages),
-                'topics_covered': self._extract_topics_from_messages(messages),
-                'correct_answers': correctas,
-                'incorrect_answers': incorrectas,
-                'accuracy_percent': porcentaje_acierto
-            }
-
-            evaluation_stats['sessions_detail'].append(session_data)
+        Returns:
+            int: Número de sesiones procesadas en esta llamada
+        """
+        processed = self._run_backfill(
+            self.ANSWER_VERDICT_BACKFILL_KEY, ChatSession.id, self._rebuild_stats_for_sessions, batch_size, progress
+        )
+        self.invalidate_analytics()
+        return processed
+    
+    def backfill_daily_activity(self, batch_size: int = 100, progress=None) -> int:
+        """
+        Calcula daily_activity para los usuarios existentes desde sus sesiones
+        y mensajes, incluidos los del archivo histórico. Reanudable igual que
+        backfill_session_stats, por lotes de usuarios.
         
-        return evaluation_stats
+        Returns:
+            int: Número de usuarios procesados en esta llamada
+        """
+        processed = self._run_backfill(
+            self.DAILY_ACTIVITY_BACKFILL_KEY, User.id, self._rebuild_daily_activity_for_users, batch_size, progress
+        )
+        self.invalidate_analytics()
+        return processed
     
-    def _extract_simulation_data(self, simulemos_sessions: list, db) -> dict:
-        """Extrae datos específicos de las sesiones de SIMULEMOS"""
-        if not simulemos_sessions:
-            return {'has_data': False, 'message': 'No hay sesiones de SIMULEMOS completadas'}
+    def backfill_session_summaries(self, batch_size: int = 500, progress=None) -> int:
+        """
+        Completa el resumen del sidebar (último mensaje, rol y cantidad de
+        mensajes) de las sesiones existentes. Reanudable igual que
+        backfill_session_stats.
         
-        simulation_stats = {
-            'has_data': True,
-            'total_sessions': len(simulemos_sessions),
-            'sessions_detail': []
-        }
+        Returns:
+            int: Número de sesiones procesadas en esta llamada
+        """
+        return self._run_backfill(
+            self.SESSION_SUMMARY_BACKFILL_KEY, ChatSession.id, self._rebuild_summaries_for_sessions, batch_size, progress
+        )
+    
+    def compress_messages(self, batch_size: int = 500, progress=None) -> int:
+        """
+        Comprime los mensajes guardados antes de la compresión transparente
+        (o con un umbral mayor). Recorre chat_messages por ID en lotes con
+        marca de agua, igual que los demás backfills; los mensajes cortos
+        quedan como TEXT.
         
-        for session in simulemos_sessions:
-            messages = db.query(ChatMessage).filter(
-                ChatMessage.session_id == session.id
-            ).order_by(ChatMessage.timestamp.asc()).all()
+        Args:
+            batch_size (int): Mensajes revisados por transacción
+            progress (callable): Callback opcional que recibe el total revisado
             
-            session_data = {
-                'session_id': session.id,
-                'session_name': session.name,
-                'date': session.created_at.strftime('%Y-%m-%d'),
-                'duration_minutes': self._calculate_session_duration(messages),
-                'total_interactions': len([m for m in messages if m.role == 'user']),
-                'exam_type': self._identify_exam_type_from_messages(messages),
-                'completion_status': self._assess_completion_status(messages)
-            }
+        Returns:
+            int: Número de mensajes revisados en esta llamada
+        """
+        return self._run_backfill(
+            self.MESSAGE_COMPRESSION_BACKFILL_KEY, ChatMessage.id, self._compress_messages, batch_size, progress
+        )
+    
+    def _compress_messages(self, db, message_ids: list):
+        """Reescribe a través de CompressedText los mensajes largos aún guardados como TEXT"""
+        rows = db.execute(
+            select(ChatMessage.id, ChatMessage.content).where(
+                ChatMessage.id.in_(message_ids),
+                func.typeof(ChatMessage.content) == 'text',
+                func.length(func.cast(ChatMessage.content, LargeBinary)) >= COMPRESSION_THRESHOLD
+            )
+        ).all()
+        if rows:
+            ids = [row.id for row in rows]
+            queued = set(db.execute(
+                text(f"SELECT message_id FROM {SEARCH_PENDING_TABLE} WHERE message_id IN :ids")
+                .bindparams(bindparam('ids', expanding=True)),
+                {'ids': ids}
+            ).scalars())
+            db.execute(
+                update(ChatMessage.__table__)
+                .where(ChatMessage.__table__.c.id == bindparam('message_id'))
+                .values(content=bindparam('message_content', type_=CompressedText)),
+                [{'message_id': row.id, 'message_content': row.content} for row in rows]
+            )
+            # El texto no cambió: los que ya estaban indexados no se reindexan
+            unchanged = [message_id for message_id in ids if message_id not in queued]
+            if unchanged:
+                for table in (SEARCH_PENDING_TABLE, SEARCH_DELETED_TABLE):
+                    db.execute(
+                        text(f"DELETE FROM {table} WHERE message_id IN :ids").bindparams(bindparam('ids', expanding=True)),
+                        {'ids': unchanged}
+                    )
+    
+    def _run_backfill(self, key: str, column, rebuild, batch_size: int, progress) -> int:
+        """Recorre `column` (un ID) en lotes aplicando `rebuild`, con marca de agua en maintenance_state"""
+        processed = 0
+        while True:
+            with self.get_session() as db:
+                state = db.get(MaintenanceState, key)
+                if state is not None and state.value == 'done':
+                    return processed
+                watermark = int(state.value) if state is not None else 0
+                
+                ids = db.execute(
+                    select(column)
+                    .where(column > watermark)
+                    .order_by(column)
+                    .limit(batch_size)
+                ).scalars().all()
+                
+                if state is None:
+                    state = MaintenanceState(key=key, value='0')
+                    db.add(state)
+                
+                if not ids:
+                    state.value = 'done'
+                    db.commit()
+                    return processed
+                
+                rebuild(db, ids)
+                state.value = str(ids[-1])
+                db.commit()
             
-            simulation_stats['sessions_detail'].append(session_data)
-        
-        return simulation_stats
+            processed += len(ids)
+            if progress:
+                progress(processed)
     
-    def _calculate_session_duration(self, messages: list) -> int:
-        """Calcula la duración de una sesión en minutos, ignorando pausas largas (>10 min) entre mensajes."""
-        if len(messages) < 2:
-            return 0
-        # Ordenar mensajes por timestamp
-        sorted_msgs = sorted(messages, key=lambda m: m.timestamp)
-        total_seconds = 0
-        timeout = 10 * 60  # 10 minutos en segundos
-        for i in range(1, len(sorted_msgs)):
-            delta = (sorted_msgs[i].timestamp - sorted_msgs[i-1].timestamp).total_seconds()
-            if delta <= timeout:
-                total_seconds += delta
-            else:
-                total_seconds += timeout  # Sumar solo el máximo permitido por pausa
-        return int(total_seconds // 60)
-    
-    def _count_questions_in_session(self, messages: list) -> int:
-        """Cuenta aproximadamente cuántas preguntas se respondieron en la sesión"""
-        question_indicators = ['pregunta', 'respuesta', 'opción', 'alternativa', 'selecciona', 'elige']
-        question_count = 0
-        
-        for message in messages:
-            if message.role == 'assistant':
-                content_lower = message.content.lower()
-                if any(indicator in content_lower for indicator in question_indicators):
-                    question_count += 1
-        
-        return question_count
-    
-    def _extract_topics_from_messages(self, messages: list) -> list:
-        """Extrae temas/áreas de conocimiento mencionados en los mensajes"""
-        # Áreas de conocimiento del PMBOK
-        pmbok_areas = [
-            'integration', 'integración', 'scope', 'alcance', 'schedule', 'cronograma',
-            'cost', 'costo', 'quality', 'calidad', 'resource', 'recursos',
-            'communications', 'comunicaciones', 'risk', 'riesgo', 'procurement', 'adquisiciones',
-            'stakeholder', 'interesados', 'people', 'personas', 'process', 'proceso',
-            'business environment', 'entorno de negocio'
-        ]
-        
-        topics_found = set()
-        
-        for message in messages:
-            content_lower = message.content.lower()
-            for area in pmbok_areas:
-                if area in content_lower:
-                    topics_found.add(area.title())
-        
-        return list(topics_found)
-    
-    def _identify_exam_type_from_messages(self, messages: list) -> str:
-        """Identifica el tipo de examen/simulacro basado en el contenido"""
-        exam_types = {
-            'completo': ['180 preguntas', 'examen completo', 'simulacro completo'],
-            'por_tiempo': ['30 minutos', '60 minutos', '90 minutos', 'tiempo limitado'],
-            'por_dominio': ['people domain', 'process domain', 'business environment']
-        }
+    def rebuild_session_stats(self, session_ids: list = None, batch_size: int = 500) -> int:
+        """
+        Recalcula session_stats desde los mensajes, para las sesiones indicadas
+        o para todas. Útil tras inserciones masivas que no pasan por add_message.
         
-        for message in messages:
-            content_lower = message.content.lower()
-            for exam_type, indicators in exam_types.items():
-                if any(indicator in content_lower for indicator in indicators):
-                    return exam_type
+        Returns:
+            int: Número de sesiones recalculadas
+        """
+        with self.get_session() as db:
+            if session_ids is None:
+                session_ids = db.execute(select(ChatSession.id).order_by(ChatSession.id)).scalars().all()
+            for start in range(0, len(session_ids), batch_size):
+                self._rebuild_stats_for_sessions(db, session_ids[start:start + batch_size])
+                db.commit()
+        self.invalidate_analytics()
+        return len(session_ids)
+    
+    def rebuild_session_summaries(self, session_ids: list = None, batch_size: int = 500) -> int:
+        """
+        Recalcula el resumen del sidebar desde los mensajes, para las sesiones
+        indicadas o para todas. Útil tras inserciones masivas que no pasan por
+        add_message.
         
-        return 'general'
+        Returns:
+            int: Número de sesiones recalculadas
+        """
+        with self.get_session() as db:
+            if session_ids is None:
+                session_ids = db.execute(select(ChatSession.id).order_by(ChatSession.id)).scalars().all()
+            for start in range(0, len(session_ids), batch_size):
+                self._rebuild_summaries_for_sessions(db, session_ids[start:start + batch_size])
+                db.commit()
+        return len(session_ids)
     
-    def _assess_completion_status(self, messages: list) -> str:
-        """Evalúa si el simulacro fue completado"""
-        completion_indicators = ['completado', 'finalizado', 'terminado', 'score', 'resultado']
+    def rebuild_daily_activity(self, user_ids: list = None, batch_size: int = 100) -> int:
+        """
+        Recalcula daily_activity desde las sesiones y mensajes, para los
+        usuarios indicados o para todos. Útil tras modificar fechas o
+        insertar datos sin pasar por DatabaseManager.
         
-        for message in messages:
-            if message.role == 'assistant':
-                content_lower = message.content.lower()
-                if any(indicator in content_lower for indicator in completion_indicators):
-                    return 'completado'
+        Returns:
+            int: Número de usuarios recalculados
+        """
+        self._wait_for_pending_writes()
+        with self.get_session() as db:
+            if user_ids is None:
+                user_ids = db.execute(select(User.id).order_by(User.id)).scalars().all()
+            for start in range(0, len(user_ids), batch_size):
+                self._rebuild_daily_activity_for_users(db, user_ids[start:start + batch_size])
+                db.commit()
+        self.invalidate_analytics()
+        return len(user_ids)
+    
+    def _rebuild_daily_activity_for_users(self, db, user_ids: list):
+        """Reemplaza las filas de daily_activity de los usuarios indicados (sin commit)"""
+        activity = {}
+        sources = [(db, HOT_TABLES)]
+        with self._archive_connection(read_only=True) as archive_conn:
+            if archive_conn is not None:
+                sources.append((archive_conn, ARCHIVE_TABLES))
+            for conn, tables in sources:
+                for user_id, day, mode, sessions, messages, active_seconds in self._aggregate_daily_activity(
+                    conn, user_ids, tables
+                ):
+                    totals = activity.setdefault((user_id, day, mode), [0, 0, 0.0])
+                    totals[0] += sessions
+                    totals[1] += messages
+                    totals[2] += active_seconds
         
-        return 'en_progreso'
+        db.execute(delete(DailyActivity.__table__).where(DailyActivity.__table__.c.user_id.in_(user_ids)))
+        _add_daily_activity(db, activity)
     
-    def _calculate_study_streak(self, sessions: list) -> int:
-        """Calcula la racha de días consecutivos de estudio"""
-        if not sessions:
-            return 0
+    def _aggregate_daily_activity(self, conn, user_ids: list, tables: HistoryTables = HOT_TABLES) -> list:
+        """
+        Sesiones creadas, mensajes y segundos activos por usuario, día local y
+        modo, calculados en SQL. Igual que session_stats, cada pausa entre
+        mensajes de una sesión (limitada a SESSION_GAP_CAP_SECONDS) cuenta en
+        el día del mensaje que la cierra.
         
-        # Obtener fechas únicas de sesiones (solo fecha, sin hora)
-        study_dates = set()
-        for session in sessions:
-            study_dates.add(session.created_at.date())
+        Returns:
+            list: Filas (user_id, day, mode, sessions, messages, active_seconds)
+        """
+        sessions, messages = tables.sessions, tables.messages
         
-        # Ordenar fechas
-        sorted_dates = sorted(study_dates, reverse=True)
+        def local_day_of(column):
+            return (type_coerce(column, Integer) + LOCAL_UTC_OFFSET_MS) // MS_PER_DAY
         
-        if not sorted_dates:
-            return 0
+        created = conn.execute(
+            select(sessions.c.user_id, local_day_of(sessions.c.created_at).label('day'), sessions.c.mode,
+                   func.count())
+            .where(sessions.c.user_id.in_(user_ids))
+            .group_by(sessions.c.user_id, 'day', sessions.c.mode)
+        ).all()
         
-        # Calcular racha desde la fecha más reciente
-        streak = 1
-        current_date = sorted_dates[0]
-        
-        for i in range(1, len(sorted_dates)):
-            expected_date = current_date - timedelta(days=i)
-            if sorted_dates[i] == expected_date:
-                streak += 1
-            else:
-                break
-        
-        return streak
-    
-    def _analyze_study_patterns(self, sessions: list, db) -> dict:
-        """Analiza patrones de estudio del usuario"""
-        if not sessions:
-            return {'has_data': False}
-        
-        # Analizar horarios de estudio
-        hour_distribution = {}
-        day_distribution = {}
-        mode_preferences = {}
-        
-        for session in sessions:
-            # Hora del día
-            hour = session.created_at.hour
-            hour_distribution[hour] = hour_distribution.get(hour, 0) + 1
-            
-            # Día de la semana
-            day = session.created_at.strftime('%A')
-            day_distribution[day] = day_distribution.get(day, 0) + 1
-            
-            # Preferencia de modo
-            mode_preferences[session.mode] = mode_preferences.get(session.mode, 0) + 1
-        
-        # Encontrar el mejor horario
-        best_hour = max(hour_distribution.items(), key=lambda x: x[1])[0] if hour_distribution else None
-        best_day = max(day_distribution.items(), key=lambda x: x[1])[0] if day_distribution else None
-        preferred_mode = max(mode_preferences.items(), key=lambda x: x[1])[0] if mode_preferences else None
-        
-        return {
-            'has_data': True,
-            'best_study_hour': best_hour,
-            'best_study_day': best_day,
-            'preferred_mode': preferred_mode,
-            'hour_distribution': hour_distribution,
-            'day_distribution': day_distribution,
-            'mode_distribution': mode_preferences
-        }
+        timestamp = type_coerce(messages.c.timestamp, Integer)
+        ordered = (
+            select(
+                sessions.c.user_id, sessions.c.mode, timestamp.label('timestamp'),
+                func.lag(timestamp).over(partition_by=messages.c.session_id,
+                                         order_by=(messages.c.timestamp, messages.c.id)).label('previous')
+            )
+            .join(sessions, sessions.c.id == messages.c.session_id)
+            .where(sessions.c.user_id.in_(user_ids))
+            .subquery()
+        )
+        gap_seconds = func.coalesce(
+            func.min(func.max(ordered.c.timestamp - ordered.c.previous, 0) / 1000.0, SESSION_GAP_CAP_SECONDS), 0.0
+        )
+        day = local_day_of(ordered.c.timestamp).label('day')
+        written = conn.execute(
+            select(ordered.c.user_id, day, ordered.c.mode, func.count(), func.sum(gap_seconds))
+            .group_by(ordered.c.user_id, 'day', ordered.c.mode)
+        ).all()
+        return ([(user_id, day, mode, count, 0, 0.0) for user_id, day, mode, count in created]
+                + [(user_id, day, mode, 0, count, active_seconds)
+                   for user_id, day, mode, count, active_seconds in written])
     
-    def _calculate_progress_trends(self, evaluemos_sessions: list, simulemos_sessions: list, db) -> dict:
-        """Calcula tendencias de progreso a lo largo del tiempo"""
-        all_assessment_sessions = evaluemos_sessions + simulemos_sessions
-        
-        if len(all_assessment_sessions) < 2:
-            return {'has_data': False, 'message': 'Necesitas al menos 2 sesiones de evaluación/simulacro para mostrar tendencias'}
-        
-        # Ordenar sesiones por fecha
-        sorted_sessions = sorted(all_assessment_sessions, key=lambda s: s.created_at)
-        
-        trends = {
-            'has_data': True,
-            'total_assessment_sessions': len(all_assessment_sessions),
-            'first_session_date': sorted_sessions[0].created_at.strftime('%Y-%m-%d'),
-            'latest_session_date': sorted_sessions[-1].created_at.strftime('%Y-%m-%d'),
-            'session_frequency': self._calculate_session_frequency(sorted_sessions),
-            'engagement_trend': self._calculate_engagement_trend(sorted_sessions, db)
-        }
+    def _rebuild_summaries_for_sessions(self, db, session_ids: list):
+        """Recalcula en SQL el resumen del sidebar de las sesiones indicadas (sin commit)"""
+        def last_message(column):
+            return (
+                select(column)
+                .where(ChatMessage.session_id == ChatSession.id)
+                .order_by(ChatMessage.id.desc())
+                .limit(1)
+                .scalar_subquery()
+            )
         
-        return trends
+        db.execute(
+            update(ChatSession)
+            .where(ChatSession.id.in_(session_ids))
+            .values(
+                last_message_preview=last_message(
+                    func.substr(func.pmp_decompress(ChatMessage.content, type_=Text), 1, SESSION_PREVIEW_LENGTH)
+                ),
+                last_role=last_message(ChatMessage.role),
+                message_count=(
+                    select(func.count(ChatMessage.id))
+                    .where(ChatMessage.session_id == ChatSession.id)
+                    .scalar_subquery()
+                )
+            )
+            .execution_options(synchronize_session=False)
+        )
     
-    def _calculate_session_frequency(self, sessions: list) -> dict:
-        """Calcula la frecuencia de sesiones"""
-        if len(sessions) < 2:
-            return {'frequency': 'insuficientes_datos'}
+    def _rebuild_stats_for_sessions(self, db, session_ids: list):
+        """Reemplaza las filas de session_stats de las sesiones indicadas (sin commit)"""
+        rows = db.execute(
+            select(ChatMessage.session_id, ChatMessage.role, ChatMessage.content, ChatMessage.timestamp)
+            .where(ChatMessage.session_id.in_(session_ids))
+            .order_by(ChatMessage.session_id, ChatMessage.timestamp)
+        ).all()
         
-        first_date = sessions[0].created_at
-        last_date = sessions[-1].created_at
-        days_span = (last_date - first_date).days
+        stats_by_session = {}
+        for row in rows:
+            stats = stats_by_session.get(row.session_id)
+            if stats is None:
+                stats = stats_by_session[row.session_id] = SessionStats(
+                    session_id=row.session_id, message_count=0, user_message_count=0,
+                    active_seconds=0.0, correct_count=0, incorrect_count=0
+                )
+            stats.apply_message(row.role, row.content, row.timestamp)
         
-        if days_span == 0:
-            return {'frequency': 'mismo_dia', 'sessions_per_week': len(sessions) * 7}
+        db.execute(delete(SessionStats).where(SessionStats.session_id.in_(session_ids)))
+        db.add_all(stats_by_session.values())
+    
+    # Métodos específicos para análisis de datos
+    def get_user_analytics_data(self, user_id: int, since: datetime = None, until: datetime = None,
+                                compare: bool = False) -> dict:
+        """
+        Obtiene datos comprehensivos para análisis del usuario.
+        Incluye estadísticas de todas las sesiones de EVALUEMOS y SIMULEMOS,
+        o solo de la ventana entre `since` (incluido) y `until` (excluido):
+        las cifras por sesión (sesiones, tiempo estimado, detalle de
+        evaluaciones y simulacros, patrones) cuentan las sesiones creadas en
+        la ventana; question_accuracy, las respuestas dadas en ella, y
+        active_hours, active_days, active_messages y weekly_activity, los
+        mensajes de sus días. Cada consulta filtra por rango sobre los
+        índices, sin leer el resto del historial.
         
-        sessions_per_week = (len(sessions) / days_span) * 7
+        El resultado se guarda en la caché de analíticas (por ventana) y se
+        reutiliza hasta que una escritura cambie los datos del usuario; no debe modificarse.
         
-        return {
-            'days_span': days_span,
-            'sessions_per_week': round(sessions_per_week, 1),
-            'frequency_category': self._categorize_frequency(sessions_per_week)
-        }
+        Args:
+            user_id (int): ID del usuario
+            since (datetime): Inicio de la ventana; por defecto sin límite
+            until (datetime): Fin de la ventana; por defecto sin límite
+            compare (bool): Agregar 'comparison' con la ventana anterior de igual duración (requiere since)
+        """
+        self._wait_for_pending_writes()
+        return self._analytics_for_window(self._engine_entry.analytics_cache, user_id, since, until, compare)
     
-    def _categorize_frequency(self, sessions_per_week: float) -> str:
-        """Categoriza la frecuencia de estudio"""
-        if sessions_per_week >= 5:
-            return 'muy_alta'
-        elif sessions_per_week >= 3:
-            return 'alta'
-        elif sessions_per_week >= 1:
-            return 'moderada'
+    def invalidate_analytics(self, user_id: int = None):
+        """
+        Descarta las analíticas en caché del usuario (o de todos). Las
+        escrituras de DatabaseManager lo hacen solas; usarlo tras modificar
+        datos por otra vía, como el perfil desde una sesión de SQLAlchemy.
+        """
+        cache = self._engine_entry.analytics_cache
+        if user_id is None:
+            cache.clear()
         else:
-            return 'baja'
+            cache.bump(user_id)
     
-    def _calculate_engagement_trend(self, sessions: list, db) -> dict:
-        """Calcula la tendencia de engagement (participación)"""
-        engagement_data = []
+    def _compute_user_analytics_data(self, user_id: int, window: AnalyticsWindow = LIFETIME) -> dict:
+        """
+        Calcula las analíticas del usuario sin caché para la ventana: las
+        cifras por sesión, de las sesiones creadas en ella; las respuestas y la
+        actividad diaria, por la fecha de cada respuesta o mensaje.
         
-        for session in sessions:
-            messages = db.query(ChatMessage).filter(
-                ChatMessage.session_id == session.id
-            ).all()
+        Los conteos, duraciones y aciertos por sesión se leen de session_stats
+        (costo proporcional a las sesiones, no a los mensajes) y las preguntas
+        respondidas, de question_attempts agrupada en SQL; solo se carga el
+        texto de los mensajes de EVALUEMOS y SIMULEMOS, que todavía requieren
+        búsqueda de palabras clave (temas, tipo de examen y sesiones sin veredictos).
+        La racha y la actividad semanal se leen de daily_activity.
+        """
+        with self.read_engine.connect() as db, self._archive_connection(read_only=True) as archive_conn:
+            # Obtener información básica del usuario
+            user = db.execute(select(User.__table__).where(User.__table__.c.id == user_id)).first()
+            if not user:
+                return {}
             
-            user_messages = [m for m in messages if m.role == 'user']
-            engagement_score = len(user_messages)  # Número de interacciones del usuario
+            # Historial completo: base activa y, si existe, archivo histórico
+            sources = [(db, HOT_TABLES)]
+            if archive_conn is not None:
+                sources.append((archive_conn, ARCHIVE_TABLES))
             
-            engagement_data.append({
-                'date': session.created_at.strftime('%Y-%m-%d'),
-                'engagement_score': engagement_score
-            })
-        
-        # Calcular tendencia (simple: comparar primera mitad vs segunda mitad)
-        if len(engagement_data) >= 4:
-            mid_point = len(engagement_data) // 2
-            first_half_avg = sum(d['engagement_score'] for d in engagement_data[:mid_point]) / mid_point
-            second_half_avg = sum(d['engagement_score'] for d in engagement_data[mid_point:]) / (len(engagement_data) - mid_point)
+            timeline_rows = []
+            assessment_messages = {}
+            attempt_groups = []
+            for conn, tables in sources:
+                # Sesiones del usuario con sus estadísticas precalculadas (sin mensajes)
+                timeline_rows.extend(self._load_session_timeline(conn, user_id, tables, window))
+                # Preguntas respondidas, ya agrupadas por la base
+                attempt_groups.extend(self._load_attempt_groups(conn, user_id, tables, window))
+                # Mensajes completos solo de las sesiones que requieren análisis de contenido
+                assessment_messages.update(
+                    self._load_messages_for_modes(conn, user_id, ("evaluemos", "simulemos"), tables, window)
+                )
             
-            if second_half_avg > first_half_avg * 1.1:
-                trend = 'mejorando'
-            elif second_half_avg < first_half_avg * 0.9:
-                trend = 'declinando'
-            else:
-                trend = 'estable'
-        else:
-            trend = 'insuficientes_datos'
+            # Actividad por día (resumen de la base activa, cubre también lo archivado)
+            activity_rows = self._load_daily_activity(db, user_id, window)
+            
+            # Preparar datos del perfil
+            profile_data = {
+                'full_name': user.full_name,
+                'experience_years': user.experience_years,
+                'target_exam_date': user.target_exam_date,
+                'study_hours_daily': user.study_hours_daily,
+                'company': user.company,
+                'position': user.position
+            }
+        
+        return self._build_user_analytics(profile_data, SessionTimeline.from_rows(timeline_rows), assessment_messages,
+                                          [AttemptGroup._make(row) for row in attempt_groups],
+                                          ActivityDays.from_rows(activity_rows), window=window)
+    
+    @staticmethod
+    def _user_sessions_in_window(sessions: Table, user_id: int, window: AnalyticsWindow) -> list:
+        """
+        Condiciones sobre chat_sessions para las sesiones del usuario creadas en
+        la ventana: un rango del índice (user_id, created_at), en enteros.
+        """
+        conditions = [sessions.c.user_id == user_id]
+        if window.since_ms is not None:
+            conditions.append(sessions.c.created_at >= window.since_ms)
+        if window.until_ms is not None:
+            conditions.append(sessions.c.created_at < window.until_ms)
+        return conditions
+    
+    def _load_daily_activity(self, db, user_id: int, window: AnalyticsWindow = LIFETIME) -> list:
+        """
+        Actividad del usuario por día local, sumada entre modos, en los campos
+        de ActivityDays. Lee una fila por día activo del rango de la clave
+        primaria de daily_activity, sin tocar sesiones ni mensajes.
+        """
+        activity = DailyActivity.__table__
+        conditions = [activity.c.user_id == user_id]
+        if window.first_day is not None:
+            conditions.append(activity.c.day >= window.first_day)
+        if window.last_day is not None:
+            conditions.append(activity.c.day <= window.last_day)
+        return db.execute(
+            select(activity.c.day, func.sum(activity.c.sessions), func.sum(activity.c.messages),
+                   func.sum(activity.c.active_seconds))
+            .where(*conditions)
+            .group_by(activity.c.day)
+            .order_by(activity.c.day)
+        ).all()
+    
+    def _load_attempt_groups(self, db, user_id: int, tables: HistoryTables = HOT_TABLES,
+                             window: AnalyticsWindow = LIFETIME) -> list:
+        """
+        Preguntas respondidas y acertadas del usuario por sesión, dominio, tema
+        y dificultad, en los campos de AttemptGroup. El GROUP BY recorre solo
+        el índice ix_question_attempts_session_breakdown.
+        
+        Con ventana cuentan las respuestas dadas en ella (answered_at), aunque
+        la sesión se haya creado antes: solo se recorren las sesiones usadas
+        desde `since` (rango del índice (user_id, last_used_at)).
+        """
+        attempts, sessions = tables.attempts, tables.sessions
+        conditions = [sessions.c.user_id == user_id]
+        if window.since_ms is not None:
+            conditions += [sessions.c.last_used_at >= window.since_ms, attempts.c.answered_at >= window.since_ms]
+        if window.until_ms is not None:
+            conditions.append(attempts.c.answered_at < window.until_ms)
+        return db.execute(
+            select(
+                tables.session_key(attempts.c.session_id),
+                attempts.c.domain,
+                attempts.c.topic,
+                attempts.c.difficulty,
+                func.count(),
+                func.sum(type_coerce(attempts.c.is_correct, Integer))
+            )
+            .join(sessions, sessions.c.id == attempts.c.session_id)
+            .where(*conditions)
+            .group_by(attempts.c.session_id, attempts.c.domain, attempts.c.topic, attempts.c.difficulty)
+        ).all()
+    
+    def _load_session_timeline(self, db, user_id: int, tables: HistoryTables = HOT_TABLES,
+                               window: AnalyticsWindow = LIFETIME) -> list:
+        """
+        Lee en una sola consulta las sesiones del usuario con sus estadísticas
+        precalculadas (session_stats), en los campos de SessionTimeline. Las
+        fechas se leen como enteros (milisegundos UTC), sin armar datetimes.
+        
+        Returns:
+            list: Filas en orden de creación
+        """
+        stats, sessions = tables.stats, tables.sessions
+        
+        def raw(column):
+            return func.coalesce(type_coerce(column, Integer), 0)
         
-        return {
-            'trend': trend,
-            'engagement_history': engagement_data
-        } 
\ No newline at end of file
+        return db.execute(
+            select(
+                tables.session_key(sessions.c.id),
+                sessions.c.name,
+                sessions.c.mode,
+                raw(sessions.c.created_at),
+                raw(stats.c.message_count),
+                raw(stats.c.user_message_count),
+                raw(stats.c.first_ts),
+                raw(stats.c.last_ts),
+                func.coalesce(stats.c.active_seconds, 0.0),
+                raw(stats.c.correct_count),
+                raw(stats.c.incorrect_count)
+            )
+            .outerjoin(stats, stats.c.session_id == sessions.c.id)
+            .where(*self._user_sessions_in_window(sessions, user_id, window))
+            .order_by(sessions.c.created_at.asc())
+        ).all()
+    
+    def _load_messages_for_modes(self, db, user_id: int, modes: tuple, tables: HistoryTables = HOT_TABLES,
+                                 window: AnalyticsWindow = LIFETIME) -> dict:
+        """
+        Carga en una sola consulta los mensajes de las sesiones del usuario
+        en los modos indicados, ordenados cronológicamente dentro de cada sesión.
+        
+        Returns:
+            dict: session_id -> lista de filas (id, role, content, timestamp_ms)
+        """
+        messages, sessions = tables.messages, tables.sessions
+        rows = db.execute(
+            select(tables.session_key(messages.c.session_id), messages.c.id, messages.c.role, messages.c.content,
+                   type_coerce(messages.c.timestamp, Integer).label('timestamp_ms'))
+            .join(sessions, sessions.c.id == messages.c.session_id)
+            .where(*self._user_sessions_in_window(sessions, user_id, window), sessions.c.mode.in_(modes))
+        ).all()
+        messages_by_session = {}
+        for row in rows:
+            messages_by_session.setdefault(row.session_id, []).append(row)
+        # Ordenar en memoria por sesión: las filas ya llegan casi ordenadas por el
+        # índice (session_id, timestamp) y se evita un ordenamiento global en SQL.
+        # El ID desempata como en get_session_messages: los turnos de add_turns
+        # pueden compartir milisegundo
+        for messages in messages_by_session.values():
+            messages.sort(key=lambda m: (m.timestamp_ms, m.id))
+        return messages_by_session
@@ -0,0 +1,94 @@
+"""
+Recuperación de espacio en segundo plano.
+
+Con auto_vacuum=INCREMENTAL, SQLite deja en la lista de páginas libres lo
+que liberan los borrados y solo lo devuelve al sistema con
+PRAGMA incremental_vacuum. SpaceReclaimer lo ejecuta en un hilo propio, en
+tramos cortos, cada vez que se le avisa de un borrado grande, en lugar de
+un VACUUM completo que bloquea la base mientras reescribe el archivo.
+"""
+
+import threading
+
+# Modo de auto_vacuum informado por PRAGMA auto_vacuum
+_INCREMENTAL = 2
+
+class SpaceReclaimer:
+    """
+    Devuelve al sistema las páginas libres de la base, de a `pages_per_step`
+    por transacción para que las escrituras de la aplicación se intercalen.
+
+    Args:
+        engine (Engine): Engine de la base SQLite
+        pages_per_step (int): Páginas liberadas por transacción
+        pause (float): Segundos de espera entre tramos
+    """
+
+    def __init__(self, engine, pages_per_step: int = 256, pause: float = 0.05):
+        self.engine = engine
+        self.pages_per_step = pages_per_step
+        self.pause = pause
+        self.reclaimed_pages = 0
+        self.last_error = None
+        self._requested = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="space-reclaimer", daemon=True)
+        self._thread.start()
+
+    def request(self):
+        """Pide una pasada de recuperación; no espera a que termine"""
+        self._idle.clear()
+        self._requested.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Bloquea hasta que no quede una pasada pedida o en curso"""
+        return self._idle.wait(timeout)
+
+    def close(self):
+        """Detiene el hilo tras el tramo en curso; las páginas restantes quedan para la próxima pasada"""
+        self._closed.set()
+        self._requested.set()
+        self._thread.join()
+
+    def free_pages(self) -> int:
+        """Páginas libres de la base pendientes de devolver"""
+        with self.engine.connect() as conn:
+            return conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+
+    def _run(self):
+        """Bucle del hilo: espera un pedido y libera páginas hasta vaciar la lista"""
+        while True:
+            self._requested.wait()
+            if self._closed.is_set():
+                self._idle.set()
+                return
+            self._requested.clear()
+            try:
+                self._reclaim()
+            except Exception as e:
+                self.last_error = e
+                print(f"❌ Error al recuperar espacio de la base de datos: {e}")
+            if not self._requested.is_set():
+                self._idle.set()
+
+    def _reclaim(self):
+        while not self._closed.is_set():
+            # La conexión se toma por tramo: con el escritor único, retenerla
+            # durante las pausas dejaría esperando a las escrituras de la aplicación
+            connection = self.engine.raw_connection()
+            try:
+                if connection.execute("PRAGMA auto_vacuum").fetchone()[0] != _INCREMENTAL:
+                    return
+                free = connection.execute("PRAGMA freelist_count").fetchone()[0]
+                if not free:
+                    return
+                pages = min(free, self.pages_per_step)
+                # executescript recorre la sentencia completa: con execute el
+                # módulo sqlite3 la avanza un solo paso y libera una sola página
+                connection.dbapi_connection.executescript(f"PRAGMA incremental_vacuum({pages});")
+                self.reclaimed_pages += pages
+            finally:
+                connection.close()
+            self._closed.wait(self.pause)
@@ -0,0 +1,82 @@
+"""
+Texto de la búsqueda en el historial, común a los dos backends.
+
+El índice FTS5 de SQLite no guarda una copia del texto (content=''), así
+que los fragmentos con los términos resaltados se arman en Python desde el
+mensaje descomprimido, igual que en el backend en memoria. Las palabras se
+normalizan como el tokenizador unicode61 del índice (minúsculas y sin
+tildes); los términos de la consulta se buscan completos y el último como
+prefijo.
+"""
+
+import re
+import unicodedata
+
+# Palabras de los fragmentos de resultados
+SNIPPET_WORDS = 12
+
+def build_search_query(query: str) -> str:
+    """
+    Convierte el texto ingresado por el usuario en una consulta FTS5 segura:
+    cada palabra se busca literal (sin operadores) y la última como prefijo,
+    para encontrar resultados mientras se escribe.
+    """
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+def normalize_word(word: str) -> str:
+    """Minúsculas y sin tildes, como el tokenizador unicode61 del índice FTS5"""
+    decomposed = unicodedata.normalize("NFKD", word.casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+def search_terms(query: str) -> list:
+    """Términos normalizados de la consulta, en orden (el último se busca como prefijo)"""
+    return [normalize_word(term) for term in re.findall(r"\w+", query)]
+
+def tokenize(content: str) -> tuple:
+    """Palabras normalizadas del texto con su posición: (palabra, inicio, fin)"""
+    return tuple((normalize_word(match.group()), *match.span()) for match in re.finditer(r"\w+", content))
+
+def match_terms(words: tuple, terms: list) -> list:
+    """Índices de las palabras que coinciden, o None si falta algún término"""
+    *exact, prefix = terms
+    hits = []
+    found = set()
+    for index, (word, _, _) in enumerate(words):
+        if word in exact:
+            found.add(word)
+        elif word.startswith(prefix):
+            found.add(prefix)
+        else:
+            continue
+        hits.append(index)
+    if prefix in found and found.issuperset(exact):
+        return hits
+    return None
+
+def build_snippet(content: str, words: tuple, hits: list, size: int = SNIPPET_WORDS) -> str:
+    """Fragmento de unas `size` palabras alrededor de la primera coincidencia, con términos entre corchetes"""
+    if not words:
+        return content
+    first = hits[0] if hits else 0
+    start = max(0, min(first - size // 2, len(words) - size))
+    end = min(len(words), start + size)
+    hit_set = set(hits)
+    parts = []
+    cursor = words[start][1]
+    for index in range(start, end):
+        _, word_start, word_end = words[index]
+        parts.append(content[cursor:word_start])
+        word = content[word_start:word_end]
+        parts.append(f"[{word}]" if index in hit_set else word)
+        cursor = word_end
+    return ("…" if start > 0 else "") + "".join(parts) + ("…" if end < len(words) else "")
+
+def highlight(content: str, terms: list, size: int = SNIPPET_WORDS) -> str:
+    """Fragmento de un mensaje que el índice ya encontró para los términos"""
+    words = tokenize(content)
+    return build_snippet(content, words, match_terms(words, terms) or [], size)
@@ -0,0 +1,74 @@
+"""
+Protocolo de almacenamiento de la aplicación.
+
+AuthManager, ChatBot y la interfaz usan solo las operaciones de ChatStorage
+(usuarios, sesiones, mensajes y analíticas), de modo que el backend se elige
+por URL con open_storage:
+
+    sqlite:///chat_history.db  -> DatabaseManager (SQLAlchemy sobre SQLite)
+    memory://<nombre>          -> MemoryDatabaseManager (diccionarios en memoria)
+
+La URL por defecto se toma de la variable de entorno DATABASE_URL.
+Las operaciones de mantenimiento (archivo, migraciones, exportación,
+backfills) siguen siendo propias de DatabaseManager.
+"""
+
+import os
+from datetime import datetime
+from typing import Protocol, runtime_checkable
+
+from .models import DatabaseManager, UserRecord, SessionRecord, MessageRecord
+from .memory import MemoryDatabaseManager, MEMORY_URL_PREFIX
+
+DEFAULT_DATABASE_URL = "sqlite:///chat_history.db"
+
+@runtime_checkable
+class ChatStorage(Protocol):
+    """Operaciones de almacenamiento que usan las capas de la aplicación."""
+
+    # Usuarios
+    def create_user(self, username: str, email: str, password: str): ...
+    def authenticate_user(self, username: str, password: str) -> UserRecord: ...
+    def get_user_by_id(self, user_id: int) -> UserRecord: ...
+    def update_user_profile(self, user_id: int, **fields) -> UserRecord: ...
+
+    # Sesiones
+    def create_chat_session(self, user_id: int, name: str = ..., mode: str = ...) -> SessionRecord: ...
+    def get_chat_session(self, session_id: int) -> SessionRecord: ...
+    def get_latest_chat_session(self, user_id: int) -> SessionRecord: ...
+    def get_user_sessions(self, user_id: int, mode: str = None) -> list: ...
+    def rename_chat_session(self, session_id: int, name: str) -> bool: ...
+    def delete_chat_session(self, session_id: int): ...
+    def delete_sessions(self, session_ids: list, batch_size: int = ...) -> int: ...
+    def get_archived_sessions(self, user_id: int, mode: str = None) -> list: ...
+    def restore_session(self, archived_session_id: int) -> int: ...
+
+    # Mensajes
+    def add_message(self, session_id: int, role: str, content: str) -> MessageRecord: ...
+    def add_turn(self, session_id: int, user_message: str, assistant_message: str, user_timestamp: datetime = None,
+                 verdicts: list = None): ...
+    def add_turns(self, turns: list): ...
+    def get_message_writer(self): ...
+    def flush_pending_writes(self): ...
+    def get_session_messages(self, session_id: int) -> list: ...
+    def get_session_messages_page(self, session_id: int, before_id: int = None, limit: int = ...) -> list: ...
+    def search_messages(self, user_id: int, query: str, mode: str = None, limit: int = ..., offset: int = ...) -> list: ...
+
+    # Analíticas
+    def get_user_analytics_data(self, user_id: int, since: datetime = None, until: datetime = None,
+                                compare: bool = False) -> dict: ...
+    def invalidate_analytics(self, user_id: int = None): ...
+
+def open_storage(database_url: str = None, profile: str = None) -> ChatStorage:
+    """
+    Abre el backend de almacenamiento que corresponde a la URL.
+
+    Args:
+        database_url (str): URL del almacenamiento; por defecto DATABASE_URL
+            o la base SQLite chat_history.db
+        profile (str): Perfil de conexión SQLite (ignorado en memoria)
+    """
+    database_url = database_url or os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL)
+    if database_url.startswith(MEMORY_URL_PREFIX):
+        return MemoryDatabaseManager(database_url)
+    return DatabaseManager(database_url, profile)
@@ -0,0 +1,68 @@
+"""
+Fechas de la aplicación.
+
+Las fechas de sesiones, mensajes y estadísticas se guardan como enteros:
+milisegundos UTC desde 1970 (columnas EpochMillis). Ordenar y filtrar por
+rango compara enteros sobre los índices, sin textos ni conversiones, y al
+leer se arma un datetime UTC sin parsear cadenas. La zona horaria de los
+usuarios (GMT-3) se aplica solo al mostrar: to_local en la interfaz y en
+las analíticas que agrupan por día u hora.
+
+Las fechas sin zona horaria (datos anteriores y scripts) se interpretan en GMT-3.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Integer, TypeDecorator
+
+# Zona horaria GMT-3 (Argentina/Chile/Uruguay)
+GMT_MINUS_3 = timezone(timedelta(hours=-3))
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MILLISECOND = timedelta(milliseconds=1)
+# Diferencia de la hora local con UTC en milisegundos (negativa en GMT-3)
+LOCAL_UTC_OFFSET_MS = GMT_MINUS_3.utcoffset(None) // _MILLISECOND
+
+def get_local_datetime():
+    """Retorna la fecha y hora actual en GMT-3"""
+    return datetime.now(GMT_MINUS_3)
+
+def as_utc(value: datetime) -> datetime:
+    """Fecha con zona horaria UTC; las fechas sin zona se toman como GMT-3"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=GMT_MINUS_3)
+    return value.astimezone(timezone.utc)
+
+def to_local(value: datetime) -> datetime:
+    """Fecha en GMT-3 para mostrar; las fechas sin zona se asumen ya locales"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(GMT_MINUS_3)
+
+def to_epoch_ms(value: datetime) -> int:
+    """Milisegundos UTC desde 1970"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=GMT_MINUS_3)
+    return (value - EPOCH) // _MILLISECOND
+
+def from_epoch_ms(value: int) -> datetime:
+    """Inversa de to_epoch_ms: datetime en UTC"""
+    return EPOCH + timedelta(milliseconds=value)
+
+class EpochMillis(TypeDecorator):
+    """Fecha guardada como milisegundos UTC (INTEGER) y leída como datetime UTC."""
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        return to_epoch_ms(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            # Texto de antes de la migración a enteros (migraciones previas en curso)
+            return as_utc(datetime.fromisoformat(value))
+        return from_epoch_ms(value)
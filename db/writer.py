@@ -0,0 +1,208 @@
+"""
+Escritor en segundo plano para los mensajes del chat.
+
+Recibe turnos completos desde la UI y los guarda en un hilo propio,
+agrupando en una sola transacción todos los turnos que se acumulan
+mientras se escribe el lote anterior.
+
+Un turno que no se pudo guardar no se descarta: queda retenido y vuelve a
+la cola en el siguiente flush o close, y el error llega a quien llama con
+MessageWriteError. Las lecturas solo esperan a la cola (wait): no reintentan
+ni consumen ese aviso. Tras MAX_ATTEMPTS intentos fallidos el turno se da por
+perdido y se informa en ese error.
+"""
+
+import logging
+import queue
+import threading
+from typing import NamedTuple
+
+from .models import PendingTurn, get_local_datetime
+
+logger = logging.getLogger(__name__)
+
+# Marca de cierre en la cola
+_STOP = object()
+
+# Intentos de guardar un turno antes de darlo por perdido
+MAX_ATTEMPTS = 3
+
+class MessageWriteError(Exception):
+    """
+    Turnos que el escritor no pudo guardar.
+
+    Attributes:
+        turns (list): PendingTurn sin guardar
+        lost (bool): True si se descartaron (agotaron MAX_ATTEMPTS o el
+            escritor se cerró); False si siguen retenidos para reintentar
+        error (Exception): Último error de la base de datos
+    """
+
+    def __init__(self, turns: list, lost: bool, error: Exception):
+        state = "descartados" if lost else "retenidos para reintentar"
+        super().__init__(f"No se pudieron guardar {len(turns)} turnos ({state}): {error}")
+        self.turns = turns
+        self.lost = lost
+        self.error = error
+
+class _Queued(NamedTuple):
+    """Turno en la cola con los intentos fallidos que lleva"""
+    turn: PendingTurn
+    attempts: int = 0
+
+class MessageWriter:
+    """
+    Guarda turnos de conversación en segundo plano (write-behind).
+
+    Los turnos se encolan con submit_turn sin esperar al disco; flush
+    bloquea hasta que todo lo encolado esté guardado y close además
+    detiene el hilo. Ambos reintentan los turnos que fallaron antes y
+    lanzan MessageWriteError si hay fallos que aún no se informaron.
+
+    Args:
+        db_manager (DatabaseManager): Gestor usado para escribir los lotes
+        max_batch (int): Máximo de turnos por transacción
+    """
+
+    def __init__(self, db_manager, max_batch: int = 200):
+        self.db_manager = db_manager
+        self.max_batch = max_batch
+        self.last_error = None
+        self._queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._failed = []  # _Queued que fallaron, a reintentar
+        self._lost = []  # Turnos descartados aún no informados
+        self._unreported = False  # Hubo fallos desde el último MessageWriteError
+        self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+        self._thread.start()
+
+    def submit_turn(self, session_id: int, user_message: str, assistant_message: str, user_timestamp=None,
+                    verdicts: list = None):
+        """Encola un turno; las marcas de tiempo se fijan ahora, no al escribir"""
+        now = get_local_datetime()
+        turn = PendingTurn(session_id, user_message, assistant_message, user_timestamp or now, now,
+                           tuple(verdicts or ()))
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("El escritor de mensajes está cerrado")
+            self._queue.put(_Queued(turn))
+
+    @property
+    def pending(self) -> int:
+        """Turnos encolados o retenidos tras un fallo que todavía no se guardaron"""
+        with self._lock:
+            return self._queue.unfinished_tasks + len(self._failed)
+
+    def flush(self):
+        """
+        Bloquea hasta que todos los turnos encolados estén guardados,
+        reintentando antes los que fallaron.
+        
+        Raises:
+            MessageWriteError: Si hubo fallos que no se informaron todavía
+        """
+        with self._lock:
+            self._requeue_failed()
+        self._queue.join()
+        self._raise_unreported()
+
+    def wait(self):
+        """
+        Bloquea hasta que se procese lo encolado, sin reintentar ni informar
+        los turnos que fallaron: es la espera de las lecturas, que no deben
+        gastar los intentos ni el aviso de flush y close.
+        """
+        self._queue.join()
+
+    def close(self):
+        """
+        Guarda los turnos pendientes (con un último reintento de los que
+        fallaron) y detiene el hilo.
+        
+        Raises:
+            MessageWriteError: Con los turnos que no se pudieron guardar
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._requeue_failed()
+            self._queue.put(_STOP)
+        self._thread.join()
+        with self._lock:
+            # Ya no hay hilo que los reintente
+            self._lost.extend(item.turn for item in self._failed)
+            self._failed = []
+        self._raise_unreported()
+
+    def _requeue_failed(self):
+        """Devuelve a la cola los turnos retenidos (con self._lock tomado)"""
+        for item in self._failed:
+            self._queue.put(item)
+        self._failed = []
+
+    def _raise_unreported(self):
+        """Informa una sola vez los fallos ocurridos desde el último aviso"""
+        with self._lock:
+            if not self._unreported:
+                return
+            lost, retained = self._lost, [item.turn for item in self._failed]
+            self._unreported = False
+            self._lost = []
+        raise MessageWriteError(lost or retained, bool(lost), self.last_error)
+
+    def _run(self):
+        """Bucle del hilo: toma todo lo pendiente y lo escribe en una transacción"""
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            items = [item for item in batch if item is not _STOP]
+            try:
+                if items:
+                    self._write(items)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            if len(items) != len(batch):
+                return
+
+    def _write(self, items: list):
+        """Escribe un lote; si falla, reintenta turno por turno para no perder el resto"""
+        try:
+            self.db_manager.add_turns([item.turn for item in items])
+            return
+        except Exception as e:
+            if len(items) == 1:
+                self._failed_turn(items[0], e)
+                return
+            logger.warning("Error al guardar un lote de %d turnos; se guardan de a uno: %s", len(items), e)
+
+        for item in items:
+            try:
+                self.db_manager.add_turns([item.turn])
+            except Exception as e:
+                self._failed_turn(item, e)
+
+    def _failed_turn(self, item: _Queued, error: Exception):
+        """Retiene el turno para el próximo flush, o lo descarta si agotó los intentos"""
+        attempts = item.attempts + 1
+        with self._lock:
+            self.last_error = error
+            self._unreported = True
+            if attempts < MAX_ATTEMPTS:
+                self._failed.append(item._replace(attempts=attempts))
+            else:
+                self._lost.append(item.turn)
+        if attempts < MAX_ATTEMPTS:
+            logger.error("Error al guardar un turno de la sesión %s (intento %d de %d): %s",
+                         item.turn.session_id, attempts, MAX_ATTEMPTS, error)
+        else:
+            logger.error("Se descartó un turno de la sesión %s tras %d intentos: %s",
+                         item.turn.session_id, attempts, error)
@@ -11,7 +11,7 @@ import random
 from datetime import datetime, timedelta
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from db.models import Base, User, ChatSession, ChatMessage
+from db.models import Base, User, ChatSession, ChatMessage, DatabaseManager
 import hashlib
 import secrets
 
@@ -337,6 +337,14 @@ def generate_demo_data():
     # Crear sesiones y mensajes
     sessions_count = create_demo_sessions(demo_user.id)
     
+    # Recalcular estadísticas, resumen del sidebar, actividad diaria e índice de búsqueda
+    # (los mensajes se insertaron sin add_message)
+    db_manager = DatabaseManager(DATABASE_URL)
+    db_manager.rebuild_session_stats()
+    db_manager.rebuild_session_summaries()
+    db_manager.rebuild_daily_activity([demo_user.id])
+    db_manager.rebuild_search_index()
+    
     # Estadísticas finales
     db = SessionLocal()
     total_messages = db.query(ChatMessage).join(ChatSession).filter(ChatSession.user_id == demo_user.id).count()
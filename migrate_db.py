@@ -1,217 +1,89 @@
 """
 Script de migración para actualizar la base de datos existente.
-Agrega las tablas de usuarios y actualiza la estructura de chat_sessions.
+
+La aplicación aplica las migraciones pendientes al iniciar (ver
+db/migrations.py); este script permite hacerlo de antemano, con la copia
+de seguridad automática y el avance de cada paso a la vista, y espera a
+que terminen los backfills que la aplicación completaría en segundo plano. Es seguro
+ejecutarlo varias veces: las migraciones registradas en schema_version se
+omiten y un backfill interrumpido continúa donde quedó.
+
+Con --compact además convierte a auto_vacuum=INCREMENTAL una base creada
+antes de ese modo, con un VACUUM completo que reescribe el archivo (puede
+demorar en bases grandes, por eso la aplicación no lo hace al iniciar).
+
+Para ejecutar: python migrate_db.py [--db chat_history.db] [--compact]
 """
 
-import sqlite3
+import argparse
 import os
-from pathlib import Path
-from datetime import datetime
-
-def backup_database():
-    """Crea una copia de seguridad de la base de datos actual"""
-    db_path = "chat_history.db"
-    if os.path.exists(db_path):
-        backup_path = "chat_history_backup.db"
-        import shutil
-        shutil.copy2(db_path, backup_path)
-        print(f"✅ Copia de seguridad creada: {backup_path}")
-        return True
-    return False
-
-def migrate_database():
-    """
-    Migra la base de datos para agregar los nuevos campos.
-    """
-    db_path = "chat_history.db"
-    
+import time
+
+def migrate_database(db_path: str = "chat_history.db", compact: bool = False):
+    """Aplica las migraciones pendientes y muestra el estado final de la base"""
     if not os.path.exists(db_path):
-        print("Base de datos no encontrada. Se creará automáticamente con los nuevos campos.")
-        return
-    
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
+        print("Base de datos no encontrada. Se creará automáticamente con el esquema actual.")
+        return False
+
     try:
+        from db.models import DatabaseManager, User, ChatSession, ChatMessage
+        from db.migrations import LATEST_VERSION
+        from sqlalchemy import select, func
+
         print("🔄 Iniciando migración de base de datos...")
-        
-        # Verificar si la tabla users ya existe
-        cursor.execute("""
-            SELECT name FROM sqlite_master 
-            WHERE type='table' AND name='users'
-        """)
-        
-        if not cursor.fetchone():
-            print("📝 Creando tabla de usuarios...")
-            # Crear tabla users
-            cursor.execute("""
-                CREATE TABLE users (
-                    id INTEGER PRIMARY KEY,
-                    username VARCHAR(50) UNIQUE NOT NULL,
-                    email VARCHAR(100) UNIQUE NOT NULL,
-                    password_hash VARCHAR(128) NOT NULL,
-                    salt VARCHAR(32) NOT NULL,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    is_active BOOLEAN DEFAULT 1
-                )
-            """)
-            print("✅ Tabla users creada")
-        else:
-            print("ℹ️  Tabla users ya existe")
-        
-        # Verificar si la columna user_id existe en chat_sessions
-        cursor.execute("PRAGMA table_info(chat_sessions)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        if 'user_id' not in columns:
-            print("📝 Agregando columna user_id a chat_sessions...")
-            
-            # Crear usuario por defecto si no existe
-            cursor.execute("SELECT COUNT(*) FROM users")
-            user_count = cursor.fetchone()[0]
-            
-            if user_count == 0:
-                print("👤 Creando usuario por defecto...")
-                # Crear usuario por defecto con hash de contraseña
-                import hashlib
-                import secrets
-                
-                salt = secrets.token_hex(16)
-                password_hash = hashlib.sha256(("admin123" + salt).encode()).hexdigest()
-                
-                cursor.execute("""
-                    INSERT INTO users (username, email, password_hash, salt)
-                    VALUES (?, ?, ?, ?)
-                """, ("admin", "admin@demo.com", password_hash, salt))
-                
-                default_user_id = cursor.lastrowid
-                print(f"✅ Usuario por defecto creado (ID: {default_user_id})")
-                print("   Usuario: admin")
-                print("   Contraseña: admin123")
+        started = time.perf_counter()
+        db_manager = DatabaseManager(f"sqlite:///{db_path}", progress=lambda message: print(f"📝 {message}"))
+        if not db_manager.wait_for_migrations(timeout=0):
+            print("⏳ Completando los backfills en segundo plano...")
+            db_manager.wait_for_migrations()
+        print(f"✅ Esquema en la versión {db_manager.schema_version()} de {LATEST_VERSION} "
+              f"({time.perf_counter() - started:.1f} s)")
+
+        if compact:
+            print("🗜️  Compactando la base (VACUUM completo)...")
+            started = time.perf_counter()
+            if db_manager.compact_database():
+                print(f"✅ Base en auto_vacuum=INCREMENTAL ({time.perf_counter() - started:.1f} s)")
             else:
-                # Usar el primer usuario existente
-                cursor.execute("SELECT id FROM users LIMIT 1")
-                default_user_id = cursor.fetchone()[0]
-                print(f"ℹ️  Usando usuario existente (ID: {default_user_id})")
-            
-            # Agregar columna user_id a chat_sessions
-            cursor.execute("ALTER TABLE chat_sessions ADD COLUMN user_id INTEGER")
-            
-            # Actualizar todas las sesiones existentes con el usuario por defecto
-            cursor.execute("UPDATE chat_sessions SET user_id = ? WHERE user_id IS NULL", (default_user_id,))
-            
-            print("✅ Columna user_id agregada y sesiones actualizadas")
-        else:
-            print("ℹ️  Columna user_id ya existe en chat_sessions")
-        
-        # Verificar si las columnas ya existen
-        cursor.execute("PRAGMA table_info(chat_sessions)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        # Agregar columna mode si no existe
-        if 'mode' not in columns:
-            print("Agregando columna 'mode' a chat_sessions...")
-            cursor.execute("ALTER TABLE chat_sessions ADD COLUMN mode VARCHAR(50) DEFAULT 'charlemos'")
-            print("✅ Columna 'mode' agregada exitosamente")
-        else:
-            print("✅ Columna 'mode' ya existe")
-        
-        # Agregar columna last_used_at si no existe
-        if 'last_used_at' not in columns:
-            print("Agregando columna 'last_used_at' a chat_sessions...")
-            cursor.execute("ALTER TABLE chat_sessions ADD COLUMN last_used_at DATETIME")
-            
-            # Inicializar last_used_at con created_at para sesiones existentes
-            cursor.execute("UPDATE chat_sessions SET last_used_at = created_at WHERE last_used_at IS NULL")
-            print("✅ Columna 'last_used_at' agregada exitosamente")
-        else:
-            print("✅ Columna 'last_used_at' ya existe")
-        
-        # Confirmar cambios
-        conn.commit()
-        print("✅ Migración completada exitosamente")
-        
-        # Mostrar estadísticas
-        cursor.execute("SELECT COUNT(*) FROM users")
-        user_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM chat_sessions")
-        session_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM chat_messages")
-        message_count = cursor.fetchone()[0]
-        
+                print("✅ La base ya estaba en auto_vacuum=INCREMENTAL")
+
+        with db_manager.get_session() as db:
+            user_count = db.execute(select(func.count(User.id))).scalar()
+            session_count = db.execute(select(func.count(ChatSession.id))).scalar()
+            message_count = db.execute(select(func.count(ChatMessage.id))).scalar()
+
         print(f"\n📊 Estadísticas de la base de datos:")
         print(f"   👤 Usuarios: {user_count}")
         print(f"   💬 Sesiones de chat: {session_count}")
         print(f"   📝 Mensajes: {message_count}")
-        
         return True
-        
-    except Exception as e:
-        print(f"❌ Error durante la migración: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
-        return False
 
-def verify_migration():
-    """Verifica que la migración se haya completado correctamente"""
-    try:
-        from db.models import DatabaseManager
-        
-        print("\n🔍 Verificando migración...")
-        db_manager = DatabaseManager()
-        
-        # Intentar obtener usuarios
-        with db_manager.get_session() as session:
-            from db.models import User, ChatSession
-            
-            users = session.query(User).all()
-            sessions = session.query(ChatSession).all()
-            
-            print(f"✅ Verificación exitosa:")
-            print(f"   👤 {len(users)} usuarios encontrados")
-            print(f"   💬 {len(sessions)} sesiones encontradas")
-            
-            if users:
-                print(f"   🔑 Usuario disponible: {users[0].username}")
-        
-        return True
-        
     except Exception as e:
-        print(f"❌ Error en verificación: {e}")
+        print(f"❌ Error durante la migración: {e}")
         return False
 
 def main():
     """Función principal de migración"""
+    parser = argparse.ArgumentParser(description="Aplica las migraciones pendientes de la base de datos")
+    parser.add_argument("--db", default="chat_history.db", help="Ruta de la base de datos")
+    parser.add_argument("--compact", action="store_true",
+                        help="Pasar la base a auto_vacuum=INCREMENTAL con un VACUUM completo")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("🔄 MIGRACIÓN DE BASE DE DATOS")
     print("=" * 60)
-    print("Este script actualizará tu base de datos para soportar autenticación.")
-    print()
-    
-    # Crear copia de seguridad
-    if backup_database():
-        print()
-    
-    # Ejecutar migración
-    if migrate_database():
-        print()
-        # Verificar migración
-        if verify_migration():
-            print("\n🎉 ¡Migración completada exitosamente!")
-            print("\n📝 Próximos pasos:")
-            print("   1. Ejecuta: python main.py")
-            print("   2. Inicia sesión con: admin / admin123")
-            print("   3. O crea una nueva cuenta")
-        else:
-            print("\n⚠️  Migración completada pero hay problemas en la verificación")
-    else:
+
+    if migrate_database(args.db, args.compact):
+        print("\n🎉 ¡Migración completada exitosamente!")
+        print("\n📝 Próximos pasos:")
+        print("   1. Ejecuta: python main.py")
+        print("   2. Inicia sesión con tu cuenta (o admin / admin123 si la base era anterior a los usuarios)")
+    elif os.path.exists(args.db):
         print("\n❌ La migración falló")
-        print("💡 Puedes restaurar desde: chat_history_backup.db")
-    
+        print("💡 Puedes restaurar desde la copia de seguridad indicada arriba")
+
     print("\n" + "=" * 60)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
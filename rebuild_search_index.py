@@ -0,0 +1,39 @@
+"""
+Script para reconstruir el índice de búsqueda de texto completo (FTS5).
+Úsalo después de cargas masivas de mensajes o si la búsqueda devuelve
+resultados incompletos.
+
+Para ejecutar: python rebuild_search_index.py [ruta_de_la_base_de_datos]
+"""
+
+import os
+import sys
+import time
+
+def rebuild_search_index(db_path: str = "chat_history.db"):
+    """
+    Reconstruye y compacta el índice de búsqueda desde chat_messages.
+    """
+    if not os.path.exists(db_path):
+        print("❌ Base de datos no encontrada. Ejecuta la aplicación primero para crearla.")
+        return False
+    
+    try:
+        from db.models import DatabaseManager, ChatMessage
+        
+        db_manager = DatabaseManager(f"sqlite:///{db_path}")
+        with db_manager.get_session() as db:
+            message_count = db.query(ChatMessage).count()
+        
+        print(f"🔄 Reconstruyendo índice de búsqueda ({message_count} mensajes)...")
+        started = time.perf_counter()
+        db_manager.rebuild_search_index()
+        print(f"✅ Índice reconstruido en {time.perf_counter() - started:.1f} s")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error al reconstruir el índice: {e}")
+        return False
+
+if __name__ == "__main__":
+    rebuild_search_index(*sys.argv[1:2])
@@ -37,6 +37,12 @@ def db_manager(temp_db_path):
     with db_manager.get_session() as session:
         db_manager.Base.metadata.drop_all(bind=session.bind)
 
+@pytest.fixture
+def memory_storage(request):
+    """Fixture que proporciona un almacenamiento en memoria propio de cada test."""
+    from db.memory import MemoryDatabaseManager
+    return MemoryDatabaseManager(f"memory://{request.node.nodeid}")
+
 @pytest.fixture
 def auth_manager(db_manager):
     """Fixture que proporciona un AuthManager configurado para testing."""
@@ -2,11 +2,13 @@
 Tests unitarios para los modelos de base de datos (db/models.py).
 """
 
+import os
 import pytest
 from datetime import datetime, timedelta
 from unittest.mock import Mock, patch
 from sqlalchemy.exc import IntegrityError
-from db.models import DatabaseManager, User, ChatSession, ChatMessage
+from db.models import DatabaseManager, User, ChatSession, ChatMessage, MessageRecord
+from db.timestamps import GMT_MINUS_3
 from sqlalchemy import text
 
 class TestDatabaseManager:
@@ -41,6 +43,105 @@ class TestDatabaseManager:
             assert hasattr(session, 'commit')
             assert hasattr(session, 'rollback')
 
+class TestEngineRegistry:
+    """Tests para el registro de engines compartidos por URL."""
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_managers_share_engine_for_same_url(self, db_manager, temp_db_path):
+        """Dos gestores con la misma URL comparten engine y fábrica de sesiones."""
+        other = DatabaseManager(f"sqlite:///{temp_db_path}")
+        
+        assert other.engine is db_manager.engine
+        assert other.SessionLocal is db_manager.SessionLocal
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_schema_is_checked_once_per_url(self, test_data_dir):
+        """create_all se ejecuta solo al crear el primer gestor de cada URL."""
+        url = f"sqlite:///{test_data_dir}/registry.db"
+        with patch.object(DatabaseManager.Base.metadata, 'create_all',
+                          wraps=DatabaseManager.Base.metadata.create_all) as create_all:
+            DatabaseManager(url)
+            DatabaseManager(url)
+            DatabaseManager(url)
+        
+        assert create_all.call_count == 1
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_dispose_engines_clears_registry(self, test_data_dir):
+        """dispose_engines obliga a crear un engine nuevo en el siguiente uso."""
+        from db.models import dispose_engines
+        
+        url = f"sqlite:///{test_data_dir}/dispose.db"
+        first = DatabaseManager(url)
+        dispose_engines()
+        second = DatabaseManager(url)
+        
+        assert second.engine is not first.engine
+
+class TestSqliteProfiles:
+    """Tests para los perfiles de conexión SQLite."""
+    
+    def _pragma(self, db_manager, name):
+        with db_manager.engine.connect() as conn:
+            return conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_fast_profile_pragmas(self, test_data_dir):
+        """El perfil 'fast' activa WAL con synchronous=NORMAL y mmap."""
+        db_manager = DatabaseManager(f"sqlite:///{test_data_dir}/fast.db", profile="fast")
+        
+        assert self._pragma(db_manager, "journal_mode") == "wal"
+        assert self._pragma(db_manager, "synchronous") == 1  # NORMAL
+        assert self._pragma(db_manager, "busy_timeout") == 5000
+        assert self._pragma(db_manager, "temp_store") == 2  # MEMORY
+        assert self._pragma(db_manager, "cache_size") == -64000
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_durable_profile_pragmas(self, test_data_dir):
+        """El perfil 'durable' mantiene synchronous=FULL."""
+        db_manager = DatabaseManager(f"sqlite:///{test_data_dir}/durable.db", profile="durable")
+        
+        assert self._pragma(db_manager, "journal_mode") == "wal"
+        assert self._pragma(db_manager, "synchronous") == 2  # FULL
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_unknown_profile_raises(self, test_data_dir):
+        """Un perfil inexistente produce ValueError."""
+        with pytest.raises(ValueError, match="Perfil de conexión desconocido"):
+            DatabaseManager(f"sqlite:///{test_data_dir}/unknown.db", profile="turbo")
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_read_engine_is_read_only(self, db_manager):
+        """Las lecturas usan un pool de solo lectura; las escrituras, una única conexión."""
+        from sqlalchemy.exc import OperationalError
+        
+        assert db_manager.read_engine is not db_manager.engine
+        assert db_manager.engine.pool.size() == 1
+        with db_manager.read_engine.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA query_only").scalar() == 1
+            with pytest.raises(OperationalError, match="readonly"):
+                conn.exec_driver_sql("DELETE FROM users")
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_open_read_does_not_block_writes(self, db_manager, sample_chat_session):
+        """Una lectura larga en curso no demora las escrituras del chat."""
+        db_manager.add_turn(sample_chat_session.id, "Primera", "Respuesta")
+        with db_manager.read_engine.connect() as conn:
+            # Cursor sin consumir: la transacción de lectura queda abierta
+            result = conn.exec_driver_sql("SELECT id FROM chat_messages")
+            result.fetchone()
+            db_manager.add_turn(sample_chat_session.id, "Segunda", "Respuesta")
+            result.close()
+        assert len(db_manager.get_session_messages(sample_chat_session.id)) == 4
+
 class TestUserModel:
     """Tests para el modelo User."""
     
@@ -210,10 +311,11 @@ class TestChatMessageModel:
             content="Este es un mensaje de prueba"
         )
         
-        assert message is not None
+        assert isinstance(message, MessageRecord)
         assert message.id is not None
-        assert message.session_id == sample_chat_session.id
+        assert message.role == "user"
         assert message.content == "Este es un mensaje de prueba"
+        assert db_manager.get_session_messages_page(sample_chat_session.id) == [message]
     
     @pytest.mark.unit
     @pytest.mark.database
@@ -243,4 +345,1709 @@ class TestChatMessageModel:
     def test_get_session_messages_empty(self, db_manager, sample_chat_session):
         """Test de obtención de mensajes de sesión vacía."""
         messages = db_manager.get_session_messages(sample_chat_session.id)
-        assert len(messages) == 0 
\ No newline at end of file
+        assert len(messages) == 0 
+class TestSessionMessagesPage:
+    """Tests para la paginación por clave del historial."""
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_pages_walk_back_in_order(self, db_manager, sample_chat_session):
+        """Cada página trae los mensajes anteriores al primero de la página previa."""
+        for i in range(5):
+            db_manager.add_message(sample_chat_session.id, "user", f"Mensaje {i}")
+        
+        latest = db_manager.get_session_messages_page(sample_chat_session.id, limit=2)
+        assert [content for _, _, content in latest] == ["Mensaje 3", "Mensaje 4"]
+        
+        older = db_manager.get_session_messages_page(sample_chat_session.id, before_id=latest[0][0], limit=2)
+        assert [content for _, _, content in older] == ["Mensaje 1", "Mensaje 2"]
+        
+        oldest = db_manager.get_session_messages_page(sample_chat_session.id, before_id=older[0][0], limit=2)
+        assert [content for _, _, content in oldest] == ["Mensaje 0"]
+        assert db_manager.get_session_messages_page(sample_chat_session.id, before_id=oldest[0][0]) == []
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_page_is_scoped_to_session(self, db_manager, sample_chat_session):
+        """Los mensajes de otras sesiones no aparecen en la página."""
+        other = db_manager.create_chat_session(sample_chat_session.user_id, "Otra")
+        db_manager.add_message(sample_chat_session.id, "user", "Propio")
+        db_manager.add_message(other.id, "user", "Ajeno")
+        
+        page = db_manager.get_session_messages_page(sample_chat_session.id)
+        assert [(role, content) for _, role, content in page] == [("user", "Propio")]
+
+class TestQueryPlans:
+    """Tests que verifican que las consultas frecuentes usan índices."""
+    
+    HOT_TABLES = ('chat_messages', 'chat_sessions')
+    
+    def _capture_selects(self, db_manager, action):
+        """Ejecuta la acción y retorna las sentencias SELECT emitidas con sus parámetros."""
+        from sqlalchemy import event
+        
+        statements = []
+        
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT'):
+                statements.append((statement, parameters))
+        
+        # Escrituras y lecturas usan engines distintos
+        engines = (db_manager.engine, db_manager.read_engine)
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            action()
+        finally:
+            for engine in engines:
+                event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        return statements
+    
+    def _assert_uses_indexes(self, db_manager, statements):
+        """Falla si algún SELECT recorre completa una tabla caliente o ordena en memoria."""
+        assert statements, "No se capturaron consultas"
+        with db_manager.engine.connect() as conn:
+            for statement, parameters in statements:
+                plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+                details = [row[-1] for row in plan]
+                for detail in details:
+                    for table in self.HOT_TABLES:
+                        assert not detail.startswith(f"SCAN {table}"), \
+                            f"Recorrido completo de {table}: {detail}\n{statement}"
+                    assert "USE TEMP B-TREE FOR ORDER BY" not in detail, \
+                        f"Ordenamiento sin índice: {detail}\n{statement}"
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_get_session_messages_uses_index(self, db_manager, sample_chat_session):
+        """El historial de una sesión se lee por índice (session_id, timestamp)."""
+        db_manager.add_message(sample_chat_session.id, "user", "Hola")
+        statements = self._capture_selects(
+            db_manager, lambda: db_manager.get_session_messages(sample_chat_session.id)
+        )
+        self._assert_uses_indexes(db_manager, statements)
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_get_session_messages_page_uses_index(self, db_manager, sample_chat_session):
+        """Las páginas de historial se leen por índice (session_id, id) sin ordenar en memoria."""
+        message = db_manager.add_message(sample_chat_session.id, "user", "Hola")
+        statements = self._capture_selects(db_manager, lambda: (
+            db_manager.get_session_messages_page(sample_chat_session.id),
+            db_manager.get_session_messages_page(sample_chat_session.id, before_id=message.id)
+        ))
+        self._assert_uses_indexes(db_manager, statements)
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_get_user_sessions_uses_index(self, db_manager, sample_chat_session):
+        """El listado del sidebar usa índices con y sin filtro de modo."""
+        statements = self._capture_selects(db_manager, lambda: (
+            db_manager.get_user_sessions(sample_chat_session.user_id),
+            db_manager.get_user_sessions(sample_chat_session.user_id, "charlemos")
+        ))
+        self._assert_uses_indexes(db_manager, statements)
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_get_latest_chat_session_uses_index(self, db_manager, sample_chat_session):
+        """La sesión más reciente se obtiene sin recorrer chat_sessions."""
+        statements = self._capture_selects(
+            db_manager, lambda: db_manager.get_latest_chat_session(sample_chat_session.user_id)
+        )
+        self._assert_uses_indexes(db_manager, statements)
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_add_message_uses_index(self, db_manager, sample_chat_session):
+        """Guardar un mensaje no recorre las tablas de chat."""
+        statements = self._capture_selects(
+            db_manager, lambda: db_manager.add_message(sample_chat_session.id, "user", "Hola")
+        )
+        self._assert_uses_indexes(db_manager, statements)
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_get_user_analytics_data_uses_indexes(self, db_manager, sample_chat_session):
+        """Las analíticas no recorren completas las tablas de chat."""
+        user_id = sample_chat_session.user_id
+        evaluation = db_manager.create_chat_session(user_id, "Evaluación", "evaluemos")
+        db_manager.add_message(evaluation.id, "user", "Pregunta 1")
+        db_manager.add_message(evaluation.id, "assistant", "Respuesta correcto")
+        statements = self._capture_selects(
+            db_manager, lambda: db_manager.get_user_analytics_data(user_id)
+        )
+        self._assert_uses_indexes(db_manager, statements)
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_windowed_analytics_use_indexes(self, db_manager, sample_chat_session):
+        """La ventana de las analíticas se resuelve con rangos sobre los índices."""
+        from db.analytics import recent_days_window
+        
+        user_id = sample_chat_session.user_id
+        db_manager.add_turn(sample_chat_session.id, "Pregunta 1", "Respuesta correcto")
+        since, until = recent_days_window(7)
+        statements = self._capture_selects(
+            db_manager, lambda: db_manager.get_user_analytics_data(user_id, since=since, until=until, compare=True)
+        )
+        self._assert_uses_indexes(db_manager, statements)
+        assert any("created_at >=" in statement for statement, _ in statements)
+
+class TestUserAnalytics:
+    """Tests para las analíticas agregadas del usuario."""
+    
+    def _count_queries(self, db_manager, action):
+        from sqlalchemy import event
+        
+        counter = {'queries': 0}
+        
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            counter['queries'] += 1
+        
+        event.listen(db_manager.read_engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            action()
+        finally:
+            event.remove(db_manager.read_engine, 'before_cursor_execute', before_cursor_execute)
+        return counter['queries']
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_analytics_overview_counts(self, db_manager, sample_user):
+        """Los totales por sesión y por modo se calculan correctamente."""
+        evaluation = db_manager.create_chat_session(sample_user.id, "Evaluación", "evaluemos")
+        db_manager.add_message(evaluation.id, "user", "Pregunta sobre riesgo")
+        db_manager.add_message(evaluation.id, "assistant", "¡Correcto!")
+        chat = db_manager.create_chat_session(sample_user.id, "Charla", "charlemos")
+        db_manager.add_message(chat.id, "user", "Hola")
+        
+        analytics = db_manager.get_user_analytics_data(sample_user.id)
+        
+        overview = analytics['overview']
+        assert overview['total_sessions'] == 2
+        assert overview['total_messages'] == 3
+        assert overview['sessions_by_mode'] == {
+            'charlemos': 1, 'estudiemos': 0, 'evaluemos': 1, 'simulemos': 0
+        }
+        detail = analytics['evaluations']['sessions_detail'][0]
+        assert detail['total_interactions'] == 1
+        assert detail['correct_answers'] == 1
+        assert 'Riesgo' in detail['topics_covered']
+    
+    @pytest.mark.unit
+    def test_classify_message_matches_whole_words(self):
+        """Una pasada devuelve temas, indicadores y veredicto, sin coincidir a mitad de palabra."""
+        from db.keywords import classify_message
+        
+        keywords = classify_message("¡Correcto! El Costo y los riesgos del 180 preguntas: siguiente pregunta.")
+        assert keywords.topics == {'cost', 'costo', 'riesgo'}
+        assert keywords.question and not keywords.completion
+        assert keywords.exam_type == 'completo'
+        assert keywords.verdict == 'correcto'
+        
+        keywords = classify_message("Incorrecto: un sobrecosto no es parte del proceso de riesgo.")
+        assert keywords.verdict == 'incorrecto'
+        assert keywords.topics == {'proceso', 'riesgo'}
+        assert classify_message("Resultado del people domain").exam_type == 'por_dominio'
+        assert classify_message("Resultado del people domain").completion
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_analytics_query_count_is_constant(self, db_manager, sample_user):
+        """La cantidad de consultas no crece con el número de sesiones."""
+        def add_sessions(count):
+            for i in range(count):
+                for mode in ("charlemos", "evaluemos", "simulemos"):
+                    session = db_manager.create_chat_session(sample_user.id, f"{mode} {i}", mode)
+                    db_manager.add_message(session.id, "user", "Pregunta")
+                    db_manager.add_message(session.id, "assistant", "Respuesta")
+        
+        add_sessions(2)
+        few = self._count_queries(db_manager, lambda: db_manager.get_user_analytics_data(sample_user.id))
+        add_sessions(8)
+        many = self._count_queries(db_manager, lambda: db_manager.get_user_analytics_data(sample_user.id))
+        
+        assert few == many > 0
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_streak_and_patterns_use_local_days(self, db_manager, sample_user):
+        """Racha, horarios y días de la semana se cuentan en hora local (GMT-3)."""
+        created = [
+            datetime(2024, 3, 2, 23, 30, tzinfo=GMT_MINUS_3),  # sábado; domingo 02:30 en UTC
+            datetime(2024, 3, 3, 10, 0, tzinfo=GMT_MINUS_3),
+            datetime(2024, 3, 4, 22, 15, tzinfo=GMT_MINUS_3),
+            datetime(2024, 3, 4, 22, 45, tzinfo=GMT_MINUS_3),
+        ]
+        for n, created_at in enumerate(created):
+            session = db_manager.create_chat_session(sample_user.id, f"Sesión {n}", "evaluemos")
+            with db_manager.get_session() as db:
+                db.query(ChatSession).filter(ChatSession.id == session.id).update({ChatSession.created_at: created_at})
+                db.commit()
+        # Las fechas se cambiaron por fuera de DatabaseManager: recalcular el resumen diario
+        db_manager.rebuild_daily_activity([sample_user.id])
+        
+        analytics = db_manager.get_user_analytics_data(sample_user.id)
+        
+        assert analytics['overview']['study_streak_days'] == 3
+        patterns = analytics['study_patterns']
+        assert patterns['hour_distribution'] == {23: 1, 10: 1, 22: 2}
+        assert patterns['best_study_hour'] == 22
+        assert list(patterns['day_distribution'].values()) == [1, 1, 2]
+        trends = analytics['progress_trends']
+        assert (trends['first_session_date'], trends['latest_session_date']) == ('2024-03-02', '2024-03-04')
+        assert trends['session_frequency']['days_span'] == 1  # 47 h entre la primera y la última
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_window_limits_every_section_and_compares(self, db_manager, sample_user):
+        """Las cifras por sesión cuentan las sesiones creadas en la ventana; respuestas y mensajes, su propia fecha."""
+        from db.attempts import AttemptVerdict
+        from db.models import PendingTurn
+        
+        march = datetime(2024, 3, 4, 10, 0, tzinfo=GMT_MINUS_3)
+        old = db_manager.create_chat_session(sample_user.id, "Febrero", "evaluemos")
+        recent = db_manager.create_chat_session(sample_user.id, "Marzo", "evaluemos")
+        for session, created_at, verdicts in ((old, march - timedelta(days=7), (True, True)),
+                                              (recent, march, (True, False, False))):
+            db_manager.add_turns([
+                PendingTurn(session.id, "Respuesta", "Corrección", created_at + timedelta(minutes=n),
+                            created_at + timedelta(minutes=n, seconds=30), (AttemptVerdict(correct, 'process'),))
+                for n, correct in enumerate(verdicts)
+            ])
+        # La sesión de febrero sigue en uso dentro de la ventana
+        db_manager.add_turns([PendingTurn(old.id, "Respuesta", "Corrección", march + timedelta(hours=1),
+                                          march + timedelta(hours=1, seconds=30), (AttemptVerdict(False, 'process'),))])
+        for session, created_at in ((old, march - timedelta(days=7)), (recent, march)):
+            with db_manager.get_session() as db:
+                db.query(ChatSession).filter(ChatSession.id == session.id).update({ChatSession.created_at: created_at})
+                db.commit()
+        db_manager.rebuild_daily_activity([sample_user.id])
+        
+        since = datetime(2024, 3, 4, tzinfo=GMT_MINUS_3)
+        analytics = db_manager.get_user_analytics_data(sample_user.id, since=since,
+                                                       until=since + timedelta(days=7), compare=True)
+        
+        # Las cifras por sesión cuentan solo la sesión creada en la ventana...
+        assert analytics['window']['since'] == since
+        assert analytics['overview']['total_sessions'] == 1
+        assert analytics['overview']['total_messages'] == 6
+        assert [d['session_name'] for d in analytics['evaluations']['sessions_detail']] == ["Marzo"]
+        # ...y las respuestas y mensajes, también los de la sesión de febrero dados en la ventana
+        assert analytics['overview']['active_messages'] == 8
+        assert analytics['overview']['active_days'] == 1
+        assert analytics['question_accuracy']['total_attempts'] == 4
+        comparison = analytics['comparison']
+        assert comparison['previous_window']['since'] == since - timedelta(days=7)
+        assert comparison['previous']['sessions_created'] == 1
+        assert comparison['previous']['accuracy_percent'] == 100.0
+        assert comparison['change']['questions_answered'] == 2
+        assert comparison['current']['accuracy_percent'] == 25
+        assert comparison['change']['accuracy_percent'] == -75
+        # Sin ventana, la historia completa y sin comparación
+        lifetime = db_manager.get_user_analytics_data(sample_user.id)
+        assert lifetime['overview']['total_sessions'] == 2 and 'comparison' not in lifetime
+        assert lifetime['window'] == {'since': None, 'until': None}
+        
+        # Sin until, la anterior termina en since y dura hasta el fin de hoy: se reutiliza
+        open_ended = db_manager.get_user_analytics_data(sample_user.id, since=since, compare=True)
+        assert open_ended['comparison']['previous_window']['until'] == since
+        cache = db_manager._engine_entry.analytics_cache
+        hits = cache.hits
+        db_manager.get_user_analytics_data(sample_user.id, since=since, compare=True)
+        assert cache.hits == hits + 2
+        
+        with pytest.raises(ValueError):
+            db_manager.get_user_analytics_data(sample_user.id, since=since, until=since)
+        with pytest.raises(ValueError):
+            db_manager.get_user_analytics_data(sample_user.id, compare=True)
+
+class TestSessionStats:
+    """Tests para las estadísticas incrementales por sesión."""
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_add_message_updates_stats(self, db_manager, sample_chat_session):
+        """add_message mantiene conteos, fechas y aciertos de la sesión."""
+        from db.models import SessionStats
+        
+        db_manager.add_message(sample_chat_session.id, "user", "Mi respuesta es la B")
+        db_manager.add_message(sample_chat_session.id, "assistant", "¡Correcto! Muy bien.")
+        db_manager.add_message(sample_chat_session.id, "user", "Siguiente pregunta")
+        
+        with db_manager.get_session() as db:
+            stats = db.get(SessionStats, sample_chat_session.id)
+            assert stats.message_count == 3
+            assert stats.user_message_count == 2
+            assert stats.correct_count == 1
+            assert stats.incorrect_count == 0
+            assert stats.first_ts <= stats.last_ts
+            assert stats.active_seconds >= 0
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_incorrect_answer_is_not_counted_as_correct(self):
+        """'incorrecto' cuenta como error aunque contenga 'correcto'."""
+        from db.models import SessionStats
+        
+        stats = SessionStats(session_id=1)
+        start = datetime(2024, 1, 1, 10, 0)
+        stats.apply_message("assistant", "Incorrecto. La opción correcta es la C.", start)
+        stats.apply_message("assistant", "¡Correcto! No era incorrecto.", start)
+        stats.apply_message("assistant", "Las respuestas correctas se verán al final.", start)
+        
+        assert stats.correct_count == 1
+        assert stats.incorrect_count == 1
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_active_seconds_caps_long_pauses(self):
+        """Las pausas mayores a 10 minutos se cuentan como 10 minutos."""
+        from db.models import SessionStats, SESSION_GAP_CAP_SECONDS
+        
+        stats = SessionStats(session_id=1)
+        start = datetime(2024, 1, 1, 10, 0)
+        stats.apply_message("user", "Hola", start)
+        stats.apply_message("assistant", "Hola", start + timedelta(minutes=2))
+        stats.apply_message("user", "Vuelvo", start + timedelta(hours=3))
+        
+        assert stats.active_seconds == 120 + SESSION_GAP_CAP_SECONDS
+        assert stats.message_count == 3
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_backfill_resumes_from_watermark(self, db_manager, sample_user):
+        """El backfill procesa en lotes, guarda la marca de agua y termina una sola vez."""
+        from db.models import SessionStats, MaintenanceState
+        
+        sessions = [db_manager.create_chat_session(sample_user.id, f"S{i}") for i in range(5)]
+        for session in sessions:
+            db_manager.add_message(session.id, "user", "Pregunta")
+            db_manager.add_message(session.id, "assistant", "¡Correcto!")
+        
+        # Simular una base de datos previa a session_stats
+        with db_manager.get_session() as db:
+            db.query(SessionStats).delete()
+            db.query(MaintenanceState).delete()
+            db.commit()
+        
+        progress = []
+        processed = db_manager.backfill_session_stats(batch_size=2, progress=progress.append)
+        
+        assert processed == 5
+        assert progress == [2, 4, 5]
+        assert db_manager.backfill_session_stats() == 0
+        with db_manager.get_session() as db:
+            stats = db.get(SessionStats, sessions[0].id)
+            assert stats.message_count == 2
+            assert stats.correct_count == 1
+            assert db.get(MaintenanceState, db_manager.SESSION_STATS_BACKFILL_KEY).value == 'done'
+
+class TestDailyActivity:
+    """Tests para el resumen de actividad por día y modo (daily_activity)."""
+    
+    @staticmethod
+    def _day(value) -> int:
+        from datetime import date
+        return (value - date(1970, 1, 1)).days
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_rollup_follows_writes_and_matches_rebuild(self, db_manager, sample_user):
+        """Cada mensaje suma en su día local con la pausa que lo precede; el recálculo da lo mismo."""
+        from datetime import date
+        from db.models import DailyActivity, PendingTurn
+        
+        session = db_manager.create_chat_session(sample_user.id, "Repaso", "evaluemos")
+        db_manager.add_turns([
+            PendingTurn(session.id, "Pregunta", "Respuesta",
+                        datetime(2024, 3, 4, 10, 0, tzinfo=GMT_MINUS_3), datetime(2024, 3, 4, 10, 0, 30, tzinfo=GMT_MINUS_3)),
+            # 23:55 del lunes y 00:05 del martes en hora local (ya martes en UTC)
+            PendingTurn(session.id, "Otra", "Respuesta",
+                        datetime(2024, 3, 4, 23, 55, tzinfo=GMT_MINUS_3), datetime(2024, 3, 5, 0, 5, tzinfo=GMT_MINUS_3)),
+        ])
+        
+        def rows():
+            with db_manager.get_session() as db:
+                return [(a.day, a.mode, a.sessions, a.messages, a.active_seconds)
+                        for a in db.query(DailyActivity).filter_by(user_id=sample_user.id).order_by(DailyActivity.day)]
+        
+        today = self._day(db_manager.get_chat_session(session.id).created_at.astimezone(GMT_MINUS_3).date())
+        expected = [
+            (self._day(date(2024, 3, 4)), 'evaluemos', 0, 3, 30 + 600),
+            (self._day(date(2024, 3, 5)), 'evaluemos', 0, 1, 600),
+            (today, 'evaluemos', 1, 0, 0),
+        ]
+        assert rows() == expected
+        assert db_manager.rebuild_daily_activity([sample_user.id]) == 1
+        assert rows() == expected
+        
+        # Eliminar la sesión no borra lo estudiado
+        db_manager.delete_chat_session(session.id)
+        assert rows() == expected
+        assert db_manager.get_user_analytics_data(sample_user.id)['weekly_activity']['this_week']['sessions'] == 1
+    
+    @pytest.mark.unit
+    def test_weekly_activity_and_streak(self):
+        """Semanas de lunes a domingo contadas desde hoy, promedio desde la primera actividad y racha."""
+        from datetime import date
+        from db.analytics import ActivityDays, UserAnalyticsMixin
+        
+        activity = ActivityDays.from_rows([
+            (self._day(date(2024, 2, 21)), 1, 0, 0.0),
+            (self._day(date(2024, 3, 3)), 2, 6, 3600.0),   # domingo
+            (self._day(date(2024, 3, 4)), 1, 4, 1800.0),   # lunes, en dos modos
+            (self._day(date(2024, 3, 4)), 1, 2, 600.0),
+        ])
+        analytics = UserAnalyticsMixin()
+        
+        weekly = analytics._calculate_weekly_activity(activity, today=self._day(date(2024, 3, 6)))
+        
+        assert weekly['this_week'] == {'week_start': '2024-03-04', 'sessions': 2, 'messages': 6,
+                                       'active_hours': 0.7, 'active_days': 1}
+        assert weekly['last_week'] == {'week_start': '2024-02-26', 'sessions': 2, 'messages': 6,
+                                       'active_hours': 1.0, 'active_days': 1}
+        assert weekly['weeks'][2]['sessions'] == 1 and len(weekly['weeks']) == 8
+        assert weekly['sessions_per_week'] == round(5 / 3, 1)
+        assert weekly['daily_history'][0] == {'date': '2024-02-21', 'sessions': 1, 'messages': 0, 'active_minutes': 0}
+        assert analytics._calculate_study_streak(activity) == 2
+        assert analytics._calculate_weekly_activity(ActivityDays.from_rows([]), 0)['has_data'] is False
+
+class TestQuestionAttempts:
+    """Tests para los veredictos estructurados de EVALUEMOS y SIMULEMOS."""
+    
+    @pytest.mark.unit
+    def test_parse_verdicts(self):
+        """Los bloques se quitan del texto; los válidos se normalizan y los mal formados se descartan."""
+        from db.attempts import AttemptVerdict, parse_verdicts
+        
+        response = (
+            "¡Correcto! La respuesta es B.\n"
+            '[VEREDICTO]{"domain": "Process", "topic": " Riesgo ", "difficulty": "ALTA", "is_correct": true}[/VEREDICTO]\n'
+            '[VEREDICTO]```json {"domain": "finanzas", "is_correct": false}```[/VEREDICTO]\n'
+            '[VEREDICTO]{"domain": "people", "is_correct": "sí"}[/VEREDICTO]'
+        )
+        text, verdicts = parse_verdicts(response)
+        
+        assert text == "¡Correcto! La respuesta es B."
+        assert verdicts == [AttemptVerdict(True, 'process', 'riesgo', 'alta'), AttemptVerdict(False)]
+        assert parse_verdicts("Sin bloques [nota]") == ("Sin bloques [nota]", [])
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_recorded_verdicts_drive_accuracy(self, db_manager, sample_user):
+        """Las sesiones con veredictos toman los aciertos de question_attempts, no del texto."""
+        from db.attempts import AttemptVerdict
+        
+        recorded = db_manager.create_chat_session(sample_user.id, "Con veredictos", "evaluemos")
+        db_manager.add_turn(recorded.id, "Respuesta: A", "Muy bien, es correcto.", verdicts=[
+            AttemptVerdict(True, 'people', 'interesados', 'media'),
+            AttemptVerdict(False, 'process', 'riesgo', 'alta'),
+        ])
+        db_manager.add_turn(recorded.id, "Respuesta: C", "Revisemos.", verdicts=[AttemptVerdict(True, 'process', 'riesgo')])
+        legacy = db_manager.create_chat_session(sample_user.id, "Anterior", "evaluemos")
+        db_manager.add_message(legacy.id, "assistant", "Incorrecto, era la D.")
+        
+        analytics = db_manager.get_user_analytics_data(sample_user.id)
+        
+        detail = {d['session_name']: d for d in analytics['evaluations']['sessions_detail']}
+        assert detail["Con veredictos"]['answers_recorded']
+        assert (detail["Con veredictos"]['questions_attempted'], detail["Con veredictos"]['correct_answers'],
+                detail["Con veredictos"]['accuracy_percent']) == (3, 2, 66)
+        assert 'Interesados' in detail["Con veredictos"]['topics_covered']
+        assert not detail["Anterior"]['answers_recorded']
+        assert detail["Anterior"]['incorrect_answers'] == 1
+        
+        accuracy = analytics['question_accuracy']
+        assert (accuracy['total_attempts'], accuracy['correct_answers']) == (3, 2)
+        assert accuracy['by_domain'] == [
+            {'name': 'process', 'attempts': 2, 'correct': 1, 'accuracy_percent': 50},
+            {'name': 'people', 'attempts': 1, 'correct': 1, 'accuracy_percent': 100},
+        ]
+        assert [group['name'] for group in accuracy['by_difficulty']] == ['alta', 'media', 'sin_clasificar']
+        
+        db_manager.delete_chat_session(recorded.id)
+        assert db_manager.get_user_analytics_data(sample_user.id)['question_accuracy']['has_data'] is False
+
+class TestAddTurn:
+    """Tests para el guardado de turnos completos."""
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_add_turn_single_transaction(self, db_manager, sample_chat_session):
+        """add_turn guarda pregunta, respuesta y estadísticas con un único commit."""
+        from sqlalchemy import event
+        from db.models import SessionStats
+        
+        commits = []
+        listener = lambda conn: commits.append(conn)
+        event.listen(db_manager.engine, "commit", listener)
+        try:
+            db_manager.add_turn(sample_chat_session.id, "¿Qué es el WBS?", "Es la EDT del proyecto.")
+        finally:
+            event.remove(db_manager.engine, "commit", listener)
+        
+        assert len(commits) == 1
+        assert db_manager.get_session_messages(sample_chat_session.id) == [
+            ("user", "¿Qué es el WBS?"),
+            ("assistant", "Es la EDT del proyecto."),
+        ]
+        with db_manager.get_session() as db:
+            stats = db.get(SessionStats, sample_chat_session.id)
+            assert stats.message_count == 2
+            assert stats.user_message_count == 1
+            session = db.get(ChatSession, sample_chat_session.id)
+            assert session.last_used_at >= sample_chat_session.last_used_at
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_add_turn_keeps_user_timestamp(self, db_manager, sample_chat_session):
+        """La pregunta conserva el momento en que se envió."""
+        sent_at = datetime(2024, 1, 1, 10, 0, tzinfo=GMT_MINUS_3)
+        db_manager.add_turn(sample_chat_session.id, "Pregunta", "Respuesta", user_timestamp=sent_at)
+        
+        with db_manager.get_session() as db:
+            question = db.query(ChatMessage).filter(ChatMessage.role == "user").one()
+            assert question.timestamp == sent_at
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_turns_in_the_same_millisecond_keep_their_order(self, db_manager, sample_user):
+        """Las analíticas leen los mensajes de igual timestamp en el orden en que se guardaron."""
+        from db.models import PendingTurn
+        session = db_manager.create_chat_session(sample_user.id, "Evaluación", "evaluemos")
+        sent_at = datetime(2024, 1, 1, 10, 0, tzinfo=GMT_MINUS_3)
+        db_manager.add_turns([PendingTurn(session.id, f"Pregunta {n}", f"Respuesta {n}", sent_at, sent_at, ())
+                              for n in range(5)])
+        
+        with db_manager.read_engine.connect() as conn:
+            rows = db_manager._load_messages_for_modes(conn, sample_user.id, ("evaluemos",))[session.id]
+        assert [(row.role, row.content) for row in rows] == db_manager.get_session_messages(session.id)
+        assert rows[0].content == "Pregunta 0" and rows[-1].content == "Respuesta 4"
+
+class TestMessageWriter:
+    """Tests para el escritor de mensajes en segundo plano."""
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_flush_persists_submitted_turns(self, db_manager, sample_chat_session):
+        """flush espera a que todos los turnos encolados estén guardados."""
+        from db.writer import MessageWriter
+        
+        writer = MessageWriter(db_manager)
+        try:
+            for i in range(5):
+                writer.submit_turn(sample_chat_session.id, f"Pregunta {i}", f"Respuesta {i}")
+            writer.flush()
+            assert writer.pending == 0
+        finally:
+            writer.close()
+        
+        messages = db_manager.get_session_messages(sample_chat_session.id)
+        assert len(messages) == 10
+        assert messages[0] == ("user", "Pregunta 0")
+        assert messages[-1] == ("assistant", "Respuesta 4")
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_pending_turns_are_grouped(self, db_manager, sample_chat_session):
+        """Los turnos acumulados durante una escritura se guardan en un solo lote."""
+        import threading
+        from db.writer import MessageWriter
+        
+        release = threading.Event()
+        batches = []
+        original_add_turns = db_manager.add_turns
+        
+        def slow_add_turns(turns):
+            batches.append(len(turns))
+            release.wait(5)
+            original_add_turns(turns)
+        
+        writer = MessageWriter(db_manager)
+        try:
+            with patch.object(db_manager, "add_turns", side_effect=slow_add_turns):
+                writer.submit_turn(sample_chat_session.id, "Primera", "Respuesta")
+                while not batches:
+                    threading.Event().wait(0.01)
+                for i in range(3):
+                    writer.submit_turn(sample_chat_session.id, f"Pregunta {i}", "Respuesta")
+                release.set()
+                writer.flush()
+        finally:
+            writer.close()
+        
+        assert batches == [1, 3]
+        assert len(db_manager.get_session_messages(sample_chat_session.id)) == 8
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_close_flushes_and_rejects_new_turns(self, db_manager, sample_chat_session):
+        """close guarda lo pendiente y luego no acepta más turnos."""
+        from db.writer import MessageWriter
+        
+        writer = MessageWriter(db_manager)
+        writer.submit_turn(sample_chat_session.id, "Pregunta", "Respuesta")
+        writer.close()
+        
+        assert len(db_manager.get_session_messages(sample_chat_session.id)) == 2
+        with pytest.raises(RuntimeError):
+            writer.submit_turn(sample_chat_session.id, "Otra", "Respuesta")
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_failed_turns_are_retried_and_reported(self, db_manager, sample_chat_session):
+        """Un turno que no se pudo guardar se retiene, se informa al llamar a flush y se reintenta."""
+        from db.writer import MessageWriter, MessageWriteError
+        
+        original_add_turns = db_manager.add_turns
+        writer = MessageWriter(db_manager)
+        try:
+            with patch.object(db_manager, "add_turns", side_effect=RuntimeError("disco lleno")):
+                writer.submit_turn(sample_chat_session.id, "Pregunta", "Respuesta")
+                with pytest.raises(MessageWriteError) as failure:
+                    writer.flush()
+                assert not failure.value.lost
+                assert [turn.user_message for turn in failure.value.turns] == ["Pregunta"]
+                assert writer.pending == 1
+            
+            with patch.object(db_manager, "add_turns", side_effect=original_add_turns):
+                writer.flush()
+            assert writer.pending == 0
+        finally:
+            writer.close()
+        
+        assert len(db_manager.get_session_messages(sample_chat_session.id)) == 2
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_close_reports_lost_turns(self, db_manager, sample_chat_session):
+        """close hace un último intento y entrega los turnos que no se pudieron guardar."""
+        from db.writer import MessageWriter, MessageWriteError
+        
+        writer = MessageWriter(db_manager)
+        with patch.object(db_manager, "add_turns", side_effect=RuntimeError("disco lleno")) as add_turns:
+            writer.submit_turn(sample_chat_session.id, "Pregunta", "Respuesta")
+            with pytest.raises(MessageWriteError):
+                writer.flush()
+            with pytest.raises(MessageWriteError) as failure:
+                writer.close()
+        
+        assert failure.value.lost and len(failure.value.turns) == 1
+        assert add_turns.call_count == 2
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_reads_wait_for_shared_writer(self, db_manager, sample_chat_session):
+        """Las lecturas del historial ven los turnos encolados en el escritor compartido."""
+        writer = db_manager.get_message_writer()
+        assert DatabaseManager(str(db_manager.engine.url)).get_message_writer() is writer
+        
+        writer.submit_turn(sample_chat_session.id, "Pregunta", "Respuesta")
+        assert len(db_manager.get_session_messages(sample_chat_session.id)) == 2
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_reads_leave_failures_to_flush_pending_writes(self, db_manager, sample_user, sample_chat_session):
+        """Las lecturas esperan al escritor sin consumir el aviso de fallo, que llega a flush_pending_writes."""
+        from db.writer import MessageWriteError
+        
+        writer = db_manager.get_message_writer()
+        with patch.object(writer.db_manager, "add_turns", side_effect=RuntimeError("disco lleno")):
+            writer.submit_turn(sample_chat_session.id, "Pregunta", "Respuesta")
+            assert db_manager.get_user_sessions(sample_user.id)
+            assert db_manager.get_session_messages(sample_chat_session.id) == []
+            assert db_manager.get_session_messages_page(sample_chat_session.id) == []
+            with pytest.raises(MessageWriteError) as failure:
+                db_manager.flush_pending_writes()
+        assert not failure.value.lost
+        
+        db_manager.flush_pending_writes()
+        assert len(db_manager.get_session_messages(sample_chat_session.id)) == 2
+
+class TestSessionSummary:
+    """Tests para el resumen del sidebar guardado en chat_sessions."""
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_add_message_updates_summary(self, db_manager, sample_chat_session):
+        """add_message y add_turn mantienen preview, último rol y cantidad de mensajes."""
+        from db.models import SESSION_PREVIEW_LENGTH
+        
+        db_manager.add_message(sample_chat_session.id, "user", "Hola")
+        db_manager.add_turn(sample_chat_session.id, "¿Qué es el PMBOK?", "x" * 500)
+        
+        session = db_manager.get_user_sessions(sample_chat_session.user_id)[0]
+        assert session.message_count == 3
+        assert session.last_role == "assistant"
+        assert session.last_message_preview == "x" * SESSION_PREVIEW_LENGTH
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_new_session_has_empty_summary(self, db_manager, sample_chat_session):
+        """Una sesión nueva no tiene preview y cuenta cero mensajes."""
+        session = db_manager.get_user_sessions(sample_chat_session.user_id)[0]
+        assert session.message_count == 0
+        assert session.last_message_preview is None
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_backfill_summaries_from_messages(self, db_manager, sample_user):
+        """El backfill reconstruye el resumen de sesiones anteriores a las columnas."""
+        from db.models import MaintenanceState
+        
+        first = db_manager.create_chat_session(sample_user.id, "Primera")
+        second = db_manager.create_chat_session(sample_user.id, "Segunda")
+        db_manager.add_turn(first.id, "Pregunta", "Respuesta final")
+        db_manager.add_message(second.id, "user", "Solo pregunta")
+        
+        with db_manager.get_session() as db:
+            db.query(ChatSession).update({
+                ChatSession.last_message_preview: None,
+                ChatSession.last_role: None,
+                ChatSession.message_count: 0,
+            })
+            db.query(MaintenanceState).delete()
+            db.commit()
+        
+        assert db_manager.backfill_session_summaries(batch_size=1) == 2
+        assert db_manager.backfill_session_summaries() == 0
+        with db_manager.get_session() as db:
+            first_row = db.get(ChatSession, first.id)
+            assert (first_row.last_message_preview, first_row.last_role, first_row.message_count) == \
+                ("Respuesta final", "assistant", 2)
+            second_row = db.get(ChatSession, second.id)
+            assert (second_row.last_message_preview, second_row.last_role, second_row.message_count) == \
+                ("Solo pregunta", "user", 1)
+
+class TestMessageSearch:
+    """Tests para la búsqueda de texto completo en el historial."""
+    
+    @pytest.fixture
+    def evaluation_session(self, db_manager, sample_user):
+        session = db_manager.create_chat_session(sample_user.id, "Riesgos", "evaluemos")
+        db_manager.add_turn(session.id, "¿Qué es la gestión de riesgos?", "Es el proceso de identificar y analizar riesgos.")
+        db_manager.add_turn(session.id, "¿Y el cronograma?", "El cronograma ordena las actividades.")
+        return session
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_search_returns_ranked_snippets(self, db_manager, sample_user, evaluation_session):
+        """Los resultados traen sesión, modo y fragmento con los términos resaltados."""
+        results = db_manager.search_messages(sample_user.id, "riesgos")
+        
+        assert len(results) == 2
+        assert {r.session_id for r in results} == {evaluation_session.id}
+        assert all(r.mode == "evaluemos" and r.session_name == "Riesgos" for r in results)
+        assert all("[riesgos]" in r.snippet for r in results)
+        assert results[0].rank <= results[1].rank
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_search_ignores_accents_and_matches_prefix(self, db_manager, sample_user, evaluation_session):
+        """'gestion' encuentra 'gestión' y la última palabra se busca como prefijo."""
+        assert len(db_manager.search_messages(sample_user.id, "gestion")) == 1
+        assert len(db_manager.search_messages(sample_user.id, "cronog")) == 2
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_search_filters_by_user_and_mode(self, db_manager, sample_user, evaluation_session):
+        """No aparecen mensajes de otros usuarios ni de otros modos."""
+        other_user = db_manager.create_user("otro", "otro@example.com", "OtroPass123")
+        other_session = db_manager.create_chat_session(other_user.id, "Ajena", "evaluemos")
+        db_manager.add_message(other_session.id, "user", "riesgos del otro usuario")
+        
+        assert len(db_manager.search_messages(sample_user.id, "riesgos")) == 2
+        assert db_manager.search_messages(sample_user.id, "riesgos", mode="charlemos") == []
+        assert len(db_manager.search_messages(sample_user.id, "riesgos", mode="evaluemos")) == 2
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_search_paginates(self, db_manager, sample_user, evaluation_session):
+        """limit y offset recorren los resultados sin repetir."""
+        first = db_manager.search_messages(sample_user.id, "riesgos", limit=1)
+        second = db_manager.search_messages(sample_user.id, "riesgos", limit=1, offset=1)
+        assert len(first) == len(second) == 1
+        assert first[0].message_id != second[0].message_id
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_search_treats_operators_as_text(self, db_manager, sample_user, evaluation_session):
+        """Comillas, asteriscos u operadores de FTS5 no producen errores de sintaxis."""
+        assert len(db_manager.search_messages(sample_user.id, '"riesgos" (analizar* -')) == 1
+        assert db_manager.search_messages(sample_user.id, '*** ""') == []
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_search_only_reads(self, db_manager, sample_user, evaluation_session):
+        """Los mensajes quedan indexados al guardarse y la búsqueda no usa la conexión de escritura."""
+        from sqlalchemy import event
+        
+        assert not db_manager.has_pending_search_index()
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db_manager.engine, "before_cursor_execute", listener)
+        try:
+            assert len(db_manager.search_messages(sample_user.id, "riesgos")) == 2
+        finally:
+            event.remove(db_manager.engine, "before_cursor_execute", listener)
+        assert statements == []
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_index_keeps_no_copy_of_the_text(self, db_manager, sample_user, evaluation_session):
+        """El índice no guarda el texto (content=''); borrar sesiones lo quita del índice en la misma transacción."""
+        from db.models import SEARCH_INDEX_TABLE
+        
+        with db_manager.engine.connect() as conn:
+            tables = set(conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'").scalars())
+        assert f"{SEARCH_INDEX_TABLE}_content" not in tables
+        
+        db_manager.delete_chat_session(evaluation_session.id)
+        assert not db_manager.has_pending_search_index()
+        with db_manager.engine.begin() as conn:
+            conn.exec_driver_sql(f"INSERT INTO {SEARCH_INDEX_TABLE}({SEARCH_INDEX_TABLE}) VALUES ('integrity-check')")
+            assert conn.exec_driver_sql(f"SELECT COUNT(*) FROM {SEARCH_INDEX_TABLE}_docsize").scalar() == 0
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_reused_message_ids_drop_the_old_text(self, db_manager, sample_user, evaluation_session):
+        """Si SQLite reutiliza el ID de un mensaje borrado por otra conexión, el texto anterior sale del índice."""
+        import sqlite3
+        
+        conn = sqlite3.connect(db_manager.engine.url.database)
+        try:
+            last_id = conn.execute("SELECT MAX(id) FROM chat_messages").fetchone()[0]
+            conn.execute("DELETE FROM chat_messages WHERE id = ?", (last_id,))
+            conn.commit()
+        finally:
+            conn.close()
+        
+        message = db_manager.add_message(evaluation_session.id, "user", "Hablemos de adquisiciones.")
+        assert message.id == last_id
+        assert db_manager.search_messages(sample_user.id, "actividades") == []
+        assert [r.message_id for r in db_manager.search_messages(sample_user.id, "adquisiciones")] == [last_id]
+        assert not db_manager.has_pending_search_index()
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_index_follows_updates_and_deletes(self, db_manager, sample_user, evaluation_session):
+        """Los borrados salen del índice al instante; las ediciones esperan en la cola al mantenimiento."""
+        with db_manager.get_session() as db:
+            message = db.query(ChatMessage).filter(ChatMessage.content.like("%cronograma ordena%")).one()
+            message.content = "La línea base de costos se aprueba."
+            db.query(ChatMessage).filter(ChatMessage.role == "user").delete()
+            db.commit()
+        
+        assert len(db_manager.search_messages(sample_user.id, "riesgos")) == 1
+        # La búsqueda solo lee: no indexa la cola
+        assert db_manager.search_messages(sample_user.id, "costos") == []
+        assert db_manager.has_pending_search_index()
+        
+        # Dos borrados y la edición (texto anterior fuera, texto nuevo dentro)
+        assert db_manager.index_pending_messages() == 4
+        assert not db_manager.has_pending_search_index()
+        assert len(db_manager.search_messages(sample_user.id, "cronograma")) == 0
+        assert len(db_manager.search_messages(sample_user.id, "costos")) == 1
+        assert len(db_manager.search_messages(sample_user.id, "riesgos")) == 1
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_other_connections_can_write_messages(self, db_manager, sample_user, evaluation_session):
+        """Una conexión sin las funciones de DatabaseManager escribe y borra mensajes; la búsqueda los ve."""
+        import sqlite3
+        from db.models import compress_content
+        
+        long_reply = "Plan de adquisiciones y contratos. " * 50
+        conn = sqlite3.connect(db_manager.engine.url.database)
+        try:
+            conn.executemany(
+                "INSERT INTO chat_messages (session_id, role, content, timestamp) VALUES (?, 'assistant', ?, 0)",
+                [(evaluation_session.id, "Las adquisiciones se planifican."),
+                 (evaluation_session.id, compress_content(long_reply))]
+            )
+            conn.execute("DELETE FROM chat_messages WHERE content LIKE '%cronograma ordena%'")
+            conn.commit()
+        finally:
+            conn.close()
+        
+        assert len(db_manager.search_messages(sample_user.id, "cronograma")) == 1
+        assert db_manager.index_pending_messages(batch_size=1) == 3
+        assert len(db_manager.search_messages(sample_user.id, "adquisiciones")) == 2
+        assert len(db_manager.search_messages(sample_user.id, "contratos")) == 1
+        assert len(db_manager.search_messages(sample_user.id, "cronograma")) == 1
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_existing_database_gets_index(self, db_manager, sample_user, evaluation_session):
+        """Una base con el índice anterior (con copia del texto) recibe el índice nuevo con los mensajes existentes."""
+        from db.models import SEARCH_INDEX_TABLE
+        
+        with db_manager.engine.begin() as conn:
+            conn.exec_driver_sql(f"DROP TABLE {SEARCH_INDEX_TABLE}")
+            for name in ("insert", "delete", "update"):
+                conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS chat_messages_fts_{name}")
+            conn.exec_driver_sql(f"CREATE VIRTUAL TABLE {SEARCH_INDEX_TABLE} USING fts5(content)")
+        
+        db_manager._ensure_search_index()
+        with db_manager.engine.connect() as conn:
+            definition = conn.exec_driver_sql(
+                f"SELECT sql FROM sqlite_master WHERE name = '{SEARCH_INDEX_TABLE}'"
+            ).scalar()
+        assert "content=''" in definition
+        assert len(db_manager.search_messages(sample_user.id, "riesgos")) == 2
+        
+        db_manager.rebuild_search_index()
+        assert len(db_manager.search_messages(sample_user.id, "riesgos")) == 2
+
+class TestMessageCompression:
+    """Tests para la compresión transparente del contenido de los mensajes."""
+    
+    LONG_REPLY = "## Gestión de riesgos\n\n" + "- Identificar, analizar y responder a los riesgos del proyecto.\n" * 60
+    
+    def stored_type(self, db_manager, message_id):
+        with db_manager.engine.connect() as conn:
+            return conn.execute(
+                text("SELECT typeof(content) FROM chat_messages WHERE id = :id"), {"id": message_id}
+            ).scalar()
+    
+    @pytest.mark.unit
+    def test_round_trip_and_threshold(self):
+        """Solo se comprimen los textos largos y la lectura devuelve el original."""
+        from db.models import compress_content, decompress_content
+        
+        assert compress_content("Hola") == "Hola"
+        compressed = compress_content(self.LONG_REPLY)
+        assert isinstance(compressed, bytes) and compressed[0] == 0x01
+        assert len(compressed) < len(self.LONG_REPLY)
+        assert decompress_content(compressed) == self.LONG_REPLY
+        assert decompress_content("Hola") == "Hola"
+        with pytest.raises(ValueError):
+            decompress_content(b"\x7fdatos")
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_long_messages_are_stored_compressed(self, db_manager, sample_chat_session):
+        """Los mensajes largos se guardan como BLOB y se leen como texto."""
+        db_manager.add_turn(sample_chat_session.id, "¿Qué son los riesgos?", self.LONG_REPLY)
+        
+        page = db_manager.get_session_messages_page(sample_chat_session.id)
+        (user_id, _, user_text), (assistant_id, _, assistant_text) = page
+        assert assistant_text == self.LONG_REPLY
+        assert self.stored_type(db_manager, assistant_id) == "blob"
+        assert self.stored_type(db_manager, user_id) == "text"
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_search_and_summary_read_compressed_messages(self, db_manager, sample_user, sample_chat_session):
+        """El índice de búsqueda y el resumen del sidebar ven el texto descomprimido."""
+        db_manager.add_turn(sample_chat_session.id, "Pregunta", self.LONG_REPLY)
+        assert len(db_manager.search_messages(sample_user.id, "analizar")) == 1
+        
+        db_manager.rebuild_session_summaries([sample_chat_session.id])
+        session = db_manager.get_chat_session(sample_chat_session.id)
+        assert session.last_message_preview == self.LONG_REPLY[:100]
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_compress_messages_migrates_existing_rows(self, db_manager, sample_user, sample_chat_session):
+        """compress_messages comprime en lotes los mensajes guardados como TEXT."""
+        with db_manager.engine.begin() as conn:
+            for i in range(3):
+                conn.execute(
+                    text("INSERT INTO chat_messages (session_id, role, content, timestamp) "
+                         "VALUES (:sid, 'assistant', :content, CURRENT_TIMESTAMP)"),
+                    {"sid": sample_chat_session.id, "content": self.LONG_REPLY}
+                )
+        
+        assert db_manager.compress_messages(batch_size=2) == 3
+        assert db_manager.compress_messages() == 0
+        
+        page = db_manager.get_session_messages_page(sample_chat_session.id)
+        assert [content for _, _, content in page] == [self.LONG_REPLY] * 3
+        assert {self.stored_type(db_manager, message_id) for message_id, _, _ in page} == {"blob"}
+        db_manager.index_pending_messages()
+        assert len(db_manager.search_messages(sample_user.id, "responder")) == 3
+
+class TestHistoryArchive:
+    """Tests para el archivo histórico de sesiones antiguas."""
+    
+    @pytest.fixture(autouse=True)
+    def remove_archive(self, db_manager):
+        yield
+        if os.path.exists(db_manager.archive_path):
+            os.remove(db_manager.archive_path)
+    
+    @pytest.fixture
+    def old_and_new_sessions(self, db_manager, sample_user):
+        from db.attempts import AttemptVerdict
+        old = db_manager.create_chat_session(sample_user.id, "Antigua", "evaluemos")
+        db_manager.add_turn(old.id, "¿Qué es la gestión de riesgos?", "¡Correcto! Identificar y responder riesgos.",
+                            verdicts=[AttemptVerdict(True, 'process', 'riesgo', 'media')])
+        new = db_manager.create_chat_session(sample_user.id, "Reciente", "charlemos")
+        db_manager.add_turn(new.id, "Hola", "¡Hola! ¿En qué te ayudo?")
+        with db_manager.get_session() as db:
+            db.query(ChatSession).filter(ChatSession.id == old.id).update(
+                {ChatSession.last_used_at: datetime.now() - timedelta(days=400)}
+            )
+            db.commit()
+        return old, new
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_dry_run_reports_without_changes(self, db_manager, sample_user, old_and_new_sessions):
+        """El modo de prueba informa qué se archivaría sin mover nada."""
+        from db.models import RetentionPolicy
+        
+        report = db_manager.apply_retention_policy(RetentionPolicy(archive_after_days=180), dry_run=True)
+        
+        assert report.dry_run
+        assert (report.archived.sessions, report.archived.messages) == (1, 2)
+        assert len(db_manager.get_user_sessions(sample_user.id)) == 2
+        assert not os.path.exists(db_manager.archive_path)
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_archive_moves_old_sessions(self, db_manager, sample_user, old_and_new_sessions):
+        """Las sesiones sin uso pasan al archivo y salen de la lista y la búsqueda."""
+        from db.models import RetentionPolicy
+        
+        report = db_manager.apply_retention_policy(RetentionPolicy(archive_after_days=180))
+        
+        assert (report.archived.sessions, report.archived.messages) == (1, 2)
+        assert [s.name for s in db_manager.get_user_sessions(sample_user.id)] == ["Reciente"]
+        assert [s.name for s in db_manager.get_archived_sessions(sample_user.id)] == ["Antigua"]
+        assert db_manager.search_messages(sample_user.id, "riesgos") == []
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_analytics_include_archived_sessions(self, db_manager, sample_user, old_and_new_sessions):
+        """Las analíticas adjuntan el archivo y cuentan el historial completo."""
+        from db.models import RetentionPolicy
+        
+        before = db_manager.get_user_analytics_data(sample_user.id)
+        db_manager.apply_retention_policy(RetentionPolicy(archive_after_days=180))
+        after = db_manager.get_user_analytics_data(sample_user.id)
+        
+        assert after['overview'] == before['overview']
+        assert after['question_accuracy'] == before['question_accuracy']
+        assert after['question_accuracy']['total_attempts'] == 1
+        assert after['evaluations']['total_sessions'] == before['evaluations']['total_sessions'] == 1
+        # Las sesiones del archivo se identifican con IDs negativos
+        assert [d['session_id'] for d in after['evaluations']['sessions_detail']] == [-1]
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_restore_session_brings_messages_back(self, db_manager, sample_user, old_and_new_sessions):
+        """Abrir una sesión archivada la devuelve a la base activa con sus mensajes."""
+        from db.models import RetentionPolicy
+        
+        db_manager.apply_retention_policy(RetentionPolicy(archive_after_days=180))
+        archived = db_manager.get_archived_sessions(sample_user.id)[0]
+        
+        session_id = db_manager.restore_session(archived.id)
+        
+        assert [content for _, _, content in db_manager.get_session_messages_page(session_id)] == [
+            "¿Qué es la gestión de riesgos?", "¡Correcto! Identificar y responder riesgos."
+        ]
+        assert db_manager.get_archived_sessions(sample_user.id) == []
+        assert len(db_manager.search_messages(sample_user.id, "riesgos")) == 2
+        assert db_manager.restore_session(archived.id) is None
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_purge_removes_expired_archived_sessions(self, db_manager, sample_user, old_and_new_sessions):
+        """La purga elimina del archivo las sesiones que superan la retención."""
+        from db.models import RetentionPolicy
+        
+        report = db_manager.apply_retention_policy(RetentionPolicy(archive_after_days=180, purge_after_days=365))
+        
+        assert report.purged.sessions == 1
+        assert db_manager.get_archived_sessions(sample_user.id) == []
+        assert [s.name for s in db_manager.get_user_sessions(sample_user.id)] == ["Reciente"]
+
+class TestUserExport:
+    """Tests para la exportación e importación de usuarios en JSONL."""
+    
+    @pytest.fixture
+    def target_db(self, tmp_path):
+        return DatabaseManager(f"sqlite:///{tmp_path / 'destino.db'}")
+    
+    @pytest.fixture
+    def history(self, db_manager, sample_user):
+        from db.attempts import AttemptVerdict
+        first = db_manager.create_chat_session(sample_user.id, "Riesgos", "evaluemos")
+        db_manager.add_turn(first.id, "¿Qué es un riesgo?", "¡Correcto! Un evento incierto. " * 100,
+                            verdicts=[AttemptVerdict(True, 'process', 'riesgo', 'baja')])
+        second = db_manager.create_chat_session(sample_user.id, "Charla", "charlemos")
+        db_manager.add_turn(second.id, "Hola", "¡Hola!")
+        return first, second
+    
+    def export(self, db_manager, user_id):
+        import io
+        buffer = io.StringIO()
+        db_manager.export_user(user_id, buffer)
+        buffer.seek(0)
+        return buffer
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_export_streams_records(self, db_manager, sample_user, history):
+        """Los registros se generan de a uno, con encabezado y perfil primero."""
+        import inspect
+        
+        records = db_manager.iter_user_records(sample_user.id)
+        assert inspect.isgenerator(records)
+        types = [record['type'] for record in records]
+        assert types[:2] == ['header', 'user']
+        assert types.count('session') == 2 and types.count('message') == 4
+        assert types.count('session_stats') == 2 and types.count('question_attempt') == 1
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_import_round_trip(self, db_manager, sample_user, history, target_db):
+        """El usuario importado conserva perfil, contraseña, sesiones, mensajes y analíticas."""
+        buffer = self.export(db_manager, sample_user.id)
+        
+        user_id = target_db.import_user(buffer)
+        
+        assert target_db.authenticate_user(sample_user.username, "TestPass123").id == user_id
+        sessions = target_db.get_user_sessions(user_id)
+        assert sorted(s.name for s in sessions) == ["Charla", "Riesgos"]
+        riesgos = next(s for s in sessions if s.name == "Riesgos")
+        assert target_db.get_session_messages(riesgos.id) == db_manager.get_session_messages(history[0].id)
+        assert target_db.search_messages(user_id, "incierto")[0].session_id == riesgos.id
+        for section in ('overview', 'question_accuracy'):
+            assert (target_db.get_user_analytics_data(user_id)[section]
+                    == db_manager.get_user_analytics_data(sample_user.id)[section])
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_import_remaps_ids_in_chunks(self, db_manager, sample_user, history, target_db):
+        """Con IDs ocupados en el destino, los mensajes se asocian a las sesiones nuevas."""
+        other = target_db.create_user("otro", "otro@example.com", "OtroPass123")
+        for i in range(3):
+            target_db.create_chat_session(other.id, f"Ocupada {i}")
+        
+        with patch("db.models.USER_EXPORT_CHUNK_SIZE", 1):
+            user_id = target_db.import_user(self.export(db_manager, sample_user.id))
+        
+        for session in target_db.get_user_sessions(user_id):
+            assert len(target_db.get_session_messages(session.id)) == 2
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_import_rejects_existing_user_and_invalid_files(self, db_manager, sample_user, history):
+        """Un usuario existente o un archivo ajeno no importan nada."""
+        import io
+        
+        with pytest.raises(ValueError, match="ya existe"):
+            db_manager.import_user(self.export(db_manager, sample_user.id))
+        with pytest.raises(ValueError, match="válida"):
+            db_manager.import_user(io.StringIO('{"type": "otro"}\n'))
+        assert len(db_manager.get_user_sessions(sample_user.id)) == 2
+
+class TestAnalyticsCache:
+    """Tests para la caché de analíticas por usuario."""
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_repeat_calls_hit_cache_without_queries(self, db_manager, sample_user, sample_chat_session):
+        """Sin escrituras, la segunda apertura del dashboard no consulta la base."""
+        from sqlalchemy import event
+        
+        first = db_manager.get_user_analytics_data(sample_user.id)
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db_manager.engine, "before_cursor_execute", listener)
+        try:
+            second = db_manager.get_user_analytics_data(sample_user.id)
+        finally:
+            event.remove(db_manager.engine, "before_cursor_execute", listener)
+        
+        assert second is first
+        assert statements == []
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_writes_invalidate_cached_result(self, db_manager, sample_user, sample_chat_session):
+        """Mensajes, sesiones nuevas, renombres y eliminaciones renuevan el resultado."""
+        def overview():
+            return db_manager.get_user_analytics_data(sample_user.id)['overview']
+        
+        assert overview()['total_messages'] == 0
+        db_manager.add_turn(sample_chat_session.id, "Hola", "¡Hola!")
+        assert overview()['total_messages'] == 2
+        db_manager.add_message(sample_chat_session.id, "user", "Otra pregunta")
+        assert overview()['total_messages'] == 3
+        
+        session = db_manager.create_chat_session(sample_user.id, "Evaluación", "evaluemos")
+        assert overview()['sessions_by_mode']['evaluemos'] == 1
+        db_manager.add_turn(session.id, "Respuesta B", "¡Correcto!")
+        db_manager.rename_chat_session(session.id, "Riesgos")
+        detail = db_manager.get_user_analytics_data(sample_user.id)['evaluations']['sessions_detail']
+        assert [d['session_name'] for d in detail] == ["Riesgos"]
+        db_manager.delete_chat_session(session.id)
+        assert overview()['total_sessions'] == 1
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_result_expires_at_local_midnight(self, db_manager, sample_user, sample_chat_session):
+        """La semana actual se recalcula al cambiar el día aunque no haya escrituras."""
+        from db.timestamps import get_local_datetime
+        
+        first = db_manager.get_user_analytics_data(sample_user.id)
+        assert db_manager.get_user_analytics_data(sample_user.id) is first
+        assert first['weekly_activity']['this_week']['sessions'] == 1
+        
+        next_week = get_local_datetime() + timedelta(days=7)
+        with patch("db.analytics.get_local_datetime", return_value=next_week):
+            later = db_manager.get_user_analytics_data(sample_user.id)
+        
+        assert later is not first
+        assert later['weekly_activity']['this_week']['sessions'] == 0
+        assert later['weekly_activity']['last_week']['sessions'] == 1
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_concurrent_callers_share_one_computation(self, db_manager, sample_user, sample_chat_session):
+        """Las llamadas simultáneas esperan el mismo cálculo en lugar de repetirlo."""
+        import threading
+        import time
+        
+        compute = db_manager._compute_user_analytics_data
+        calls = []
+        
+        def slow_compute(user_id, window):
+            calls.append(user_id)
+            time.sleep(0.1)
+            return compute(user_id, window)
+        
+        results = []
+        with patch.object(db_manager, "_compute_user_analytics_data", side_effect=slow_compute):
+            threads = [
+                threading.Thread(target=lambda: results.append(db_manager.get_user_analytics_data(sample_user.id)))
+                for _ in range(5)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        
+        assert calls == [sample_user.id]
+        assert len(results) == 5 and all(result is results[0] for result in results)
+    
+    @pytest.mark.unit
+    def test_write_during_computation_is_not_cached(self):
+        """Un resultado calculado mientras llega una escritura no queda en caché."""
+        from db.analytics_cache import AnalyticsCache
+        
+        cache = AnalyticsCache()
+        
+        def compute_with_write():
+            cache.bump(1)
+            return "viejo"
+        
+        assert cache.get(1, compute_with_write) == "viejo"
+        assert cache.get(1, lambda: "nuevo") == "nuevo"
+        assert cache.get(1, lambda: "no se llama") == "nuevo"
+    
+    @pytest.mark.unit
+    def test_windows_are_cached_separately(self):
+        """Cada ventana tiene su entrada y una escritura del usuario las invalida todas."""
+        from db.analytics_cache import AnalyticsCache
+        
+        cache = AnalyticsCache()
+        cache.get(1, lambda: "historia")
+        cache.get(1, lambda: "semana", key=(0, 7))
+        
+        assert cache.get(1, lambda: "no se llama") == "historia"
+        assert cache.get(1, lambda: "no se llama", key=(0, 7)) == "semana"
+        cache.bump(1)
+        assert cache.get(1, lambda: "nueva semana", key=(0, 7)) == "nueva semana"
+        assert cache.get(1, lambda: "nueva historia") == "nueva historia"
+    
+    @pytest.mark.unit
+    def test_lru_is_bounded(self):
+        """La caché retiene como máximo max_users y descarta el menos usado."""
+        from db.analytics_cache import AnalyticsCache
+        
+        cache = AnalyticsCache(max_users=2)
+        cache.get(1, lambda: "uno")
+        cache.get(2, lambda: "dos")
+        cache.get(1, lambda: "no se llama")
+        cache.get(3, lambda: "tres")
+        
+        assert cache.get(1, lambda: "recalculado") == "uno"
+        assert cache.get(2, lambda: "recalculado") == "recalculado"
+
+class TestReadRecords:
+    """Tests para los registros de solo lectura que devuelven las consultas."""
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_session_reads_return_records(self, db_manager, sample_user, sample_chat_session):
+        """Sesiones y mensajes llegan como NamedTuple, sin instancias del ORM."""
+        from db.models import SessionRecord, MessageRecord
+        
+        db_manager.add_turn(sample_chat_session.id, "Hola", "¡Hola!")
+        sessions = db_manager.get_user_sessions(sample_user.id)
+        page = db_manager.get_session_messages_page(sample_chat_session.id)
+        
+        assert isinstance(sample_chat_session, SessionRecord)
+        assert all(isinstance(s, SessionRecord) for s in sessions)
+        assert db_manager.get_chat_session(sample_chat_session.id) == sessions[0]
+        assert db_manager.get_latest_chat_session(sample_user.id) == sessions[0]
+        assert sessions[0].message_count == 2 and sessions[0].last_message_preview == "¡Hola!"
+        assert page == [MessageRecord(page[0].id, "user", "Hola"), MessageRecord(page[1].id, "assistant", "¡Hola!")]
+        assert not hasattr(sessions[0], "__dict__")
+        with pytest.raises(AttributeError):
+            sessions[0].name = "Otro nombre"
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_user_reads_omit_password_fields(self, db_manager, sample_user):
+        """get_user_by_id y authenticate_user no exponen hash ni salt."""
+        from db.models import UserRecord
+        
+        user = db_manager.authenticate_user("test_user", "TestPass123")
+        
+        assert isinstance(user, UserRecord)
+        assert user == db_manager.get_user_by_id(sample_user.id)
+        assert "password_hash" not in UserRecord._fields and "salt" not in UserRecord._fields
+        assert db_manager.get_chat_session(99999) is None
+        assert db_manager.get_user_by_id(99999) is None
+
+class TestSchemaMigrations:
+    """Tests para las migraciones versionadas del esquema."""
+    
+    @pytest.fixture
+    def legacy_db(self, tmp_path):
+        """Base con el esquema previo a los usuarios, los modos y la compresión"""
+        import sqlite3
+        path = tmp_path / 'legacy.db'
+        conn = sqlite3.connect(path)
+        conn.executescript("""
+            CREATE TABLE chat_sessions (id INTEGER PRIMARY KEY, name VARCHAR(200), created_at DATETIME);
+            CREATE TABLE chat_messages (id INTEGER PRIMARY KEY, session_id INTEGER, role VARCHAR(50),
+                                        content TEXT, timestamp DATETIME);
+            INSERT INTO chat_sessions VALUES (1, 'Vieja', '2024-01-01 10:00:00');
+            INSERT INTO chat_messages VALUES (1, 1, 'user', 'Hola', '2024-01-01 10:00:01');
+        """)
+        conn.execute("INSERT INTO chat_messages VALUES (2, 1, 'assistant', ?, '2024-01-01 10:00:02')", ("Respuesta " * 500,))
+        conn.commit()
+        conn.close()
+        return path
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_new_database_is_stamped_at_latest_version(self, tmp_path):
+        from db.migrations import LATEST_VERSION
+        manager = DatabaseManager(f"sqlite:///{tmp_path / 'nueva.db'}")
+        
+        assert manager.schema_version() == LATEST_VERSION
+        assert manager.wait_for_migrations(timeout=0)
+        assert not list(tmp_path.glob('*_backup_*'))
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_legacy_database_is_upgraded_once(self, legacy_db):
+        from db.migrations import LATEST_VERSION, run_migrations
+        manager = DatabaseManager(f"sqlite:///{legacy_db}")
+        assert manager.wait_for_migrations(timeout=10)
+        
+        assert manager.schema_version() == LATEST_VERSION
+        sessions = manager.get_user_sessions(1)
+        assert [(s.name, s.mode, s.message_count) for s in sessions] == [('Vieja', 'charlemos', 2)]
+        assert manager.get_session_messages(1)[1] == ('assistant', "Respuesta " * 500)
+        assert manager.search_messages(1, 'hola')
+        assert manager.search_messages(1, 'respuesta')
+        with manager.engine.connect() as conn:
+            assert conn.execute(text("SELECT typeof(content) FROM chat_messages WHERE id = 2")).scalar() == 'blob'
+        # Copia previa a migrar, tomada con la API de backup
+        assert (legacy_db.parent / 'legacy_backup_v0.db').exists()
+        
+        assert run_migrations(manager) == []
+        with manager.engine.connect() as conn:
+            # Resumen diario calculado desde la sesión y los mensajes existentes (1 s entre ambos)
+            assert conn.execute(text(
+                "SELECT user_id, day, mode, sessions, messages, active_seconds FROM daily_activity"
+            )).all() == [(1, 19723, 'charlemos', 1, 2, 1.0)]
+            foreign_keys = conn.exec_driver_sql("PRAGMA foreign_key_list(chat_messages)").fetchall()
+            assert [fk[6] for fk in foreign_keys] == ['CASCADE']
+            # El arranque no reescribe el archivo: la conversión es mantenimiento explícito
+            assert conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 0
+        assert manager.compact_database()
+        assert not manager.compact_database()
+        with manager.engine.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2  # INCREMENTAL
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_legacy_timestamps_become_epoch_ms(self, legacy_db):
+        """Las fechas de texto (hora GMT-3) pasan a milisegundos UTC enteros."""
+        manager = DatabaseManager(f"sqlite:///{legacy_db}")
+        assert manager.wait_for_migrations(timeout=10)
+        
+        with manager.engine.connect() as conn:
+            for table, column in (('chat_sessions', 'created_at'), ('chat_sessions', 'last_used_at'),
+                                  ('chat_messages', 'timestamp'), ('session_stats', 'last_ts')):
+                types = conn.exec_driver_sql(f"SELECT DISTINCT typeof({column}) FROM {table}").scalars().all()
+                assert types == ['integer']
+            # 2024-01-01 10:00:01 en GMT-3 = 13:00:01 UTC
+            assert conn.exec_driver_sql("SELECT timestamp FROM chat_messages WHERE id = 1").scalar() == 1704114001000
+        session = manager.get_chat_session(1)
+        assert session.created_at == datetime(2024, 1, 1, 10, 0, tzinfo=GMT_MINUS_3)
+        assert session.last_used_at == session.created_at
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_interrupted_backfill_resumes(self, legacy_db):
+        from db.migrations import LATEST_VERSION, run_migrations
+        
+        manager = DatabaseManager(f"sqlite:///{legacy_db}")
+        assert manager.wait_for_migrations(timeout=10)
+        # Simular un corte tras registrar la versión 3 con el backfill de estadísticas a medias
+        with manager.engine.begin() as conn:
+            conn.execute(text("DELETE FROM schema_version WHERE version > 3"))
+            conn.execute(text("UPDATE maintenance_state SET value = '0' WHERE key = 'session_stats_backfill'"))
+            conn.execute(text("DELETE FROM session_stats"))
+        
+        applied = run_migrations(manager, backup=False)
+        
+        assert [migration.version for migration in applied] == list(range(4, LATEST_VERSION + 1))
+        with manager.engine.connect() as conn:
+            assert conn.execute(text("SELECT message_count FROM session_stats")).scalar() == 2
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_online_backup_copies_database(self, db_manager, sample_user, tmp_path):
+        from db.migrations import backup_database
+        db_manager.create_chat_session(sample_user.id, "Respaldada", "charlemos")
+        steps = []
+        
+        target = backup_database(db_manager.engine.url.database, str(tmp_path / 'copia.db'),
+                                 pages=1, progress=lambda remaining, total: steps.append(remaining))
+        
+        copy = DatabaseManager(f"sqlite:///{target}")
+        assert [s.name for s in copy.get_user_sessions(sample_user.id)] == ["Respaldada"]
+        assert len(steps) > 1 and steps[-1] == 0
+
+class TestStorageBackends:
+    """Tests del protocolo de almacenamiento, comunes a SQLite y memoria."""
+    
+    @pytest.fixture(params=["sqlite", "memory"])
+    def storage(self, request):
+        if request.param == "sqlite":
+            return request.getfixturevalue("db_manager")
+        return request.getfixturevalue("memory_storage")
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_open_storage_selects_backend_by_url(self, temp_db_path):
+        from db.storage import ChatStorage, open_storage
+        from db.memory import MemoryDatabaseManager
+        
+        memory = open_storage("memory://seleccion")
+        assert isinstance(memory, MemoryDatabaseManager)
+        assert isinstance(memory, ChatStorage)
+        assert isinstance(open_storage(f"sqlite:///{temp_db_path}"), DatabaseManager)
+        # Misma URL, mismos datos
+        memory.create_user("compartido", "compartido@example.com", "Clave1234")
+        assert open_storage("memory://seleccion").authenticate_user("compartido", "Clave1234") is not None
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_users(self, storage):
+        user = storage.create_user("ana", "ana@example.com", "Clave1234")
+        with pytest.raises(ValueError, match="nombre de usuario"):
+            storage.create_user("ana", "otra@example.com", "Clave1234")
+        with pytest.raises(ValueError, match="email"):
+            storage.create_user("otra", "ana@example.com", "Clave1234")
+        
+        assert storage.authenticate_user("ana", "Clave1234").id == user.id
+        assert storage.authenticate_user("ana", "incorrecta") is None
+        updated = storage.update_user_profile(user.id, full_name="Ana Pérez", experience_years=4)
+        assert (updated.full_name, updated.experience_years) == ("Ana Pérez", 4)
+        assert storage.get_user_by_id(user.id).full_name == "Ana Pérez"
+        with pytest.raises(ValueError):
+            storage.update_user_profile(user.id, password_hash="x")
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_sessions_and_messages(self, storage):
+        import time
+        user = storage.create_user("beto", "beto@example.com", "Clave1234")
+        first = storage.create_chat_session(user.id, "Primera", "estudiemos")
+        second = storage.create_chat_session(user.id, "Segunda", "charlemos")
+        time.sleep(0.005)  # Las fechas tienen precisión de milisegundos
+        for n in range(3):
+            storage.add_turn(first.id, f"Pregunta {n} sobre riesgos", f"Respuesta {n}")
+        
+        sessions = storage.get_user_sessions(user.id)
+        assert [s.id for s in sessions] == [first.id, second.id]
+        assert (sessions[0].message_count, sessions[0].last_role, sessions[0].last_message_preview) == (6, 'assistant', 'Respuesta 2')
+        assert [s.id for s in storage.get_user_sessions(user.id, mode="charlemos")] == [second.id]
+        assert storage.get_session_messages(first.id)[:2] == [('user', 'Pregunta 0 sobre riesgos'), ('assistant', 'Respuesta 0')]
+        
+        page = storage.get_session_messages_page(first.id, limit=4)
+        older = storage.get_session_messages_page(first.id, before_id=page[0].id, limit=4)
+        assert [m.content for m in older + page] == [content for _, content in storage.get_session_messages(first.id)]
+        
+        results = storage.search_messages(user.id, "riesg")
+        assert len(results) == 3 and all("[riesgos]" in r.snippet for r in results)
+        assert storage.search_messages(user.id, "riesgos", mode="charlemos") == []
+        
+        assert storage.rename_chat_session(second.id, "Renombrada") is True
+        assert storage.delete_sessions([first.id, second.id]) == 2
+        assert storage.get_user_sessions(user.id) == []
+        assert storage.get_session_messages(first.id) == []
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_analytics_match_between_backends(self, db_manager, memory_storage):
+        from db.analytics import recent_days_window
+        from db.attempts import AttemptVerdict
+        from db.models import PendingTurn
+        start = datetime(2024, 3, 1, 10, 0)
+        results = []
+        for storage in (db_manager, memory_storage):
+            user = storage.create_user("carla", "carla@example.com", "Clave1234")
+            storage.update_user_profile(user.id, company="PMO")
+            for n, mode in enumerate(["evaluemos", "evaluemos", "simulemos", "charlemos"]):
+                session = storage.create_chat_session(user.id, f"Sesión {n}", mode)
+                storage.add_turns([
+                    PendingTurn(session.id, "Pregunta sobre el alcance", "¡Correcto! Simulacro finalizado.",
+                                start + timedelta(minutes=m), start + timedelta(minutes=m, seconds=30),
+                                (AttemptVerdict(m % 2 == 0, 'process', 'alcance', 'media'),) if n < 2 else ())
+                    for m in range(n + 1)
+                ])
+            since, until = recent_days_window(7)
+            results.append((storage.get_user_analytics_data(user.id),
+                            storage.get_user_analytics_data(user.id, since=since, until=until, compare=True)))
+        
+        (sqlite_data, sqlite_recent), (memory_data, memory_recent) = results
+        assert memory_recent['comparison'] == sqlite_recent['comparison']
+        assert memory_recent['overview'] == sqlite_recent['overview']
+        assert memory_recent['comparison']['current']['sessions_created'] == 4
+        assert memory_data['overview']['total_messages'] == 20
+        assert memory_data['question_accuracy']['total_attempts'] == 3
+        for section in ('user_profile', 'overview', 'evaluations', 'simulations', 'progress_trends', 'question_accuracy',
+                        'weekly_activity'):
+            assert memory_data[section] == sqlite_data[section]
+
+class TestChatSessionManagement:
+    """Tests para renombrar y eliminar sesiones."""
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_rename_chat_session(self, db_manager, sample_chat_session):
+        """Renombrar actualiza la sesión y reporta si existía."""
+        assert db_manager.rename_chat_session(sample_chat_session.id, "Riesgos") is True
+        assert db_manager.get_chat_session(sample_chat_session.id).name == "Riesgos"
+        assert db_manager.rename_chat_session(99999, "Nada") is False
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_delete_chat_session_removes_dependents(self, db_manager, sample_chat_session):
+        """Eliminar una sesión borra sus mensajes y estadísticas."""
+        from db.models import SessionStats
+        
+        db_manager.add_turn(sample_chat_session.id, "Pregunta", "Respuesta")
+        db_manager.delete_chat_session(sample_chat_session.id)
+        
+        assert db_manager.get_chat_session(sample_chat_session.id) is None
+        with db_manager.get_session() as db:
+            assert db.query(ChatMessage).count() == 0
+            assert db.get(SessionStats, sample_chat_session.id) is None
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_delete_sessions_in_bulk(self, db_manager, sample_user):
+        """El borrado masivo elimina en cascada mensajes e índice de búsqueda, y conserva el resto."""
+        sessions = [db_manager.create_chat_session(sample_user.id, f"Sesión {n}", "charlemos") for n in range(3)]
+        for session in sessions:
+            db_manager.add_turn(session.id, f"Pregunta {session.id}", "Respuesta")
+        
+        assert db_manager.delete_sessions([sessions[0].id, sessions[1].id, 99999]) == 2
+        
+        assert [s.id for s in db_manager.get_user_sessions(sample_user.id)] == [sessions[2].id]
+        with db_manager.get_session() as db:
+            assert {m.session_id for m in db.query(ChatMessage)} == {sessions[2].id}
+        assert [r.session_id for r in db_manager.search_messages(sample_user.id, "respuesta")] == [sessions[2].id]
+        assert db_manager.delete_sessions([]) == 0
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_reclaim_space_after_delete(self, tmp_path):
+        """Las páginas liberadas por un borrado se devuelven en segundo plano."""
+        manager = DatabaseManager(f"sqlite:///{tmp_path / 'reclaim.db'}")
+        user = manager.create_user("vacio", "vacio@example.com", "Clave1234")
+        session = manager.create_chat_session(user.id, "Grande", "charlemos")
+        for _ in range(50):
+            manager.add_turn(session.id, os.urandom(4000).hex(), os.urandom(4000).hex())
+        
+        manager.delete_sessions([session.id])
+        manager.reclaim_space(wait=True)
+        
+        with manager.engine.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA freelist_count").scalar() == 0
+        assert manager._engine_entry.space_reclaimer.reclaimed_pages > 50
+
+class TestAsyncDatabaseManager:
+    """Tests para la capa asíncrona de acceso a datos."""
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_exposes_same_public_api(self):
+        """Cada método público de DatabaseManager tiene su corrutina equivalente."""
+        import inspect
+        from db.async_manager import AsyncDatabaseManager
+        
+        public = [
+            name for name, _ in inspect.getmembers(DatabaseManager, inspect.isfunction)
+            if not name.startswith('_') and name != 'get_session'
+        ]
+        assert public
+        for name in public:
+            assert inspect.iscoroutinefunction(getattr(AsyncDatabaseManager, name)), name
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_async_calls_share_database(self, db_manager, sample_user):
+        """Las corrutinas leen y escriben la misma base que el gestor síncrono."""
+        import asyncio
+        from db.async_manager import AsyncDatabaseManager
+        
+        async_db = AsyncDatabaseManager(db_manager=db_manager)
+        
+        async def scenario():
+            session = await async_db.create_chat_session(sample_user.id, "Async", "evaluemos")
+            await async_db.add_turn(session.id, "Pregunta", "Respuesta")
+            sessions = await async_db.get_user_sessions(sample_user.id, "evaluemos")
+            page = await async_db.get_session_messages_page(session.id)
+            return session, sessions, page
+        
+        session, sessions, page = asyncio.run(scenario())
+        assert [s.id for s in sessions] == [session.id]
+        assert [(role, content) for _, role, content in page] == [("user", "Pregunta"), ("assistant", "Respuesta")]
+        assert db_manager.get_session_messages(session.id) == [("user", "Pregunta"), ("assistant", "Respuesta")]
+    
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_queries_run_outside_event_loop_thread(self, db_manager):
+        """Las consultas se ejecutan en el pool de la base de datos, no en el hilo del event loop."""
+        import asyncio
+        import threading
+        from db.async_manager import AsyncDatabaseManager
+        
+        async_db = AsyncDatabaseManager(db_manager=db_manager)
+        
+        async def scenario():
+            worker = await async_db.run(lambda: threading.current_thread().name)
+            return threading.current_thread().name, worker
+        
+        loop_thread, worker_thread = asyncio.run(scenario())
+        assert worker_thread != loop_thread
+        assert worker_thread.startswith("async-db")
@@ -0,0 +1,86 @@
+"""
+Script para exportar e importar el historial completo de un usuario (perfil,
+conversaciones y mensajes) como JSONL, por ejemplo para llevarlo a otra
+máquina. Con extensión .gz el archivo se comprime.
+
+Para ejecutar:
+    python user_backup.py exportar <usuario> <archivo.jsonl[.gz]> [--db chat_history.db]
+    python user_backup.py importar <archivo.jsonl[.gz]> [--db chat_history.db]
+"""
+
+import argparse
+import gzip
+import os
+import time
+
+def open_backup(path: str, mode: str):
+    """Abre el archivo de respaldo en modo texto, comprimido si termina en .gz"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def export_user(username: str, path: str, db_path: str = "chat_history.db"):
+    """Exporta el historial del usuario indicado"""
+    if not os.path.exists(db_path):
+        print("❌ Base de datos no encontrada. Ejecuta la aplicación primero para crearla.")
+        return False
+
+    try:
+        from db.models import DatabaseManager, User
+
+        db_manager = DatabaseManager(f"sqlite:///{db_path}")
+        with db_manager.get_session() as db:
+            user = db.query(User).filter(User.username == username).first()
+        if not user:
+            print(f"❌ Usuario no encontrado: {username}")
+            return False
+
+        print(f"📤 Exportando el historial de {username}...")
+        started = time.perf_counter()
+        with open_backup(path, "w") as fp:
+            messages = db_manager.export_user(user.id, fp)
+        print(f"✅ {messages} mensajes exportados a {path} en {time.perf_counter() - started:.1f} s")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error al exportar: {e}")
+        return False
+
+def import_user(path: str, db_path: str = "chat_history.db"):
+    """Importa un historial exportado con export_user"""
+    if not os.path.exists(path):
+        print(f"❌ Archivo no encontrado: {path}")
+        return False
+
+    try:
+        from db.models import DatabaseManager
+
+        db_manager = DatabaseManager(f"sqlite:///{db_path}")
+        print(f"📥 Importando {path}...")
+        started = time.perf_counter()
+        with open_backup(path, "r") as fp:
+            user_id = db_manager.import_user(fp)
+        user = db_manager.get_user_by_id(user_id)
+        print(f"✅ Usuario {user.username} importado en {time.perf_counter() - started:.1f} s")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error al importar: {e}")
+        return False
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta o importa el historial de un usuario")
+    db_option = argparse.ArgumentParser(add_help=False)
+    db_option.add_argument("--db", default="chat_history.db", help="Ruta de la base de datos")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("exportar", parents=[db_option], help="Exporta un usuario a JSONL")
+    export_parser.add_argument("usuario")
+    export_parser.add_argument("archivo")
+    import_parser = commands.add_parser("importar", parents=[db_option], help="Importa un usuario desde JSONL")
+    import_parser.add_argument("archivo")
+    args = parser.parse_args()
+
+    if args.command == "exportar":
+        export_user(args.usuario, args.archivo, args.db)
+    else:
+        import_user(args.archivo, args.db)